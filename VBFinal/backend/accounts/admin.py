@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import User, EmailLog, PasswordResetToken, EmailVerificationToken , Campus, College, Department
+from .models import User, EmailLog, EmailOutbox, RequestMetric, UserSession, PasswordResetToken, EmailVerificationToken , Campus, College, Department
 admin.site.register(Campus)
 admin.site.register(College)
 admin.site.register(Department)
@@ -21,6 +21,28 @@ class EmailLogAdmin(admin.ModelAdmin):
     readonly_fields = ("sent_at",)
 
 
+@admin.register(EmailOutbox)
+class EmailOutboxAdmin(admin.ModelAdmin):
+    list_display = ("subject", "email_type", "status", "attempts", "next_attempt_at", "sent_at")
+    list_filter = ("status", "email_type")
+    search_fields = ("subject",)
+    readonly_fields = ("created_at", "sent_at")
+
+
+@admin.register(RequestMetric)
+class RequestMetricAdmin(admin.ModelAdmin):
+    list_display = ("bucket", "method", "route", "status_class", "count", "error_count", "latency_max_ms")
+    list_filter = ("method", "status_class")
+    search_fields = ("route",)
+
+
+@admin.register(UserSession)
+class UserSessionAdmin(admin.ModelAdmin):
+    list_display = ("user", "ip_address", "last_seen", "first_seen")
+    search_fields = ("user__email", "ip_address")
+    readonly_fields = ("first_seen", "last_seen")
+
+
 @admin.register(PasswordResetToken)
 class PasswordResetTokenAdmin(admin.ModelAdmin):
     list_display = ("user", "is_used", "created_at", "expires_at")
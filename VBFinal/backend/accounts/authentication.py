@@ -0,0 +1,126 @@
+import logging
+import threading
+
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.utils import datetime_from_epoch
+
+from conf import versions
+
+from . import sessions
+
+logger = logging.getLogger(__name__)
+
+REVOKED_VERSION_KEY = 'accounts:revoked_tokens:version'
+
+
+class SessionTrackingJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication that refuses access tokens revoked on logout and
+    records where the user was last seen
+    """
+
+    def get_validated_token(self, raw_token):
+        token = super().get_validated_token(raw_token)
+        if token[jwt_settings.JTI_CLAIM] in revoked_tokens:
+            raise InvalidToken("Token has been revoked")
+        return token
+
+    def authenticate(self, request):
+        result = super().authenticate(request)
+        if result is not None:
+            try:
+                sessions.touch(result[0], request)
+            except Exception:
+                logger.exception("Failed to record user session")
+        return result
+
+
+class OptionalJWTAuthentication(SessionTrackingJWTAuthentication):
+    """
+    For public endpoints that show more to signed-in users: a valid token
+    authenticates, a missing, stale or revoked one leaves the request
+    anonymous instead of failing with 401
+    """
+
+    def authenticate(self, request):
+        try:
+            return super().authenticate(request)
+        except (AuthenticationFailed, InvalidToken):
+            return None
+
+
+class RevokedTokens:
+    """
+    JTIs of the blacklisted tokens that expire within one access token
+    lifetime, which covers every revoked access token still usable. Loaded
+    once per version of REVOKED_VERSION_KEY, which revoke() replaces, so
+    checking a request's token is a set lookup rather than a query.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._jtis = frozenset()
+
+    def invalidate(self):
+        versions.token(REVOKED_VERSION_KEY).bump()
+
+    def __contains__(self, jti):
+        version = versions.token(REVOKED_VERSION_KEY).get()
+        if version != self._version:
+            with self._lock:
+                if version != self._version:
+                    now = timezone.now()
+                    self._jtis = frozenset(BlacklistedToken.objects.filter(
+                        token__expires_at__gt=now,
+                        token__expires_at__lte=now + jwt_settings.ACCESS_TOKEN_LIFETIME,
+                    ).values_list('token__jti', flat=True))
+                    self._version = version
+        return jti in self._jtis
+
+
+revoked_tokens = RevokedTokens()
+
+
+def revoke(token):
+    """
+    Blacklist an access token on logout. simplejwt only blacklists refresh
+    tokens; SessionTrackingJWTAuthentication (through revoked_tokens) and the
+    notification stream, which outlives requests, check this too.
+    """
+    outstanding, _ = OutstandingToken.objects.get_or_create(
+        jti=token[jwt_settings.JTI_CLAIM],
+        defaults={
+            'user_id': token.get(jwt_settings.USER_ID_CLAIM),
+            'token': str(token),
+            'created_at': token.current_time,
+            'expires_at': datetime_from_epoch(token['exp']),
+        },
+    )
+    BlacklistedToken.objects.get_or_create(token=outstanding)
+    # Now for this process, and on commit for every process
+    revoked_tokens.invalidate()
+    transaction.on_commit(revoked_tokens.invalidate)
+
+
+def is_revoked(token):
+    return BlacklistedToken.objects.filter(token__jti=token[jwt_settings.JTI_CLAIM]).exists()
+
+
+def presented_access_token(request):
+    """The valid access token in the Authorization header, for views that skip authentication"""
+    backend = JWTAuthentication()
+    header = backend.get_header(request)
+    raw_token = backend.get_raw_token(header) if header else None
+    if raw_token is None:
+        return None
+    try:
+        return backend.get_validated_token(raw_token)
+    except InvalidToken:
+        return None
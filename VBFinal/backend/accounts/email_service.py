@@ -1,42 +1,50 @@
-from django.core.mail import send_mail
+import logging
+from datetime import timedelta
+
+from django.core.mail import EmailMultiAlternatives, get_connection
 from django.conf import settings
-from .utils import log_email
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from .models import EmailLog, EmailOutbox
+
+logger = logging.getLogger(__name__)
 
 
 class EmailService:
     @staticmethod
     def send_email(subject, message, recipient_list, email_type='general', recipient_user=None, html_message=None):
+        """
+        Queue an email in the outbox. Delivery is done by the outbox worker,
+        so the caller never waits on SMTP. The outbox row and its EmailLog
+        records join the caller's transaction and vanish if it rolls back.
+        """
         try:
-            send_mail(
-                subject=subject,
-                message=message,
-                from_email=settings.DEFAULT_FROM_EMAIL,
-                recipient_list=recipient_list,
-                html_message=html_message,
-                fail_silently=False,
-            )
-            
-            for email in recipient_list:
-                log_email(
-                    email=email,
+            with transaction.atomic():
+                outbox = EmailOutbox.objects.create(
                     subject=subject,
                     message=message,
+                    html_message=html_message,
+                    from_email=settings.DEFAULT_FROM_EMAIL or '',
+                    recipients=list(recipient_list),
                     email_type=email_type,
-                    recipient=recipient_user,
-                    status='sent'
+                    max_attempts=getattr(settings, 'EMAIL_OUTBOX_MAX_ATTEMPTS', 5),
                 )
+                EmailLog.objects.bulk_create([
+                    EmailLog(
+                        recipient=recipient_user,
+                        email=email,
+                        subject=subject,
+                        message=message,
+                        email_type=email_type,
+                        status='pending',
+                        outbox=outbox,
+                    )
+                    for email in recipient_list
+                ])
             return True
         except Exception as e:
-            for email in recipient_list:
-                log_email(
-                    email=email,
-                    subject=subject,
-                    message=message,
-                    email_type=email_type,
-                    recipient=recipient_user,
-                    status='failed',
-                    error_message=str(e)
-                )
+            logger.error(f"Failed to queue {email_type} email to {recipient_list}: {e}")
             return False
 
     @staticmethod
@@ -111,3 +119,127 @@ class EmailService:
             email_type='escalation_alert',
             recipient_user=officer
         )
+
+
+class EmailOutboxWorker:
+    """Drains the email outbox over one reused SMTP connection per batch"""
+
+    def __init__(self, batch_size=None):
+        self.batch_size = batch_size or getattr(settings, 'EMAIL_OUTBOX_BATCH_SIZE', 50)
+        self.lease = timedelta(seconds=getattr(settings, 'EMAIL_OUTBOX_LEASE_SECONDS', 300))
+        self.retry_base = getattr(settings, 'EMAIL_OUTBOX_RETRY_BASE_SECONDS', 60)
+        self.retry_max = getattr(settings, 'EMAIL_OUTBOX_RETRY_MAX_SECONDS', 3600)
+
+    def claim_batch(self):
+        """
+        Lock due rows and lease them to this worker. A row left in 'sending'
+        by a crashed worker becomes due again once its lease runs out.
+        """
+        now = timezone.now()
+        with transaction.atomic():
+            batch = list(
+                EmailOutbox.objects.filter(
+                    status__in=[EmailOutbox.STATUS_QUEUED, EmailOutbox.STATUS_SENDING],
+                    next_attempt_at__lte=now,
+                )
+                .order_by('next_attempt_at')
+                .select_for_update(skip_locked=True)[:self.batch_size]
+            )
+            EmailOutbox.objects.filter(pk__in=[item.pk for item in batch]).update(
+                status=EmailOutbox.STATUS_SENDING,
+                next_attempt_at=now + self.lease,
+            )
+        return batch
+
+    def deliver_batch(self):
+        """Send one claimed batch and return (sent, failed) counts"""
+        batch = self.claim_batch()
+        if not batch:
+            return 0, 0
+
+        try:
+            connection = get_connection(fail_silently=False)
+            connection.open()
+        except Exception as e:
+            for item in batch:
+                self._mark_failed(item, e)
+            return 0, len(batch)
+
+        sent, failed = [], 0
+        try:
+            for item in batch:
+                try:
+                    email = EmailMultiAlternatives(
+                        subject=item.subject,
+                        body=item.message,
+                        from_email=item.from_email or None,
+                        to=item.recipients,
+                        connection=connection,
+                    )
+                    if item.html_message:
+                        email.attach_alternative(item.html_message, 'text/html')
+                    email.send()
+                    sent.append(item.pk)
+                except Exception as e:
+                    failed += 1
+                    self._mark_failed(item, e)
+                    # The server may have dropped us; start the rest of the
+                    # batch on a fresh connection.
+                    connection.close()
+                    try:
+                        connection.open()
+                    except Exception:
+                        pass
+        finally:
+            connection.close()
+
+        if sent:
+            now = timezone.now()
+            with transaction.atomic():
+                EmailOutbox.objects.filter(pk__in=sent).update(
+                    status=EmailOutbox.STATUS_SENT,
+                    attempts=F('attempts') + 1,
+                    sent_at=now,
+                    last_error=None,
+                )
+                EmailLog.objects.filter(outbox_id__in=sent).update(
+                    status='sent',
+                    sent_at=now,
+                    error_message=None,
+                )
+        return len(sent), failed
+
+    def drain(self):
+        """Deliver batches until nothing is due; return totals"""
+        totals = {'sent': 0, 'failed': 0}
+        while True:
+            sent, failed = self.deliver_batch()
+            if not sent and not failed:
+                return totals
+            totals['sent'] += sent
+            totals['failed'] += failed
+
+    def _mark_failed(self, item, error):
+        attempts = item.attempts + 1
+        error_message = str(error)
+        with transaction.atomic():
+            if attempts >= item.max_attempts:
+                EmailOutbox.objects.filter(pk=item.pk).update(
+                    status=EmailOutbox.STATUS_DEAD,
+                    attempts=attempts,
+                    last_error=error_message,
+                )
+                EmailLog.objects.filter(outbox_id=item.pk).update(
+                    status='failed',
+                    error_message=error_message,
+                )
+                logger.error(f"Email outbox {item.pk} moved to dead letter after {attempts} attempts: {error_message}")
+            else:
+                delay = min(self.retry_base * (2 ** (attempts - 1)), self.retry_max)
+                EmailOutbox.objects.filter(pk=item.pk).update(
+                    status=EmailOutbox.STATUS_QUEUED,
+                    attempts=attempts,
+                    next_attempt_at=timezone.now() + timedelta(seconds=delay),
+                    last_error=error_message,
+                )
+                EmailLog.objects.filter(outbox_id=item.pk).update(error_message=error_message)
@@ -0,0 +1,188 @@
+"""
+In-process buffer that batches SystemLog writes and request metrics off the request path
+"""
+import atexit
+import logging
+import os
+import queue
+import threading
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+
+logger = logging.getLogger(__name__)
+
+
+class LogBuffer:
+    """
+    Bounded queue of SystemLog field dicts drained by a daemon thread.
+
+    The flusher wakes every ``flush_interval`` seconds, or as soon as
+    ``batch_size`` records are waiting, and writes them with one
+    ``bulk_create``. What is left is flushed at interpreter exit. A full
+    queue never blocks a request: the record is dropped and counted instead.
+
+    With REQUEST_LOG_BACKGROUND_FLUSH off (the test runner turns it off)
+    neither the thread nor the exit hook is set up, and records are written
+    only by an explicit ``flush()``.
+    """
+
+    def __init__(self, max_size=10000, batch_size=200, flush_interval=2.0):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_size)
+        self._wakeup = threading.Event()
+        self._flush_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._exit_hook = False
+        self._metrics = {}
+        self._metrics_lock = threading.Lock()
+        self.dropped = 0
+        self.written = 0
+        self.failed = 0
+        self.aggregated = 0
+
+    def put(self, **fields):
+        self._ensure_thread()
+        try:
+            self._queue.put_nowait(fields)
+        except queue.Full:
+            self.dropped += 1
+            return False
+        if self._queue.qsize() >= self.batch_size:
+            self._wakeup.set()
+        return True
+
+    def record(self, bucket, route, method, status_class, latency_ms, is_error):
+        """Add one request to its (minute, route, method, status class) counter"""
+        self._ensure_thread()
+        key = (bucket, route, method, status_class)
+        with self._metrics_lock:
+            counter = self._metrics.get(key)
+            if counter is None:
+                counter = self._metrics[key] = [0, 0, 0.0, 0.0]
+            counter[0] += 1
+            counter[1] += int(is_error)
+            counter[2] += latency_ms
+            counter[3] = max(counter[3], latency_ms)
+            self.aggregated += 1
+
+    def flush(self):
+        """Write everything queued so far; safe to call from any thread"""
+        from .models import SystemLog
+
+        with self._flush_lock:
+            self._flush_metrics()
+            total = 0
+            while True:
+                batch = self._take(self.batch_size)
+                if not batch:
+                    return total
+                try:
+                    # Atomic, so a failed batch leaves any outer transaction usable for the retry
+                    with transaction.atomic():
+                        SystemLog.objects.bulk_create([SystemLog(**fields) for fields in batch])
+                    self.written += len(batch)
+                    total += len(batch)
+                except Exception:
+                    logger.exception("Failed to write %d request log records; retrying one by one", len(batch))
+                    close_old_connections()
+                    total += self._write_each(SystemLog, batch)
+
+    def _write_each(self, model, batch):
+        """Fallback for a batch that failed whole: keep every record that can be written"""
+        written = 0
+        for fields in batch:
+            try:
+                with transaction.atomic():
+                    model.objects.create(**fields)
+                written += 1
+            except Exception as exc:
+                self.failed += 1
+                logger.warning("Dropped request log record for %s %s: %s", fields.get('method'), fields.get('path'), exc)
+                close_old_connections()
+        self.written += written
+        return written
+
+    def _flush_metrics(self):
+        from .models import RequestMetric
+
+        with self._metrics_lock:
+            metrics, self._metrics = self._metrics, {}
+
+        for (bucket, route, method, status_class), (count, errors, latency_sum, latency_max) in metrics.items():
+            lookup = dict(bucket=bucket, route=route, method=method, status_class=status_class)
+            increments = dict(
+                count=F('count') + count,
+                error_count=F('error_count') + errors,
+                latency_sum_ms=F('latency_sum_ms') + latency_sum,
+                latency_max_ms=Greatest(F('latency_max_ms'), latency_max),
+            )
+            try:
+                # Other workers write the same buckets, so add to the row rather than overwrite it
+                if RequestMetric.objects.filter(**lookup).update(**increments):
+                    continue
+                try:
+                    with transaction.atomic():
+                        RequestMetric.objects.create(
+                            count=count, error_count=errors,
+                            latency_sum_ms=latency_sum, latency_max_ms=latency_max, **lookup
+                        )
+                except IntegrityError:
+                    RequestMetric.objects.filter(**lookup).update(**increments)
+            except Exception:
+                self.failed += count
+                logger.exception("Failed to write request metrics for %s %s", method, route)
+                close_old_connections()
+
+    def stats(self):
+        return {
+            'buckets': len(self._metrics),
+            'aggregated': self.aggregated,
+            'queued': self._queue.qsize(),
+            'written': self.written,
+            'dropped': self.dropped,
+            'failed': self.failed,
+        }
+
+    def _take(self, limit):
+        batch = []
+        while len(batch) < limit:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _ensure_thread(self):
+        # Started lazily and per process so forked workers get their own flusher
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        if not getattr(settings, 'REQUEST_LOG_BACKGROUND_FLUSH', True):
+            return
+        with self._start_lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='request-log-flusher', daemon=True)
+            self._thread.start()
+            if not self._exit_hook:
+                atexit.register(self.flush)
+                self._exit_hook = True
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+
+log_buffer = LogBuffer(
+    max_size=getattr(settings, 'REQUEST_LOG_QUEUE_SIZE', 10000),
+    batch_size=getattr(settings, 'REQUEST_LOG_BATCH_SIZE', 200),
+    flush_interval=getattr(settings, 'REQUEST_LOG_FLUSH_INTERVAL', 2.0),
+)
\ No newline at end of file
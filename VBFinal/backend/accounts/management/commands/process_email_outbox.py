@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from accounts.email_service import EmailOutboxWorker
+
+
+class Command(BaseCommand):
+    help = "Deliver queued emails from the outbox over pooled SMTP connections"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None, help='Emails sent per SMTP connection')
+        parser.add_argument('--loop', action='store_true', help='Keep polling the outbox instead of exiting when empty')
+        parser.add_argument('--interval', type=float, default=5.0, help='Seconds to sleep between polls with --loop')
+
+    def handle(self, *args, **options):
+        worker = EmailOutboxWorker(batch_size=options['batch_size'])
+
+        while True:
+            totals = worker.drain()
+            if totals['sent'] or totals['failed']:
+                self.stdout.write(f"Outbox drained: {totals['sent']} sent, {totals['failed']} failed")
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts import retention
+
+
+class Command(BaseCommand):
+    help = (
+        "Carry out pending log clears, then expire old SystemLog, EmailLog, RequestMetric and "
+        "UserSession rows according to the retention settings"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Report what would be removed without removing it')
+        parser.add_argument('--chunk-size', type=int, default=None, help='Rows deleted per statement on unpartitioned tables')
+        parser.add_argument('--requests-only', action='store_true',
+                            help='Only carry out the log clears requested from the admin panel')
+        parser.add_argument(
+            '--convert', action='store_true',
+            help='First convert SystemLog and EmailLog to monthly partitions (PostgreSQL, one-off, locks the tables)'
+        )
+
+    def handle(self, *args, **options):
+        if options['convert']:
+            if not retention.supports_partitioning():
+                raise CommandError("Partitioning requires PostgreSQL")
+            for policy in retention.get_policies():
+                if policy.partitioned and retention.convert_to_partitioned(policy):
+                    self.stdout.write(f"Converted {policy.table} to monthly partitions")
+
+        if not options['dry_run']:
+            for table, deleted in retention.apply_purge_requests(chunk_size=options['chunk_size']).items():
+                self.stdout.write(f"Cleared {deleted} rows from {table} on request")
+        if options['requests_only']:
+            return
+
+        for result in retention.apply_all(dry_run=options['dry_run'], chunk_size=options['chunk_size']):
+            verb = 'Would remove' if options['dry_run'] else 'Removed'
+            if result['mode'] == 'partitions':
+                detail = ', '.join(result['dropped']) or 'no partitions'
+                self.stdout.write(f"{verb} {detail} and {result['deleted']} default-partition rows from {result['table']}")
+            else:
+                self.stdout.write(f"{verb} {result['deleted']} rows from {result['table']}")
+        self.stdout.write(self.style.SUCCESS("Log retention applied"))
@@ -1,12 +1,79 @@
+import re
+import time
+
+from django.conf import settings
+from django.utils import timezone
+
+from .utils import get_client_ip
+
 SKIP_PATHS = ['/swagger/', '/redoc/', '/static/', '/admin/jsi18n/']
 
 
+ROUTE_CATEGORIES = {
+    'accounts': 'AUTH',
+    'roles': 'AUTH',
+    'groups': 'AUTH',
+    'permissions': 'AUTH',
+    'complaints': 'COMPLAINT',
+    'comments': 'COMPLAINT',
+    'responses': 'COMPLAINT',
+    'assignments': 'COMPLAINT',
+    'notifications': 'COMPLAINT',
+    'appointments': 'COMPLAINT',
+    'institutions': 'INSTITUTION',
+    'campuses': 'INSTITUTION',
+    'colleges': 'INSTITUTION',
+    'departments': 'INSTITUTION',
+    'contact': 'CONTACT',
+    'feedback': 'FEEDBACK',
+    'system': 'SYSTEM',
+    'system-logs': 'SYSTEM',
+}
+
+NAMED_GROUP = re.compile(r'\(\?P<(\w+)>[^)]*\)')
+# Optional trailing slash of format-suffix routes (``complaints\.(?P<format>...)/?$``)
+OPTIONAL_SLASH = re.compile(r'/\?$')
+
+# Route of requests no URL pattern matched; their raw paths would give every
+# scanner probe a metrics row of its own
+UNMATCHED_ROUTE = '<unmatched>'
+
+
+def route_template(request):
+    """
+    The URL pattern that served the request with parameters left as
+    placeholders, e.g. ``/api/complaints/<pk>/assign/``, or UNMATCHED_ROUTE.
+    """
+    match = getattr(request, 'resolver_match', None)
+    if match is None or not match.route:
+        return UNMATCHED_ROUTE
+    route = NAMED_GROUP.sub(r'<\1>', match.route)
+    route = route.replace('^', '').replace('$', '')
+    route = OPTIONAL_SLASH.sub('', route).replace('\\', '')
+    return route if route.startswith('/') else '/' + route
+
+
+def route_category(route):
+    parts = [part for part in route.split('/') if part and part != 'api']
+    return ROUTE_CATEGORIES.get(parts[0], 'API') if parts else 'API'
+
+
 class RequestLogMiddleware:
+    """
+    Logs API traffic. In ``aggregate`` mode (REQUEST_LOG_MODE) routine
+    requests only bump per-minute RequestMetric counters; errors, warnings,
+    auth writes and view-annotated events still get their own SystemLog row.
+    In ``rows`` mode every request is written as a row.
+    """
+
     def __init__(self, get_response):
         self.get_response = get_response
+        self.aggregate = getattr(settings, 'REQUEST_LOG_MODE', 'rows') == 'aggregate'
 
     def __call__(self, request):
+        started = time.perf_counter()
         response = self.get_response(request)
+        latency_ms = (time.perf_counter() - started) * 1000
 
         # Skip non-API and static paths
         if not request.path.startswith('/api/') or any(request.path.startswith(p) for p in SKIP_PATHS):
@@ -17,49 +84,50 @@ class RequestLogMiddleware:
             return response
 
         try:
-            from .models import SystemLog
+            from .log_buffer import log_buffer
 
-            user = None
-            if hasattr(request, 'user') and request.user and request.user.is_authenticated:
-                user = request.user.email
-
-            ip = request.META.get('HTTP_X_FORWARDED_FOR', request.META.get('REMOTE_ADDR', ''))
-            if ',' in ip:
-                ip = ip.split(',')[0].strip()
+            # Views may describe the event better than the generic line below
+            context = getattr(request, 'log_context', None)
 
             status = response.status_code
             level = 'SUCCESS' if status < 400 else ('WARN' if status < 500 else 'ERROR')
-
             method = request.method
+            route = route_template(request)
+            category = route_category(route)
+
+            if self.aggregate:
+                log_buffer.record(
+                    bucket=timezone.now().replace(second=0, microsecond=0),
+                    route=route,
+                    method=method,
+                    status_class=f"{status // 100}xx",
+                    latency_ms=latency_ms,
+                    is_error=status >= 400,
+                )
+                is_auth_write = category == 'AUTH' and method != 'GET'
+                if level == 'SUCCESS' and context is None and not is_auth_write:
+                    return response
+
+            context = context or {}
+            user = context.get('user')
+            if user is None and hasattr(request, 'user') and request.user and request.user.is_authenticated:
+                user = request.user.email
+
+            ip = get_client_ip(request)
+
             path = request.path
+            message = context.get('message') or f"{method} {path} → {status}"
 
-            # Derive category from path
-            if 'accounts' in path:
-                category = 'AUTH'
-            elif 'complaints' in path:
-                category = 'COMPLAINT'
-            elif 'campuses' in path or 'colleges' in path or 'departments' in path:
-                category = 'INSTITUTION'
-            elif 'contact' in path:
-                category = 'CONTACT'
-            elif 'feedback' in path:
-                category = 'FEEDBACK'
-            elif 'system' in path:
-                category = 'SYSTEM'
-            else:
-                category = 'API'
-
-            message = f"{method} {path} → {status}"
-
-            SystemLog.objects.create(
+            log_buffer.put(
                 level=level,
                 message=message,
-                category=category,
+                category=context.get('category', category),
                 user=user,
-                ip_address=ip or None,
+                ip_address=ip,
                 method=method,
                 path=path,
                 status_code=status,
+                created_at=timezone.now(),
             )
         except Exception:
             pass  # Never break the request
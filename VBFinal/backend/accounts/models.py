@@ -10,6 +10,8 @@ from django.conf import settings
 from django.core.validators import RegexValidator
 from django.core.exceptions import ValidationError
 
+from conf.dirty_fields import DirtyFieldsMixin
+
 
 class SystemLog(models.Model):
     LEVEL_CHOICES = [
@@ -30,12 +32,40 @@ class SystemLog(models.Model):
 
     class Meta:
         ordering = ['-created_at']
-        indexes = [models.Index(fields=['level', 'created_at'])]
+        indexes = [
+            models.Index(fields=['level', 'created_at']),
+            models.Index(fields=['created_at', 'id']),
+        ]
 
     def __str__(self):
         return f"[{self.level}] {self.category}: {self.message[:60]}"
 
 
+class RequestMetric(models.Model):
+    """Per-minute request counters for one (route, method, status class)"""
+    bucket = models.DateTimeField()
+    route = models.CharField(max_length=255)
+    method = models.CharField(max_length=10)
+    status_class = models.CharField(max_length=3)  # '2xx', '4xx', ...
+    count = models.PositiveIntegerField(default=0)
+    error_count = models.PositiveIntegerField(default=0)
+    latency_sum_ms = models.FloatField(default=0)
+    latency_max_ms = models.FloatField(default=0)
+
+    class Meta:
+        ordering = ['-bucket']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['bucket', 'route', 'method', 'status_class'],
+                name='unique_request_metric_bucket',
+            ),
+        ]
+        indexes = [models.Index(fields=['route', 'bucket'])]
+
+    def __str__(self):
+        return f"{self.bucket:%Y-%m-%d %H:%M} {self.method} {self.route} {self.status_class} x{self.count}"
+
+
 class EmailLog(models.Model):
     STATUS_CHOICES = [
         ('sent', 'Sent'),
@@ -65,7 +95,17 @@ class EmailLog(models.Model):
     email_type = models.CharField(max_length=50, choices=EMAIL_TYPE_CHOICES, default='general')
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     error_message = models.TextField(blank=True, null=True)
+    outbox = models.ForeignKey(
+        'EmailOutbox',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='logs'
+    )
     sent_at = models.DateTimeField(auto_now_add=True)
+    # Never updated, unlike sent_at (the outbox worker stamps delivery), so
+    # the retention partitions are keyed on it
+    created_at = models.DateTimeField(default=timezone.now)
     
     class Meta:
         ordering = ['-sent_at']
@@ -78,6 +118,59 @@ class EmailLog(models.Model):
         return f"{self.email_type} to {self.email} - {self.status}"
 
 
+class LogPurgeRequest(models.Model):
+    """A request to empty a log table, carried out by the retention job (accounts.retention)"""
+    table = models.CharField(max_length=100)
+    before = models.DateTimeField(default=timezone.now)
+    requested_by = models.CharField(max_length=255, blank=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['table', 'before'])]
+
+    def __str__(self):
+        return f"Clear {self.table} before {self.before:%Y-%m-%d %H:%M}"
+
+
+class EmailOutbox(models.Model):
+    """Queued outgoing email, delivered by the process_email_outbox worker"""
+
+    STATUS_QUEUED = 'queued'
+    STATUS_SENDING = 'sending'
+    STATUS_SENT = 'sent'
+    STATUS_DEAD = 'dead'
+
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_SENDING, 'Sending'),
+        (STATUS_SENT, 'Sent'),
+        (STATUS_DEAD, 'Dead Letter'),
+    ]
+
+    subject = models.CharField(max_length=255)
+    message = models.TextField()
+    html_message = models.TextField(blank=True, null=True)
+    from_email = models.CharField(max_length=255, blank=True)
+    recipients = models.JSONField(default=list)
+    email_type = models.CharField(max_length=50, choices=EmailLog.EMAIL_TYPE_CHOICES, default='general')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['next_attempt_at']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.email_type}: {self.subject} ({self.status})"
+
+
 class UserManager(BaseUserManager):
     def create_user(self, email, password=None, **extra_fields):
         if not email:
@@ -104,6 +197,19 @@ class UserManager(BaseUserManager):
 
         return self.create_user(email, password, **extra_fields)
 
+    def bulk_create(self, objs, *args, **kwargs):
+        """Fills role_ref and is_staff as User.save would, with one role lookup for the batch"""
+        from .roles import role_registry
+
+        objs = list(objs)
+        role_ids = role_registry.ids_for({user.role for user in objs if user.role})
+        for user in objs:
+            if user.role_ref_id is None:
+                user.sync_role(role_ids)
+            if user.role in (User.ROLE_ADMIN, User.ROLE_SUPER_ADMIN):
+                user.is_staff = True
+        return super().bulk_create(objs, *args, **kwargs)
+
 class Campus(models.Model):
     campus_name = models.CharField(max_length=100, blank=True, null=True)
     location    = models.CharField(max_length=255, blank=True, null=True)
@@ -172,7 +278,7 @@ class Role(models.Model):
     def __str__(self):
         return self.name
         
-class User(AbstractBaseUser, PermissionsMixin):
+class User(DirtyFieldsMixin, AbstractBaseUser, PermissionsMixin):
     ROLE_USER = 'user'  # Complainter
     ROLE_OFFICER = 'officer'  # Resolver
     ROLE_ADMIN = 'admin'  # System Admin
@@ -328,26 +434,29 @@ class User(AbstractBaseUser, PermissionsMixin):
         if self.gmail_account:
             self.gmail_account = self.gmail_account.strip().lower()
 
-        if self.role_ref and self.role_ref.code != self.role:
-            self.role = self.role_ref.code
-        elif self.role:
-            role_obj, _ = Role.objects.get_or_create(
-                code=self.role,
-                defaults={
-                    'name': self.role.replace('_', ' ').title(),
-                    'description': f"System role for {self.role.replace('_', ' ')} users.",
-                    'level': self.ROLE_LEVEL.get(self.role, 1),
-                    'is_system': True,
-                    'is_active': True,
-                },
-            )
-            self.role_ref = role_obj
+        # Most saves (logins, profile edits) leave the role alone and need no lookup
+        if self._state.adding or self.role_ref_id is None or self.has_changed('role') or self.has_changed('role_ref'):
+            self.sync_role()
 
         if self.role in [self.ROLE_ADMIN, self.ROLE_SUPER_ADMIN] and not self.is_staff:
             self.is_staff = True
 
         super().save(*args, **kwargs)
 
+    def sync_role(self, role_ids=None):
+        """
+        Make ``role`` follow ``role_ref`` when they disagree, else point
+        ``role_ref`` at the Role for ``role``. Ids come from the role registry,
+        or from ``role_ids`` ({code: id}) when given.
+        """
+        from .roles import role_registry
+
+        ref_code = role_registry.code_for(self.role_ref_id) if self.role_ref_id else None
+        if ref_code and ref_code != self.role:
+            self.role = ref_code
+        elif self.role:
+            self.role_ref_id = role_ids[self.role] if role_ids else role_registry.id_for(self.role)
+
     def __str__(self):
         return f"{self.full_name} | {self.role.upper()}"
 
@@ -413,12 +522,13 @@ class User(AbstractBaseUser, PermissionsMixin):
     def get_accessible_complaints(self):
         from complaints.models import Complaint
         
+        complaints = Complaint.objects.with_relations()
         if self.can_view_all_complaints():
-            return Complaint.objects.all()
+            return complaints
         elif self.is_resolver():
-            return Complaint.objects.filter(assigned_officer=self)
+            return complaints.filter(assigned_officer=self)
         else:
-            return Complaint.objects.filter(submitted_by=self)
+            return complaints.filter(submitted_by=self)
 
 class PasswordResetToken(models.Model):
     user = models.ForeignKey(
@@ -466,3 +576,28 @@ class EmailVerificationToken(models.Model):
     
     def __str__(self):
         return f"Verification token for {self.user.email}"
+
+
+class UserSession(models.Model):
+    """Last time a user was seen from an address; upserted by accounts.sessions"""
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='sessions'
+    )
+    ip_address = models.GenericIPAddressField()
+    method = models.CharField(max_length=10, blank=True)
+    path = models.CharField(max_length=500, blank=True)
+    user_agent = models.CharField(max_length=255, blank=True)
+    first_seen = models.DateTimeField(default=timezone.now)
+    last_seen = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['-last_seen']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'ip_address'], name='unique_user_session_address'),
+        ]
+        indexes = [models.Index(fields=['last_seen'])]
+
+    def __str__(self):
+        return f"{self.user.email} from {self.ip_address}"
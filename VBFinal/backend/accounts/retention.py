@@ -0,0 +1,361 @@
+"""
+Retention for append-only log tables.
+
+On PostgreSQL, SystemLog and EmailLog can be converted once into tables
+partitioned by month (``purge_logs --convert``). Expiry then drops whole
+partitions, and purges the rows that fell into the DEFAULT partition while no
+monthly one existed for them. Everywhere else, and for unpartitioned tables,
+expired rows are deleted in bounded primary-key chunks so no statement holds
+its locks for long.
+
+Emptying a table on request (the system log "clear" action) is recorded as a
+LogPurgeRequest and carried out by the same job, outside any HTTP request.
+"""
+import logging
+import re
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import SystemLog, EmailLog, LogPurgeRequest, RequestMetric, UserSession
+
+logger = logging.getLogger(__name__)
+
+
+class RetentionPolicy:
+    def __init__(self, name, model, time_field, days, partitioned=False):
+        self.name = name
+        self.model = model
+        self.time_field = time_field
+        self.days = days
+        self.partitioned = partitioned
+
+    @property
+    def table(self):
+        return self.model._meta.db_table
+
+    def cutoff(self, now=None):
+        return (now or timezone.now()) - timedelta(days=self.days)
+
+
+def get_policies():
+    return [
+        RetentionPolicy('system_log', SystemLog, 'created_at',
+                        getattr(settings, 'SYSTEM_LOG_RETENTION_DAYS', 90), partitioned=True),
+        RetentionPolicy('email_log', EmailLog, 'created_at',
+                        getattr(settings, 'EMAIL_LOG_RETENTION_DAYS', 365), partitioned=True),
+        RetentionPolicy('request_metric', RequestMetric, 'bucket',
+                        getattr(settings, 'REQUEST_METRIC_RETENTION_DAYS', 30)),
+        RetentionPolicy('user_session', UserSession, 'last_seen',
+                        getattr(settings, 'USER_SESSION_RETENTION_DAYS', 30)),
+    ]
+
+
+def supports_partitioning():
+    return connection.vendor == 'postgresql'
+
+
+def is_partitioned(model):
+    if not supports_partitioning():
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+            "WHERE c.relname = %s AND pg_table_is_visible(c.oid)",
+            [model._meta.db_table],
+        )
+        return cursor.fetchone() is not None
+
+
+def month_start(moment):
+    return moment.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def add_months(moment, months):
+    month = moment.month - 1 + months
+    return moment.replace(year=moment.year + month // 12, month=month % 12 + 1)
+
+
+def partition_name(table, start):
+    return f"{table}_p{start:%Y%m}"
+
+
+def default_partition_name(table):
+    return f"{table}_default"
+
+
+def time_column(policy):
+    return policy.model._meta.get_field(policy.time_field).column
+
+
+def ensure_partitions(policy, months_ahead=2, since=None):
+    """
+    Create the monthly partitions from ``since`` (default: this month) to
+    ``months_ahead`` months out.
+
+    PostgreSQL refuses a new partition whose range the DEFAULT partition
+    already holds rows of, which happens once the job has lapsed for longer
+    than ``months_ahead``. For such a month the default is detached, the
+    partition created, the rows moved into it and the default re-attached,
+    all in one transaction.
+    """
+    qn = connection.ops.quote_name
+    table, default = policy.table, default_partition_name(policy.table)
+    column = qn(time_column(policy))
+    start = month_start(since or timezone.now())
+    last = add_months(month_start(timezone.now()), months_ahead)
+    created = []
+    with connection.cursor() as cursor:
+        cursor.execute(f"CREATE TABLE IF NOT EXISTS {qn(default)} PARTITION OF {qn(table)} DEFAULT")
+        while start <= last:
+            end = add_months(start, 1)
+            name = partition_name(table, start)
+            cursor.execute("SELECT to_regclass(%s) IS NOT NULL", [name])
+            if not cursor.fetchone()[0]:
+                with transaction.atomic():
+                    cursor.execute(
+                        f"SELECT EXISTS (SELECT 1 FROM {qn(default)} WHERE {column} >= %s AND {column} < %s)",
+                        [start, end],
+                    )
+                    stranded = cursor.fetchone()[0]
+                    if stranded:
+                        cursor.execute(f"ALTER TABLE {qn(table)} DETACH PARTITION {qn(default)}")
+                    cursor.execute(
+                        f"CREATE TABLE {qn(name)} PARTITION OF {qn(table)} FOR VALUES FROM (%s) TO (%s)",
+                        [start, end],
+                    )
+                    if stranded:
+                        cursor.execute(
+                            f"INSERT INTO {qn(name)} SELECT * FROM {qn(default)} "
+                            f"WHERE {column} >= %s AND {column} < %s",
+                            [start, end],
+                        )
+                        cursor.execute(
+                            f"DELETE FROM {qn(default)} WHERE {column} >= %s AND {column} < %s", [start, end]
+                        )
+                        cursor.execute(f"ALTER TABLE {qn(table)} ATTACH PARTITION {qn(default)} DEFAULT")
+                        logger.info("Moved %s rows of %s out of %s", start.strftime('%Y-%m'), table, default)
+            created.append(name)
+            start = end
+    return created
+
+
+def oldest_unexpired_default_row(policy, now=None):
+    """
+    The earliest time in the DEFAULT partition that is not yet expired, or
+    None. Partitions are created from there on, so rows stranded while the
+    job was not running move into monthly partitions again.
+    """
+    qn = connection.ops.quote_name
+    column = qn(time_column(policy))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT min({column}) FROM {qn(default_partition_name(policy.table))} WHERE {column} >= %s",
+            [month_start(policy.cutoff(now))],
+        )
+        oldest = cursor.fetchone()[0]
+    return oldest if oldest is not None and oldest < (now or timezone.now()) else None
+
+
+def purge_default_partition(policy, now=None, chunk_size=None, pause=None, dry_run=False):
+    """Delete the expired rows of the DEFAULT partition, which no partition drop reaches, in chunks"""
+    qn = connection.ops.quote_name
+    default, column = qn(default_partition_name(policy.table)), qn(time_column(policy))
+    cutoff = policy.cutoff(now)
+    chunk_size, pause = chunking(chunk_size, pause)
+    deleted = 0
+    with connection.cursor() as cursor:
+        if dry_run:
+            cursor.execute(f"SELECT count(*) FROM {default} WHERE {column} < %s", [cutoff])
+            return cursor.fetchone()[0]
+        while True:
+            with transaction.atomic():
+                cursor.execute(
+                    f"DELETE FROM {default} WHERE ctid IN "
+                    f"(SELECT ctid FROM {default} WHERE {column} < %s LIMIT %s)",
+                    [cutoff, chunk_size],
+                )
+                count = cursor.rowcount
+            deleted += count
+            if count < chunk_size:
+                return deleted
+            if pause:
+                time.sleep(pause)
+
+
+def drop_expired_partitions(policy, now=None, dry_run=False):
+    """Drop monthly partitions whose whole range is older than the retention cutoff"""
+    qn = connection.ops.quote_name
+    cutoff = policy.cutoff(now)
+    pattern = re.compile(rf"^{re.escape(policy.table)}_p(\d{{4}})(\d{{2}})$")
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent "
+            "WHERE p.relname = %s",
+            [policy.table],
+        )
+        names = sorted(row[0] for row in cursor.fetchall())
+
+        dropped = []
+        for name in names:
+            match = pattern.match(name)
+            if not match:
+                continue
+            start = cutoff.replace(year=int(match.group(1)), month=int(match.group(2)), day=1,
+                                   hour=0, minute=0, second=0, microsecond=0)
+            if add_months(start, 1) > cutoff:
+                continue
+            if not dry_run:
+                cursor.execute(f"DROP TABLE {qn(name)}")
+            dropped.append(name)
+    return dropped
+
+
+def purge_expired_rows(policy, now=None, chunk_size=None, pause=None, dry_run=False):
+    """Delete rows older than the cutoff in primary-key chunks"""
+    queryset = policy.model.objects.filter(**{f"{policy.time_field}__lt": policy.cutoff(now)})
+    if dry_run:
+        return queryset.count()
+    return delete_in_chunks(queryset, chunk_size, pause)
+
+
+def chunking(chunk_size=None, pause=None):
+    chunk_size = chunk_size or getattr(settings, 'LOG_PURGE_CHUNK_SIZE', 5000)
+    pause = getattr(settings, 'LOG_PURGE_PAUSE_SECONDS', 0.05) if pause is None else pause
+    return chunk_size, pause
+
+
+def delete_in_chunks(queryset, chunk_size=None, pause=None):
+    chunk_size, pause = chunking(chunk_size, pause)
+    model = queryset.model
+    deleted = 0
+    while True:
+        ids = list(queryset.order_by('pk').values_list('pk', flat=True)[:chunk_size])
+        if not ids:
+            return deleted
+        with transaction.atomic():
+            count, _ = model.objects.filter(pk__in=ids).delete()
+        deleted += count
+        if pause:
+            time.sleep(pause)
+
+
+def policy_for(model):
+    return next(policy for policy in get_policies() if policy.model is model)
+
+
+def request_clear(model, requested_by=''):
+    """
+    Empty a log table. A partitioned one is TRUNCATEd at once; otherwise a
+    LogPurgeRequest hides the current rows (``cleared_before``) until the
+    retention job deletes them. Returns True when the table is already empty.
+    """
+    if is_partitioned(model):
+        with connection.cursor() as cursor:
+            cursor.execute(f"TRUNCATE {connection.ops.quote_name(model._meta.db_table)}")
+        return True
+    LogPurgeRequest.objects.create(table=model._meta.db_table, requested_by=requested_by or '')
+    return False
+
+
+def cleared_before(model):
+    """The time before which rows of ``model`` were cleared on request, or None"""
+    return (
+        LogPurgeRequest.objects.filter(table=model._meta.db_table)
+        .order_by('-before').values_list('before', flat=True).first()
+    )
+
+
+def apply_purge_requests(chunk_size=None, pause=None):
+    """Carry out the pending LogPurgeRequests; returns ``{table: rows deleted}``"""
+    policies = {policy.table: policy for policy in get_policies()}
+    deleted = {}
+    for purge in LogPurgeRequest.objects.filter(completed_at__isnull=True).order_by('before'):
+        policy = policies.get(purge.table)
+        if policy is not None:
+            expired = policy.model.objects.filter(**{f"{policy.time_field}__lt": purge.before})
+            deleted[purge.table] = deleted.get(purge.table, 0) + delete_in_chunks(expired, chunk_size, pause)
+        LogPurgeRequest.objects.filter(pk=purge.pk).update(completed_at=timezone.now())
+    return deleted
+
+
+def apply(policy, now=None, dry_run=False, chunk_size=None):
+    """Enforce one policy; returns a summary dict"""
+    if policy.partitioned and is_partitioned(policy.model):
+        if not dry_run:
+            ensure_partitions(policy, since=oldest_unexpired_default_row(policy, now))
+        dropped = drop_expired_partitions(policy, now=now, dry_run=dry_run)
+        deleted = purge_default_partition(policy, now=now, chunk_size=chunk_size, dry_run=dry_run)
+        return {'table': policy.table, 'mode': 'partitions', 'dropped': dropped, 'deleted': deleted}
+    deleted = purge_expired_rows(policy, now=now, chunk_size=chunk_size, dry_run=dry_run)
+    return {'table': policy.table, 'mode': 'rows', 'deleted': deleted}
+
+
+def apply_all(now=None, dry_run=False, chunk_size=None):
+    return [apply(policy, now=now, dry_run=dry_run, chunk_size=chunk_size) for policy in get_policies()]
+
+
+def convert_to_partitioned(policy, months_ahead=2):
+    """
+    One-off migration of an existing table to monthly range partitions.
+
+    Runs in a single transaction and copies every row, so schedule it in a
+    maintenance window. The primary key becomes (id, time column) because
+    PostgreSQL requires the partition key in every unique constraint.
+    """
+    if not supports_partitioning():
+        raise RuntimeError("Partitioning requires PostgreSQL")
+    if is_partitioned(policy.model):
+        return False
+
+    qn = connection.ops.quote_name
+    table, column = policy.table, time_column(policy)
+    old = f"{table}_unpartitioned"
+    pk = policy.model._meta.pk.column
+    sequence = f"{table}_{pk}_seq"
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        # Definitions are captured under the current name and replayed once the old table is gone
+        cursor.execute(
+            "SELECT indexdef FROM pg_indexes WHERE tablename = %s AND indexname NOT IN ("
+            "  SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'p')",
+            [table, table],
+        )
+        index_defs = [row[0] for row in cursor.fetchall()]
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE conrelid = %s::regclass AND contype = 'f'",
+            [table],
+        )
+        foreign_keys = cursor.fetchall()
+        cursor.execute(f"SELECT min({qn(column)}) FROM {qn(table)}")
+        oldest = cursor.fetchone()[0]
+
+        cursor.execute(f"ALTER TABLE {qn(table)} RENAME TO {qn(old)}")
+        cursor.execute(
+            f"CREATE TABLE {qn(table)} (LIKE {qn(old)} INCLUDING DEFAULTS) "
+            f"PARTITION BY RANGE ({qn(column)})"
+        )
+        ensure_partitions(policy, months_ahead=months_ahead, since=oldest)
+        cursor.execute(f"INSERT INTO {qn(table)} SELECT * FROM {qn(old)}")
+        cursor.execute(f"DROP TABLE {qn(old)}")
+
+        # Identity columns on partitioned tables need PostgreSQL 17, so use an owned sequence
+        cursor.execute(f"CREATE SEQUENCE {qn(sequence)} OWNED BY {qn(table)}.{qn(pk)}")
+        cursor.execute(
+            f"SELECT setval(%s, COALESCE((SELECT max({qn(pk)}) FROM {qn(table)}), 0) + 1, false)",
+            [sequence],
+        )
+        cursor.execute(f"ALTER TABLE {qn(table)} ALTER COLUMN {qn(pk)} SET DEFAULT nextval(%s)", [sequence])
+        cursor.execute(f"ALTER TABLE {qn(table)} ADD PRIMARY KEY ({qn(pk)}, {qn(column)})")
+        for index_def in index_defs:
+            cursor.execute(index_def)
+        for name, definition in foreign_keys:
+            cursor.execute(f"ALTER TABLE {qn(table)} ADD CONSTRAINT {qn(name)} {definition}")
+
+    logger.info("Converted %s to monthly partitions", table)
+    return True
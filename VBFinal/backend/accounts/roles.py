@@ -0,0 +1,88 @@
+"""
+In-process registry of Role ids by code, so User.save can keep ``role`` and
+``role_ref`` in step without querying the roles table
+"""
+import threading
+
+from django.db import connection
+
+from conf import versions
+
+from .models import Role, User
+
+
+VERSION_CACHE_KEY = 'accounts:role_registry:version'
+
+
+def system_role_defaults(code):
+    label = code.replace('_', ' ')
+    return {
+        'name': label.title(),
+        'description': f"System role for {label} users.",
+        'level': User.ROLE_LEVEL.get(code, 1),
+        'is_system': True,
+        'is_active': True,
+    }
+
+
+class RoleRegistry:
+    """
+    Snapshot of every Role's (id, code), built once per process and rebuilt
+    when its version token (conf.versions) changes; Role signals replace it.
+    Snapshots are only built outside transactions, so an id from a row that
+    is later rolled back is never remembered; inside one, a stale registry
+    falls back to querying.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._ids = {}
+        self._codes = {}
+
+    def invalidate(self):
+        """Publish a new version; every process rebuilds lazily"""
+        versions.token(VERSION_CACHE_KEY).bump()
+        self._version = None
+
+    def code_for(self, role_id):
+        """The code of the role with ``role_id``, or None when there is no such role"""
+        if self._ensure_fresh() and role_id in self._codes:
+            return self._codes[role_id]
+        return Role.objects.filter(pk=role_id).values_list('code', flat=True).first()
+
+    def id_for(self, code):
+        return self.ids_for([code])[code]
+
+    def ids_for(self, codes):
+        """``{code: role id}``, creating a system role for any code that has none"""
+        codes = set(codes)
+        ids = {}
+        if self._ensure_fresh():
+            ids = {code: self._ids[code] for code in codes if code in self._ids}
+        missing = codes - set(ids)
+        if missing:
+            ids.update(Role.objects.filter(code__in=missing).values_list('code', 'pk'))
+            for code in missing - set(ids):
+                role, _ = Role.objects.get_or_create(code=code, defaults=system_role_defaults(code))
+                ids[code] = role.pk
+        return ids
+
+    def _ensure_fresh(self):
+        """Whether the snapshot is current, building it when that is safe"""
+        version = versions.token(VERSION_CACHE_KEY).get()
+        if version is not None and version == self._version:
+            return True
+        if connection.in_atomic_block:
+            return False
+
+        with self._lock:
+            if version != self._version:
+                rows = list(Role.objects.values_list('pk', 'code'))
+                self._codes = dict(rows)
+                self._ids = {code: pk for pk, code in rows}
+                self._version = version
+        return True
+
+
+role_registry = RoleRegistry()
@@ -0,0 +1,60 @@
+"""
+Last-seen tracking for the admin active-sessions view
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import UserSession
+from .utils import get_client_ip
+
+TOUCH_KEY = 'accounts:session:{}:{}'
+
+# (user id, IP) -> monotonic time until which this process skips the shared throttle
+_touched = {}
+TOUCHED_MAX = 10000
+
+
+def touch(user, request):
+    """
+    Upsert the (user, IP) session row, at most once per
+    USER_SESSION_TOUCH_SECONDS. Each process remembers the pairs it touched,
+    so its own requests inside the window cost neither a query nor a cache
+    round trip; a cache.add keeps the other processes from writing too.
+    """
+    ip = get_client_ip(request)
+    if not ip:
+        return False
+
+    interval = getattr(settings, 'USER_SESSION_TOUCH_SECONDS', 60)
+    if _touched.get((user.pk, ip), 0) > time.monotonic():
+        return False
+    if len(_touched) >= TOUCHED_MAX:
+        _touched.clear()
+    _touched[(user.pk, ip)] = time.monotonic() + interval
+    if not cache.add(TOUCH_KEY.format(user.pk, ip), 1, timeout=interval):
+        return False
+
+    now = timezone.now()
+    UserSession.objects.bulk_create(
+        [UserSession(
+            user_id=user.pk,
+            ip_address=ip,
+            method=request.method,
+            path=request.path[:500],
+            user_agent=request.META.get('HTTP_USER_AGENT', '')[:255],
+            first_seen=now,
+            last_seen=now,
+        )],
+        update_conflicts=True,
+        unique_fields=['user', 'ip_address'],
+        update_fields=['method', 'path', 'user_agent', 'last_seen'],
+    )
+    return True
+
+
+def active_sessions(since):
+    """Sessions seen since ``since`` with their users, newest first, in one query"""
+    return UserSession.objects.filter(last_seen__gte=since).select_related('user').order_by('-last_seen')
@@ -1,12 +1,26 @@
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from complaints.models import Complaint, Assignment
 from .email_service import EmailService
+from .models import Role
+from .roles import role_registry
+
+
+@receiver(post_save, sender=Role)
+@receiver(post_delete, sender=Role)
+def invalidate_role_registry(sender, **kwargs):
+    # Now, so this process stops using the old snapshot, and again on commit,
+    # so no process keeps one built before the change was visible
+    role_registry.invalidate()
+    transaction.on_commit(role_registry.invalidate)
 
 
 @receiver(post_save, sender=Complaint)
-def complaint_status_changed(sender, instance, created, **kwargs):
-    if not created and instance.submitted_by:
+def complaint_status_changed(sender, instance, created, update_fields=None, **kwargs):
+    if created or (update_fields is not None and 'status' not in update_fields):
+        return
+    if instance.has_changed('status') and instance.submitted_by_id:
         EmailService.send_complaint_notification(instance.submitted_by, instance)
 
 
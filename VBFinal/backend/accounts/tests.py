@@ -1,3 +1,375 @@
-from django.test import TestCase
+from datetime import timedelta
+from io import StringIO
+from smtplib import SMTPException
+from unittest import mock
 
-# Create your tests here.
+from django.core import mail
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connection
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from django.urls import resolve
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from accounts import retention, sessions
+from accounts.email_service import EmailOutboxWorker, EmailService
+from accounts.log_buffer import LogBuffer
+from accounts.middleware import UNMATCHED_ROUTE, route_category, route_template
+from accounts.models import EmailLog, EmailOutbox, Role, SystemLog, User, UserSession
+from accounts.roles import role_registry
+from accounts.utils import get_client_ip
+from conf import versions
+
+
+# Stand-in for Redis: with the DatabaseCache fallback every cache read would be a query of its own
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "tests"}})
+class RoleRegistryTests(TestCase):
+    """User writes resolve role_ref without querying the roles table"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(email="user@uog.edu.et", first_name="U", last_name="User")
+
+    def test_new_user_gets_its_system_role(self):
+        self.assertEqual(self.user.role_ref.code, User.ROLE_USER)
+        self.assertTrue(self.user.role_ref.is_system)
+
+    def test_unchanged_role_costs_no_lookup(self):
+        user = User.objects.get(pk=self.user.pk)
+        user.auth_provider = User.AUTH_MICROSOFT
+        user.first_name = "Renamed"
+        with self.assertNumQueries(1):
+            user.save()
+        with self.assertNumQueries(1):
+            user.mark_password_as_local_auth()
+
+    def test_role_follows_role_ref(self):
+        admin = User.objects.create(email="admin@uog.edu.et", first_name="A", last_name="Admin", role=User.ROLE_ADMIN)
+        self.assertEqual(admin.role_ref.code, User.ROLE_ADMIN)
+        self.assertTrue(admin.is_staff)
+
+        user = User.objects.get(pk=self.user.pk)
+        user.role_ref = Role.objects.create(name="Officer", code=User.ROLE_OFFICER)
+        user.save()
+        self.assertEqual(User.objects.get(pk=user.pk).role, User.ROLE_OFFICER)
+
+    def test_bulk_create_resolves_roles_once(self):
+        Role.objects.create(name="Admin", code=User.ROLE_ADMIN)
+        users = [
+            User(email=f"bulk{index}@uog.edu.et", first_name="B", last_name=str(index),
+                 role=User.ROLE_ADMIN if index % 2 else User.ROLE_USER)
+            for index in range(10)
+        ]
+        with self.assertNumQueries(2):  # role lookup, insert
+            User.objects.bulk_create(users)
+        admins = User.objects.filter(email__startswith="bulk", role=User.ROLE_ADMIN)
+        self.assertEqual(set(admins.values_list("role_ref__code", "is_staff")), {(User.ROLE_ADMIN, True)})
+
+    def test_snapshot_serves_lookups_outside_transactions(self):
+        self.addCleanup(role_registry.invalidate)
+        role_registry.invalidate()
+        with mock.patch.object(connection, "in_atomic_block", False):
+            role_id = role_registry.id_for(User.ROLE_USER)
+            with self.assertNumQueries(0):
+                self.assertEqual(role_registry.id_for(User.ROLE_USER), role_id)
+                self.assertEqual(role_registry.code_for(role_id), User.ROLE_USER)
+
+        Role.objects.filter(pk=role_id).get().save()  # a Role write publishes a new version
+        with mock.patch.object(connection, "in_atomic_block", False):
+            with self.assertNumQueries(1):
+                role_registry.code_for(role_id)
+
+
+class LogBufferTests(TestCase):
+    """Request logs are queued without blocking and written in batches"""
+
+    def buffer(self, **kwargs):
+        buffer = LogBuffer(**kwargs)
+        patcher = mock.patch.object(buffer, "_ensure_thread")  # flushed by the test, not a thread
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return buffer
+
+    @staticmethod
+    def record(index, **fields):
+        return dict(level="INFO", message=f"GET /api/x/{index}", method="GET", path=f"/api/x/{index}", **fields)
+
+    def test_full_queue_drops_instead_of_blocking(self):
+        buffer = self.buffer(max_size=3)
+        results = [buffer.put(**self.record(index)) for index in range(5)]
+        self.assertEqual(results, [True, True, True, False, False])
+        self.assertEqual(buffer.stats()["dropped"], 2)
+        self.assertEqual(buffer.flush(), 3)
+
+    def test_flush_writes_in_batches(self):
+        buffer = self.buffer(batch_size=2)
+        for index in range(5):
+            buffer.put(**self.record(index))
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(buffer.flush(), 5)
+        self.assertEqual(sum(q["sql"].startswith("INSERT") for q in queries.captured_queries), 3)
+        self.assertEqual(SystemLog.objects.count(), 5)
+        self.assertEqual(buffer.stats()["queued"], 0)
+
+    def test_bad_record_costs_only_itself(self):
+        buffer = self.buffer(batch_size=10)
+        for index in range(3):
+            buffer.put(**self.record(index))
+        buffer.put(**self.record(3, status_code="not a status"))
+        with self.assertLogs("accounts.log_buffer", "WARNING") as logs:
+            self.assertEqual(buffer.flush(), 3)
+        self.assertIn("/api/x/3", logs.output[-1])
+        self.assertEqual(SystemLog.objects.count(), 3)
+        self.assertEqual((buffer.stats()["written"], buffer.stats()["failed"]), (3, 1))
+
+    def test_background_flush_starts_one_thread_and_one_exit_hook(self):
+        buffer = LogBuffer()
+        with mock.patch("accounts.log_buffer.threading.Thread") as thread, \
+                mock.patch("accounts.log_buffer.atexit.register") as register:
+            buffer.put(**self.record(0))
+            self.assertFalse(thread.called)  # the test runner turns the background flush off
+            self.assertFalse(register.called)
+
+            with override_settings(REQUEST_LOG_BACKGROUND_FLUSH=True):
+                buffer.put(**self.record(1))
+                buffer.put(**self.record(2))
+            thread.return_value.start.assert_called_once_with()
+            register.assert_called_once_with(buffer.flush)
+        self.assertEqual(buffer.flush(), 3)
+
+    def test_client_ip_is_validated(self):
+        factory = RequestFactory()
+        request = factory.get("/", HTTP_X_FORWARDED_FOR="203.0.113.7, 10.0.0.1", REMOTE_ADDR="10.0.0.2")
+        self.assertEqual(get_client_ip(request), "203.0.113.7")
+        request = factory.get("/", HTTP_X_FORWARDED_FOR="unknown", REMOTE_ADDR="10.0.0.2")
+        self.assertEqual(get_client_ip(request), "10.0.0.2")
+        request = factory.get("/", HTTP_X_FORWARDED_FOR="<script>", REMOTE_ADDR="")
+        self.assertIsNone(get_client_ip(request))
+
+
+class RouteTemplateTests(SimpleTestCase):
+    """Request metrics are keyed by URL pattern, never by the raw path"""
+
+    def route(self, path):
+        request = RequestFactory().get(path)
+        request.resolver_match = resolve(path)
+        return route_template(request)
+
+    def test_parameters_become_placeholders(self):
+        self.assertEqual(self.route("/api/complaints/"), "/api/complaints/")
+        self.assertEqual(self.route("/api/complaints/CMP-1/"), "/api/complaints/<pk>/")
+        self.assertEqual(self.route("/api/notifications/unread-count/"), "/api/notifications/unread-count/")
+
+    def test_format_suffix_routes(self):
+        self.assertEqual(self.route("/api/complaints.json"), "/api/complaints.<format>")
+        self.assertEqual(self.route("/api/complaints/CMP-1.json"), "/api/complaints/<pk>.<format>")
+
+    def test_unresolved_requests_share_one_route(self):
+        for path in ("/api/../../etc/passwd", "/wp-login.php"):
+            self.assertEqual(route_template(RequestFactory().get(path)), UNMATCHED_ROUTE)
+        self.assertEqual(route_category(UNMATCHED_ROUTE), "API")
+
+
+class EmailOutboxWorkerTests(TestCase):
+    """Outbox rows are retried with backoff, dead-lettered, and re-leased after a crash"""
+
+    def setUp(self):
+        EmailService.send_email("Escalated", "Complaint CMP-1 was escalated", ["officer@uog.edu.et"],
+                                email_type="escalation_alert")
+        self.outbox = EmailOutbox.objects.get()
+
+    def failing_smtp(self):
+        return mock.patch("accounts.email_service.EmailMultiAlternatives.send", side_effect=SMTPException("451 try later"))
+
+    def make_due(self):
+        EmailOutbox.objects.filter(pk=self.outbox.pk).update(next_attempt_at=timezone.now())
+
+    def test_failed_send_is_retried_with_backoff(self):
+        with self.failing_smtp():
+            self.assertEqual(EmailOutboxWorker().drain(), {"sent": 0, "failed": 1})
+        self.outbox.refresh_from_db()
+        self.assertEqual((self.outbox.status, self.outbox.attempts), (EmailOutbox.STATUS_QUEUED, 1))
+        self.assertIn("451", self.outbox.last_error)
+        self.assertGreater(self.outbox.next_attempt_at, timezone.now() + timedelta(seconds=50))
+        self.assertEqual(EmailOutboxWorker().drain(), {"sent": 0, "failed": 0})  # not due yet
+
+        self.make_due()
+        self.assertEqual(EmailOutboxWorker().drain(), {"sent": 1, "failed": 0})
+        self.outbox.refresh_from_db()
+        self.assertEqual((self.outbox.status, self.outbox.attempts), (EmailOutbox.STATUS_SENT, 2))
+        self.assertEqual(EmailLog.objects.get(outbox=self.outbox).status, "sent")
+        self.assertEqual(mail.outbox[0].to, ["officer@uog.edu.et"])
+
+    @override_settings(EMAIL_OUTBOX_MAX_ATTEMPTS=3)
+    def test_exhausted_rows_move_to_the_dead_letter(self):
+        EmailOutbox.objects.all().delete()
+        EmailService.send_email("Escalated", "Complaint CMP-1 was escalated", ["officer@uog.edu.et"])
+        self.outbox = EmailOutbox.objects.get()
+        with self.failing_smtp():
+            for _ in range(3):
+                self.make_due()
+                self.assertEqual(EmailOutboxWorker().drain()["failed"], 1)
+        self.outbox.refresh_from_db()
+        self.assertEqual((self.outbox.status, self.outbox.attempts), (EmailOutbox.STATUS_DEAD, 3))
+        self.assertEqual(EmailLog.objects.get(outbox=self.outbox).status, "failed")
+
+        self.make_due()
+        self.assertEqual(EmailOutboxWorker().drain(), {"sent": 0, "failed": 0})
+        self.assertEqual(mail.outbox, [])
+
+    def test_expired_lease_is_claimed_again(self):
+        crashed = EmailOutboxWorker()
+        self.assertEqual(len(crashed.claim_batch()), 1)  # then dies before sending
+        self.assertEqual(EmailOutboxWorker().drain(), {"sent": 0, "failed": 0})
+
+        EmailOutbox.objects.filter(pk=self.outbox.pk).update(next_attempt_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(EmailOutboxWorker().drain(), {"sent": 1, "failed": 0})
+        self.assertEqual(len(mail.outbox), 1)
+
+
+@override_settings(SYSTEM_LOG_RETENTION_DAYS=90, EMAIL_LOG_RETENTION_DAYS=365, LOG_PURGE_PAUSE_SECONDS=0)
+class LogRetentionTests(TestCase):
+    """Without partitions, expired rows are deleted in primary-key chunks and recent ones are kept"""
+
+    def setUp(self):
+        now = timezone.now()
+        self.expired = SystemLog.objects.bulk_create(
+            SystemLog(level="INFO", message=f"old {index}", created_at=now - timedelta(days=91 + index))
+            for index in range(5)
+        )
+        self.kept = SystemLog.objects.bulk_create([
+            SystemLog(level="INFO", message="recent", created_at=now - timedelta(days=89)),
+            SystemLog(level="INFO", message="today", created_at=now),
+        ])
+        EmailLog.objects.create(email="old@uog.edu.et", subject="Old", message="-",
+                                created_at=now - timedelta(days=366))
+        EmailLog.objects.create(email="new@uog.edu.et", subject="New", message="-")
+        # Delivered just now: retention follows created_at, which delivery never moves
+        EmailLog.objects.filter(email="old@uog.edu.et").update(sent_at=now)
+
+    def purge(self, *args):
+        out = StringIO()
+        call_command("purge_logs", *args, stdout=out)
+        return out.getvalue()
+
+    def test_expired_rows_are_deleted_in_chunks(self):
+        with CaptureQueriesContext(connection) as queries:
+            output = self.purge("--chunk-size", "2")
+        deletes = [q["sql"] for q in queries.captured_queries
+                   if q["sql"].startswith("DELETE") and SystemLog._meta.db_table in q["sql"]]
+        self.assertEqual(len(deletes), 3)  # 2 + 2 + 1
+        self.assertIn(f"Removed 5 rows from {SystemLog._meta.db_table}", output)
+        self.assertEqual(set(SystemLog.objects.values_list("pk", flat=True)), {log.pk for log in self.kept})
+        self.assertEqual(list(EmailLog.objects.values_list("email", flat=True)), ["new@uog.edu.et"])
+
+    def test_dry_run_only_counts(self):
+        output = self.purge("--dry-run", "--chunk-size", "2")
+        self.assertIn(f"Would remove 5 rows from {SystemLog._meta.db_table}", output)
+        self.assertEqual(SystemLog.objects.count(), 7)
+        self.assertEqual(EmailLog.objects.count(), 2)
+
+    def test_clear_hides_rows_at_once_and_deletes_them_in_the_job(self):
+        admin = User.objects.create(email="admin@uog.edu.et", first_name="A", last_name="Admin",
+                                    role=User.ROLE_ADMIN)
+        client = APIClient()
+        client.force_authenticate(admin)
+        with CaptureQueriesContext(connection) as queries:
+            response = client.delete("/api/system-logs/clear/")
+        self.assertEqual(response.status_code, 202)
+        self.assertFalse(any(q["sql"].startswith("DELETE") for q in queries.captured_queries))
+        self.assertEqual(SystemLog.objects.count(), 7)
+
+        later = SystemLog.objects.create(level="INFO", message="after the clear",
+                                         created_at=timezone.now() + timedelta(seconds=1))
+        listed = client.get("/api/system-logs/").json()["results"]
+        self.assertEqual([row["id"] for row in listed], [later.pk])
+
+        output = self.purge("--requests-only", "--chunk-size", "3")
+        self.assertIn(f"Cleared 7 rows from {SystemLog._meta.db_table} on request", output)
+        self.assertEqual(list(SystemLog.objects.values_list("pk", flat=True)), [later.pk])
+        self.assertEqual(EmailLog.objects.count(), 2)  # --requests-only skips the retention policies
+        self.assertEqual(self.purge("--requests-only"), "")
+
+    def test_policy_cutoff_is_exclusive(self):
+        policy = next(policy for policy in retention.get_policies() if policy.model is SystemLog)
+        now = timezone.now()
+        boundary = SystemLog.objects.create(level="INFO", message="boundary", created_at=policy.cutoff(now))
+        self.assertEqual(retention.purge_expired_rows(policy, now=now, chunk_size=4, pause=0), 5)
+        self.assertTrue(SystemLog.objects.filter(pk=boundary.pk).exists())
+
+
+@override_settings(USER_SESSION_TOUCH_SECONDS=60)
+class SessionTrackingTests(TestCase):
+    """Authenticated requests upsert a (user, IP) session row, throttled through the shared cache"""
+
+    IP = "203.0.113.7"
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(email="student@uog.edu.et", first_name="S", last_name="Student")
+        cls.admin = User.objects.create(email="admin@uog.edu.et", first_name="A", last_name="Admin",
+                                        role=User.ROLE_ADMIN)
+
+    def client_for(self, user, refresh=None):
+        refresh = refresh or RefreshToken.for_user(user)
+        client = APIClient(REMOTE_ADDR=self.IP, HTTP_USER_AGENT="pytest")
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {refresh.access_token}")
+        return client
+
+    def setUp(self):
+        # Process-local state outlives the rolled-back shared cache
+        patcher = mock.patch.dict(sessions._touched, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        versions.expire_all()
+
+    def test_authenticated_request_records_a_session(self):
+        self.assertEqual(self.client_for(self.user).get("/api/accounts/me/").status_code, 200)
+        session = UserSession.objects.get(user=self.user)
+        self.assertEqual((session.ip_address, session.method, session.path, session.user_agent),
+                         (self.IP, "GET", "/api/accounts/me/", "pytest"))
+
+        response = self.client_for(self.admin).get("/api/system/active-sessions/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual({(row["email"], row["ip_address"]) for row in response.json()["results"]},
+                         {(self.user.email, self.IP), (self.admin.email, self.IP)})
+        self.assertIn("status_code", response.json()["results"][0])
+
+    def test_touch_is_throttled_across_processes(self):
+        client = self.client_for(self.user)
+        client.get("/api/accounts/me/")
+        first = UserSession.objects.get(user=self.user)
+
+        # Inside the window the authentication path costs the user lookup only, even with the DatabaseCache
+        tables = (UserSession._meta.db_table, "django_cache", "token_blacklist")
+        with CaptureQueriesContext(connection) as queries:
+            client.get("/api/notifications/")
+        self.assertEqual([q["sql"] for q in queries.captured_queries if any(t in q["sql"] for t in tables)], [])
+        self.assertEqual(UserSession.objects.get(pk=first.pk).path, "/api/accounts/me/")
+
+        # Another worker has not touched the pair itself, but finds the shared throttle key
+        sessions._touched.clear()
+        self.assertFalse(sessions.touch(self.user, RequestFactory().get("/", REMOTE_ADDR=self.IP)))
+
+        # Once the window has passed everywhere the row is updated, not duplicated
+        sessions._touched.clear()
+        caches.create_connection("default").delete(sessions.TOUCH_KEY.format(self.user.pk, self.IP))
+        client.get("/api/notifications/")
+        session = UserSession.objects.get(user=self.user)
+        self.assertEqual((session.pk, session.path, session.first_seen), (first.pk, "/api/notifications/", first.first_seen))
+        self.assertGreaterEqual(session.last_seen, first.last_seen)
+
+    def test_logout_revokes_the_access_token(self):
+        refresh = RefreshToken.for_user(self.user)
+        client = self.client_for(self.user, refresh)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = client.post("/api/accounts/logout/", {"refresh": str(refresh)}, format="json")
+        self.assertEqual(response.status_code, 205)
+
+        self.assertEqual(client.get("/api/accounts/me/").status_code, 401)
+        self.assertFalse(UserSession.objects.filter(user=self.user).exists())
+        self.assertEqual(self.client_for(self.user).get("/api/accounts/me/").status_code, 200)
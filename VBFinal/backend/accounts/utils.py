@@ -1,5 +1,6 @@
 from django.utils import timezone
 from datetime import timedelta
+import ipaddress
 import secrets
 from .models import PasswordResetToken, EmailVerificationToken, EmailLog
 
@@ -36,3 +37,18 @@ def log_email(email, subject, message, email_type='general', recipient=None, sta
         status=status,
         error_message=error_message
     )
+
+
+def get_client_ip(request):
+    """
+    First address in X-Forwarded-For, else REMOTE_ADDR; None when neither is
+    a valid IP address, since the header is client-supplied and the columns
+    it ends up in are typed (inet on PostgreSQL)
+    """
+    forwarded = request.META.get('HTTP_X_FORWARDED_FOR', '')
+    for candidate in (forwarded.split(',')[0].strip(), request.META.get('REMOTE_ADDR', '')):
+        try:
+            return str(ipaddress.ip_address(candidate))
+        except ValueError:
+            continue
+    return None
@@ -1,6 +1,7 @@
 from rest_framework import viewsets, status, permissions
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework_simplejwt.views import TokenRefreshView, TokenVerifyView
 from django.contrib.auth.models import Group, Permission
@@ -20,7 +21,10 @@ from .serializers import (
     PermissionSerializer,
     SystemLogSerializer,
 )
+from conf.pagination import SystemLogCursorPagination
+
 from .email_service import EmailService
+from . import authentication, retention, sessions
 from .utils import generate_password_reset_token, generate_email_verification_token
 
 
@@ -118,24 +122,16 @@ class UserViewSet(viewsets.ModelViewSet):
         user = serializer.validated_data["user"]
         refresh = RefreshToken.for_user(user)
 
-        # Log the login session
         try:
-            ip_address = request.META.get('HTTP_X_FORWARDED_FOR', request.META.get('REMOTE_ADDR', ''))
-            if ',' in ip_address:
-                ip_address = ip_address.split(',')[0].strip()
-            
-            SystemLog.objects.create(
-                level='SUCCESS',
-                message=f"User {user.email} logged in",
-                category='AUTH',
-                user=user.email,
-                ip_address=ip_address or None,
-                method='POST',
-                path='/api/accounts/login/',
-                status_code=200,
-            )
-        except Exception as e:
-            pass  # Don't break login if logging fails
+            sessions.touch(user, request)
+        except Exception:
+            pass  # Don't break login if session tracking fails
+
+        # Picked up by RequestLogMiddleware instead of a second log row
+        request._request.log_context = {
+            'user': user.email,
+            'message': f"User {user.email} logged in",
+        }
 
         return Response({
             "refresh": str(refresh),
@@ -164,6 +160,12 @@ class UserViewSet(viewsets.ModelViewSet):
             refresh_token = request.data["refresh"]
             token = RefreshToken(refresh_token)
             token.blacklist()
+            # Unauthenticated endpoint: revoke the presented access token
+            # only when it belongs to the same user as the refresh token
+            access = authentication.presented_access_token(request)
+            user_claim = jwt_settings.USER_ID_CLAIM
+            if access is not None and access.get(user_claim) == token.get(user_claim):
+                authentication.revoke(access)
             return Response({"detail": "Successfully logged out."}, status=status.HTTP_205_RESET_CONTENT)
         except Exception as e:
             return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
@@ -404,77 +406,29 @@ class SystemViewSet(viewsets.ViewSet):
 
     @action(detail=False, methods=['get'], url_path='active-sessions', permission_classes=[permissions.IsAdminUser])
     def active_sessions(self, request):
-        """Get list of active user sessions with IP addresses from recent log entries"""
-        try:
-            from django.utils import timezone
-            
-            # Get sessions from last 24 hours (more reliable than 1 hour)
-            lookback_time = timezone.now() - timedelta(hours=24)
-            
-            # Get all auth-related logs (login, API calls from authenticated users)
-            recent_logs = SystemLog.objects.filter(
-                created_at__gte=lookback_time,
-                user__isnull=False,
-            ).exclude(
-                user=''
-            ).exclude(
-                ip_address__isnull=True
-            ).order_by('-created_at')
-            
-            # Group by user email and get latest activity per IP
-            user_sessions = {}
-            for log in recent_logs:
-                if log.user:
-                    # Create a unique key for each user-IP combination
-                    key = f"{log.user}_{log.ip_address}"
-                    if key not in user_sessions:
-                        # Get user object to fetch full info
-                        try:
-                            user_obj = User.objects.get(email=log.user)
-                            user_sessions[key] = {
-                                'id': user_obj.id,
-                                'email': user_obj.email,
-                                'first_name': user_obj.first_name or 'Unknown',
-                                'last_name': user_obj.last_name or 'User',
-                                'role': user_obj.role,
-                                'ip_address': log.ip_address,
-                                'last_activity': log.created_at.isoformat(),
-                                'method': log.method,
-                                'path': log.path,
-                                'status_code': log.status_code
-                            }
-                        except User.DoesNotExist:
-                            user_sessions[key] = {
-                                'email': log.user,
-                                'first_name': 'Unknown',
-                                'last_name': 'User',
-                                'role': 'user',
-                                'ip_address': log.ip_address,
-                                'last_activity': log.created_at.isoformat(),
-                                'method': log.method,
-                                'path': log.path,
-                                'status_code': log.status_code
-                            }
-            
-            # Sort by most recent activity
-            sessions = sorted(
-                list(user_sessions.values()),
-                key=lambda x: x['last_activity'],
-                reverse=True
-            )
-            
-            return Response({
-                'count': len(sessions),
-                'results': sessions
-            }, status=status.HTTP_200_OK)
-        except Exception as e:
-            import traceback
-            traceback.print_exc()
-            return Response({
-                'count': 0,
-                'results': [],
-                'error': str(e)
-            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        """Get list of active user sessions with IP addresses, seen in the last 24 hours"""
+        from django.utils import timezone
+
+        lookback_time = timezone.now() - timedelta(hours=24)
+        results = [
+            {
+                'id': session.user.id,
+                'email': session.user.email,
+                'first_name': session.user.first_name or 'Unknown',
+                'last_name': session.user.last_name or 'User',
+                'role': session.user.role,
+                'ip_address': session.ip_address,
+                'last_activity': session.last_seen.isoformat(),
+                'method': session.method,
+                'path': session.path,
+                'status_code': None,  # sessions are touched during authentication, before any response
+            }
+            for session in sessions.active_sessions(lookback_time)
+        ]
+        return Response({
+            'count': len(results),
+            'results': results
+        }, status=status.HTTP_200_OK)
 
 
 class MicrosoftAuthViewSet(viewsets.ViewSet):
@@ -540,20 +494,26 @@ class DepartmentViewSet(viewsets.ModelViewSet):
 
 class SystemLogViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = SystemLogSerializer
+    pagination_class = SystemLogCursorPagination
     permission_classes = [permissions.IsAdminUser]
 
     def get_queryset(self):
         qs = SystemLog.objects.all()
+        before = retention.cleared_before(SystemLog)
+        if before is not None:
+            # Cleared on request; the retention job deletes these rows later
+            qs = qs.filter(created_at__gte=before)
         level = self.request.query_params.get('level')
         category = self.request.query_params.get('category')
-        limit = self.request.query_params.get('limit', 100)
         if level:
             qs = qs.filter(level=level.upper())
         if category:
             qs = qs.filter(category=category.upper())
-        return qs[:int(limit)]
+        return qs
 
     @action(detail=False, methods=['delete'], url_path='clear', permission_classes=[permissions.IsAdminUser])
     def clear(self, request):
-        SystemLog.objects.all().delete()
-        return Response({'message': 'Logs cleared.'})
+        if retention.request_clear(SystemLog, requested_by=request.user.email):
+            return Response({'message': 'Logs cleared.'})
+        return Response({'message': 'Logs cleared; they are deleted in the background.'},
+                        status=status.HTTP_202_ACCEPTED)
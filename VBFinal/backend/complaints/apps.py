@@ -3,3 +3,12 @@ from django.apps import AppConfig
 
 class ComplaintsConfig(AppConfig):
     name = 'complaints'
+
+    def ready(self):
+        from django.db.models.signals import post_migrate
+        import complaints.signals
+        from complaints.reference_cache import create_cache_table
+        from complaints.search import ensure_index
+
+        post_migrate.connect(ensure_index, sender=self)
+        post_migrate.connect(create_cache_table, sender=self)
@@ -0,0 +1,199 @@
+"""
+Content-addressed attachment storage.
+
+Each distinct upload is stored once, at ``blobs/<aa>/<bb>/<sha256><ext>``,
+so no directory grows past a few hundred entries. ComplaintAttachment rows
+reference the AttachmentBlob and share its file; ``ref_count`` tracks how
+many rows do. Blobs nobody references are removed, with their previews, by
+``manage.py gc_attachment_blobs`` once ATTACHMENT_BLOB_GC_GRACE_HOURS pass.
+
+A blob's file is written before its row, so a committed row always has its
+content; when the transaction rolls back instead, the file is left without
+a row. The same job sweeps such files out of ``blobs/``.
+"""
+import hashlib
+import logging
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from conf.uploads import upload_digest
+from . import previews
+from .models import AttachmentBlob, ComplaintAttachment
+
+logger = logging.getLogger(__name__)
+
+BLOB_ROOT = 'blobs'
+
+
+def blob_path(digest, filename):
+    extension = os.path.splitext(filename or '')[1].lower()[:10]
+    return f"{BLOB_ROOT}/{digest[:2]}/{digest[2:4]}/{digest}{extension}"
+
+
+def hash_file(file):
+    digest = hashlib.sha256()
+    for chunk in file.chunks():
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+def _reference(digest):
+    """Take a reference on an existing blob; 0 when there is none"""
+    return AttachmentBlob.objects.filter(sha256=digest).update(
+        ref_count=F('ref_count') + 1, updated_at=timezone.now()
+    )
+
+
+def store(file, digest=None, content_type=None):
+    """
+    Return the blob holding ``file``'s content with one more reference taken,
+    writing the file to storage only when the content is new.
+    """
+    digest = digest or hash_file(file)
+    if _reference(digest):
+        return AttachmentBlob.objects.get(sha256=digest)
+
+    name = default_storage.save(blob_path(digest, file.name), file)
+    try:
+        with transaction.atomic():
+            return AttachmentBlob.objects.create(
+                sha256=digest,
+                file=name,
+                size=file.size,
+                content_type=content_type or getattr(file, 'content_type', None) or 'application/octet-stream',
+                ref_count=1,
+            )
+    except IntegrityError:
+        # A concurrent upload of the same content won; use its copy
+        default_storage.delete(name)
+        _reference(digest)
+        return AttachmentBlob.objects.get(sha256=digest)
+
+
+def release(blob_id):
+    """Drop one reference; the file stays until garbage collection"""
+    AttachmentBlob.objects.filter(pk=blob_id).update(
+        ref_count=Greatest(F('ref_count') - 1, 0), updated_at=timezone.now()
+    )
+
+
+def attach_uploads(complaint, request):
+    """Create a ComplaintAttachment for every ``attachment_*`` file in the request"""
+    if not request or not hasattr(request, 'FILES'):
+        return []
+    attachments = []
+    for key, file in request.FILES.items():
+        if not key.startswith('attachment_'):
+            continue
+        blob = store(file, digest=upload_digest(request, key))
+        attachments.append(ComplaintAttachment.objects.create(
+            complaint=complaint,
+            blob=blob,
+            file=blob.file.name,
+            filename=file.name,
+            file_size=file.size,
+            content_type=file.content_type,
+        ))
+    return attachments
+
+
+def recount():
+    """Recompute wrong ref_counts from the attachment rows; returns how many were fixed"""
+    fixed = 0
+    stale = AttachmentBlob.objects.annotate(actual=Count('attachments')).exclude(ref_count=F('actual'))
+    for pk, actual in stale.values_list('pk', 'actual'):
+        AttachmentBlob.objects.filter(pk=pk).update(ref_count=actual, updated_at=timezone.now())
+        fixed += 1
+    return fixed
+
+
+def collect_garbage(now=None, dry_run=False):
+    """
+    Delete unreferenced blobs, their files and their previews once the grace
+    period has passed
+    """
+    grace = timedelta(hours=getattr(settings, 'ATTACHMENT_BLOB_GC_GRACE_HOURS', 24))
+    cutoff = (now or timezone.now()) - grace
+    # A drifted ref_count must not outrank the rows themselves (PROTECT would raise)
+    candidates = AttachmentBlob.objects.filter(ref_count=0, updated_at__lt=cutoff, attachments__isnull=True)
+    removed = freed = 0
+    for blob in candidates.iterator():
+        if dry_run:
+            removed, freed = removed + 1, freed + blob.size
+            continue
+        # Conditional, so a blob an upload has just referenced again survives
+        deleted, _ = AttachmentBlob.objects.filter(
+            pk=blob.pk, ref_count=0, updated_at__lt=cutoff, attachments__isnull=True
+        ).delete()
+        if deleted:
+            try:
+                default_storage.delete(blob.file.name)
+            except OSError:
+                logger.exception("Could not delete blob file %s", blob.file.name)
+            previews.discard([blob.file.name])
+            removed, freed = removed + 1, freed + blob.size
+    return removed, freed
+
+
+def sweep_orphan_files(now=None, dry_run=False):
+    """
+    Delete files under ``blobs/`` that no AttachmentBlob row names, once
+    they are older than the grace period, which covers uploads whose
+    transaction is still open. Returns ``(files removed, bytes freed)``.
+    """
+    grace = timedelta(hours=getattr(settings, 'ATTACHMENT_BLOB_GC_GRACE_HOURS', 24))
+    cutoff = (now or timezone.now()) - grace
+    removed = freed = 0
+    for directory in _blob_directories():
+        try:
+            _, files = default_storage.listdir(directory)
+        except FileNotFoundError:
+            continue
+        names = {f"{directory}/{filename}" for filename in files}
+        names -= set(AttachmentBlob.objects.filter(file__in=names).values_list('file', flat=True))
+        for name in sorted(names):
+            try:
+                if default_storage.get_modified_time(name) >= cutoff:
+                    continue
+                size = default_storage.size(name)
+                if not dry_run:
+                    default_storage.delete(name)
+            except OSError:
+                logger.exception("Could not sweep blob file %s", name)
+                continue
+            removed, freed = removed + 1, freed + size
+    return removed, freed
+
+
+def _blob_directories():
+    """The ``blobs/<aa>/<bb>`` directories in storage"""
+    try:
+        top, _ = default_storage.listdir(BLOB_ROOT)
+    except FileNotFoundError:
+        return
+    for first in sorted(top):
+        try:
+            second, _ = default_storage.listdir(f"{BLOB_ROOT}/{first}")
+        except FileNotFoundError:
+            continue
+        for name in sorted(second):
+            yield f"{BLOB_ROOT}/{first}/{name}"
+
+
+def adopt(attachment):
+    """Move a pre-blob attachment onto a blob, deleting its own file when nothing else uses it"""
+    old_name = attachment.file.name
+    with attachment.file.open('rb') as file:
+        blob = store(file, content_type=attachment.content_type)
+    ComplaintAttachment.objects.filter(pk=attachment.pk).update(blob=blob, file=blob.file.name)
+    if old_name != blob.file.name and not ComplaintAttachment.objects.filter(file=old_name).exists():
+        default_storage.delete(old_name)
+    return blob
@@ -0,0 +1,168 @@
+"""
+Pub/sub that fans new notifications out to the SSE streams of this process.
+
+Subscribers are asyncio queues owned by the ASGI event loop. Publishing is
+safe from any thread: sync views and the escalation scheduler hand payloads
+over with ``call_soon_threadsafe``. NOTIFICATION_STREAM_BACKEND decides how
+payloads reach other worker processes:
+
+- ``complaints.broker.PostgresNotifyBackend`` (the default on PostgreSQL) sends
+  ``pg_notify`` and has every process LISTEN on one channel, so all workers
+  see every notification.
+- ``complaints.broker.LocalBackend`` (the default elsewhere) delivers only
+  within this process.
+"""
+import asyncio
+import json
+import logging
+import select
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connection
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    def __init__(self, user_id, max_pending):
+        self.user_id = str(user_id)
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=max_pending)
+        self.dropped = 0
+
+    def offer(self, payload):
+        # Runs on the subscription's own loop
+        try:
+            self.queue.put_nowait(payload)
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+
+class NotificationBroker:
+    def __init__(self, max_pending=100):
+        self.max_pending = max_pending
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+        self._backend = None
+        self.published = 0
+        self.delivered = 0
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            path = getattr(settings, 'NOTIFICATION_STREAM_BACKEND', 'complaints.broker.LocalBackend')
+            self._backend = import_string(path)(self)
+        return self._backend
+
+    def subscribe(self, user_id):
+        """Register a stream for ``user_id``; call from the event loop"""
+        self.backend.start()
+        subscription = Subscription(user_id, self.max_pending)
+        with self._lock:
+            self._subscribers[subscription.user_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.user_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.user_id]
+
+    def publish(self, user_id, payload):
+        """Send ``payload`` to every stream of ``user_id``, in any process the backend reaches"""
+        self.published += 1
+        try:
+            self.backend.publish(user_id, payload)
+        except Exception:
+            logger.exception("Failed to publish notification for user %s", user_id)
+
+    def dispatch(self, user_id, payload):
+        """Hand a payload to the local streams of ``user_id``; called by backends"""
+        with self._lock:
+            subscribers = list(self._subscribers.get(str(user_id), ()))
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.offer, payload)
+                self.delivered += 1
+            except RuntimeError:
+                # The loop has shut down; the stream is gone
+                self.unsubscribe(subscription)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'users': len(self._subscribers),
+                'streams': sum(len(s) for s in self._subscribers.values()),
+                'published': self.published,
+                'delivered': self.delivered,
+                'backend': type(self.backend).__name__,
+            }
+
+
+class LocalBackend:
+    def __init__(self, broker):
+        self.broker = broker
+
+    def start(self):
+        pass
+
+    def publish(self, user_id, payload):
+        self.broker.dispatch(user_id, payload)
+
+
+class PostgresNotifyBackend:
+    """
+    Cross-process delivery over LISTEN/NOTIFY. Each process keeps one extra
+    database connection, held by a daemon listener thread.
+    """
+    channel = 'cmfs_notifications'
+
+    def __init__(self, broker):
+        self.broker = broker
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._listen, name='notification-listener', daemon=True)
+                self._thread.start()
+
+    def publish(self, user_id, payload):
+        # NOTIFY payloads are capped at 8000 bytes; the stream only needs a summary
+        message = json.dumps({'user_id': user_id, 'payload': payload}, default=str)
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_notify(%s, %s)", [self.channel, message])
+
+    def _listen(self):
+        while True:
+            conn = None
+            try:
+                conn = connection.get_new_connection(connection.get_connection_params())
+                conn.autocommit = True
+                with conn.cursor() as cursor:
+                    cursor.execute(f"LISTEN {self.channel}")
+                while True:
+                    if select.select([conn], [], [], 30) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        notify = conn.notifies.pop(0)
+                        message = json.loads(notify.payload)
+                        self.broker.dispatch(message['user_id'], message['payload'])
+            except Exception:
+                logger.exception("Notification listener lost its connection; reconnecting")
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+                threading.Event().wait(5)
+
+
+broker = NotificationBroker(max_pending=getattr(settings, 'NOTIFICATION_STREAM_MAX_PENDING', 100))
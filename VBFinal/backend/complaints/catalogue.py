@@ -0,0 +1,179 @@
+"""
+Bilingual catalogue of active categories, served by categories/by-language.
+
+One query builds the English and Amharic lists for every institution (and
+for all of them together), pre-rendered to JSON bytes. The result is kept in
+the shared cache under the categories version of reference_cache, which the
+category signals bump, and each process keeps the current version in memory,
+so a request costs one version read and a dict lookup. That copy is rebuilt
+from the table once it is CATEGORY_CATALOGUE_MAX_AGE seconds old, so a change
+no signal reported is not served forever.
+
+Also home to the readers of Category.path: the nested tree, and the backfill
+of rows saved before paths existed, which every path reader runs first.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from . import reference_cache
+from .models import Category
+
+LANGUAGES = ('en', 'am')
+ALL_INSTITUTIONS = 'all'
+CACHE_KEY = 'complaints:catalogue:{}'
+
+COLUMNS = ('category_id', 'institution_id', 'parent_id', 'name', 'name_amharic', 'description', 'description_amharic')
+
+
+def _item(row, language):
+    category_id, institution_id, parent_id, name, name_amharic, description, description_amharic = row
+    amharic = language == 'am'
+    return {
+        'category_id': category_id,
+        'institution': institution_id,
+        'parent': parent_id,
+        'name': name_amharic if amharic and name_amharic else name,
+        'description': description_amharic if amharic and description_amharic else description,
+        'is_active': True,
+    }
+
+
+def build():
+    """``{scope: {language: entry}}`` for every institution and ALL_INSTITUTIONS"""
+    scopes = {ALL_INSTITUTIONS: []}
+    for row in Category.objects.filter(is_active=True).order_by('name', 'category_id').values_list(*COLUMNS):
+        scopes[ALL_INSTITUTIONS].append(row)
+        if row[1] is not None:
+            scopes.setdefault(row[1], []).append(row)
+    return {
+        scope: {language: reference_cache.render([_item(row, language) for row in rows]) for language in LANGUAGES}
+        for scope, rows in scopes.items()
+    }
+
+
+_paths_checked = False
+
+
+def rebuild_paths():
+    """
+    Recompute every Category.path from the parent links. Returns the number
+    of paths changed and the ids of categories in a parent cycle, which have
+    no path and keep an empty one.
+    """
+    children = {}
+    categories = {}
+    for category in Category.objects.only('category_id', 'parent_id', 'path'):
+        categories[category.pk] = category
+        children.setdefault(category.parent_id, []).append(category)
+
+    # Walk down from the roots so every parent's path is known first
+    changed = []
+    pending = [(category, '') for category in children.get(None, [])]
+    while pending:
+        category, prefix = pending.pop()
+        path = prefix + category.pk + Category.PATH_SEPARATOR
+        if category.path != path:
+            category.path = path
+            changed.append(category)
+        pending.extend((child, path) for child in children.get(category.pk, []))
+        categories.pop(category.pk)
+
+    cycles = [category for category in categories.values() if category.path]
+    for category in cycles:
+        category.path = ''
+    with transaction.atomic():
+        Category.objects.bulk_update(changed + cycles, ['path'], batch_size=500)
+        transaction.on_commit(lambda: reference_cache.bump(reference_cache.CATEGORIES))
+    return len(changed), sorted(categories)
+
+
+def ensure_paths():
+    """
+    Backfill paths left empty by rows saved before they existed, the first
+    time this process reads them; Category.save keeps them current after that.
+    An empty path would otherwise match every category as a prefix.
+    """
+    global _paths_checked
+    if _paths_checked:
+        return
+    if Category.objects.filter(path='').exists():
+        rebuild_paths()
+    _paths_checked = True
+
+
+def tree(queryset):
+    """
+    Nest ``queryset`` by parent from one query in path order, where every
+    parent precedes its children. Siblings are sorted by name; a category
+    whose parent is outside ``queryset`` becomes a root. Categories in a
+    parent cycle have no path and are left out.
+    """
+    ensure_paths()
+    nodes, roots = {}, []
+    rows = queryset.exclude(path='').order_by('path').values(
+        'category_id', 'parent_id', 'name', 'name_amharic', 'description', 'description_amharic', 'is_active',
+    )
+    for row in rows:
+        node = {**row, 'children': []}
+        nodes[row['category_id']] = node
+        parent = nodes.get(node.pop('parent_id'))
+        (parent['children'] if parent else roots).append(node)
+    by_name = lambda node: node['name']
+    for node in nodes.values():
+        node['children'].sort(key=by_name)
+    return sorted(roots, key=by_name)
+
+
+class CategoryCatalogue:
+    """Process-local copy of the current catalogue version"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._loaded_at = 0.0
+        self._scopes = {}
+        self._empty = {language: reference_cache.render([]) for language in LANGUAGES}
+
+    def entry(self, institution_id=None, language='en'):
+        """The rendered catalogue of an institution, or of all institutions when none is given"""
+        if language not in LANGUAGES:
+            language = LANGUAGES[0]
+        scopes = self._current()
+        scope = scopes.get(ALL_INSTITUTIONS if institution_id is None else institution_id, self._empty)
+        return scope[language]
+
+    def _current(self):
+        # Read before building, so a catalogue built from rows a concurrent
+        # write has already replaced is filed under the stale version
+        version = reference_cache.version(reference_cache.CATEGORIES)
+        if version == self._version and not self._expired():
+            return self._scopes
+        with self._lock:
+            if version != self._version:
+                scopes = cache.get(CACHE_KEY.format(version))
+                if scopes is None:
+                    scopes = self._build(version)
+            elif self._expired():
+                # Same version, but past its max age: rebuild from the rows in
+                # case a change reached the table without a signal (queryset
+                # update, bulk_create, raw SQL)
+                scopes = self._build(version)
+            else:
+                return self._scopes
+            self._scopes, self._version, self._loaded_at = scopes, version, time.monotonic()
+        return self._scopes
+
+    def _build(self, version):
+        scopes = build()
+        cache.set(CACHE_KEY.format(version), scopes, timeout=reference_cache.cache_timeout())
+        return scopes
+
+    def _expired(self):
+        return time.monotonic() - self._loaded_at >= getattr(settings, 'CATEGORY_CATALOGUE_MAX_AGE', 300)
+
+
+catalogue = CategoryCatalogue()
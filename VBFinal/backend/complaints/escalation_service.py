@@ -1,53 +1,270 @@
 """
 Escalation Service for handling automatic complaint escalations
 """
+import time
+from collections import defaultdict
+
 from django.utils import timezone
+from django.db import transaction
 from django.db.models import Q
-from .models import Complaint, Assignment, ResolverLevel, CategoryResolver
+from .models import Complaint, Assignment, ResolverLevel, CategoryResolver, Notification
+from .routing import routing_table
+from . import inbox, routing, workload
 from accounts.email_service import EmailService
 from accounts.models import User, EmailLog
 
 
+# Number of overdue complaints escalated per transaction
+ESCALATION_BATCH_SIZE = 500
+
+# Complaint columns written by a batched escalation
+ESCALATION_UPDATE_FIELDS = [
+    'current_level',
+    'assigned_officer',
+    'status',
+    'escalation_deadline',
+    'updated_at',
+]
+
+
 class EscalationService:
     """Service for handling automatic escalation of complaints"""
     
     @staticmethod
-    def check_and_escalate_complaints():
+    def check_and_escalate_complaints(batch_size=ESCALATION_BATCH_SIZE):
         """
         Check all pending and in_progress complaints for escalation deadline
         If deadline passed, automatically escalate to next level
+
+        Overdue complaints are processed in chunks of ``batch_size``. Each chunk
+        resolves its next levels and resolvers with a fixed number of queries,
+        writes through bulk_create/bulk_update and sends its notifications once.
+        Complaints locked by a concurrent sweep, or no longer overdue by the
+        time their chunk runs, are counted as ``skipped``.
         """
+        started = time.perf_counter()
         now = timezone.now()
-        escalatable_complaints = Complaint.objects.filter(
-            Q(status='in_progress') | Q(status='pending'),
-            escalation_deadline__isnull=False,
-            escalation_deadline__lte=now
+        timings = defaultdict(float)
+
+        complaint_ids = list(
+            EscalationService._overdue_complaints(now)
+            .order_by('escalation_deadline')
+            .values_list('complaint_id', flat=True)
         )
-        
+        timings['select'] += time.perf_counter() - started
+
         escalation_results = {
-            'total_checked': escalatable_complaints.count(),
+            'total_checked': len(complaint_ids),
             'escalated': 0,
             'failed': 0,
+            'skipped': 0,
             'errors': []
         }
-        
-        for complaint in escalatable_complaints:
+
+        admin_users = []
+        if complaint_ids:
+            admin_users = list(User.objects.filter(role=User.ROLE_ADMIN, is_active=True))
+
+        for offset in range(0, len(complaint_ids), batch_size):
+            EscalationService._escalate_chunk(
+                complaint_ids[offset:offset + batch_size],
+                now,
+                admin_users,
+                escalation_results,
+                timings,
+            )
+
+        timings['total'] = time.perf_counter() - started
+        escalation_results['timings'] = {
+            phase: round(seconds, 4) for phase, seconds in timings.items()
+        }
+        return escalation_results
+
+    @staticmethod
+    def _overdue_complaints(now):
+        return Complaint.objects.filter(
+            Q(status='in_progress') | Q(status='pending'),
+            escalation_deadline__isnull=False,
+            escalation_deadline__lte=now
+        )
+
+    @staticmethod
+    def _escalate_chunk(complaint_ids, now, admin_users, escalation_results, timings):
+        """Escalate one chunk of overdue complaints inside a single transaction"""
+        try:
+            with transaction.atomic():
+                phase_started = time.perf_counter()
+                # Re-check the deadline under lock: a complaint may have been
+                # resolved or picked up by another sweep since the id snapshot.
+                complaints = list(
+                    EscalationService._overdue_complaints(now)
+                    .filter(complaint_id__in=complaint_ids)
+                    .select_related('current_level', 'submitted_by', 'institution')
+                    .select_for_update(of=('self',), skip_locked=True)
+                )
+                timings['load'] += time.perf_counter() - phase_started
+
+                phase_started = time.perf_counter()
+                next_levels = EscalationService._resolve_next_levels(complaints)
+                officers = EscalationService._resolve_officers(complaints, next_levels)
+                timings['resolve'] += time.perf_counter() - phase_started
+
+                phase_started = time.perf_counter()
+                escalated, unresolved, assignments = [], [], []
+                workload_deltas = defaultdict(int)
+                for complaint in complaints:
+                    next_level = next_levels.get(complaint.pk)
+                    officer = officers.get(complaint.pk)
+                    if not officer:
+                        unresolved.append(complaint)
+                        continue
+
+                    workload.transition_deltas(
+                        complaint.assigned_officer_id, complaint.status,
+                        officer.pk, 'escalated',
+                        workload_deltas
+                    )
+
+                    assignments.append(Assignment(
+                        complaint=complaint,
+                        officer=officer,
+                        level=next_level,
+                        reason='escalation'
+                    ))
+                    complaint.current_level = next_level
+                    complaint.assigned_officer = officer
+                    complaint.status = 'escalated'
+                    complaint.set_escalation_deadline()
+                    complaint.updated_at = now
+                    escalated.append(complaint)
+
+                Assignment.objects.bulk_create(assignments)
+                Complaint.objects.bulk_update(escalated, ESCALATION_UPDATE_FIELDS)
+                workload.apply_deltas(workload_deltas)
+                timings['write'] += time.perf_counter() - phase_started
+        except Exception as e:
+            escalation_results['failed'] += len(complaint_ids)
+            escalation_results['errors'].extend(
+                {'complaint_id': str(complaint_id), 'error': str(e)}
+                for complaint_id in complaint_ids
+            )
+            return
+
+        escalation_results['escalated'] += len(escalated)
+        escalation_results['failed'] += len(unresolved)
+        escalation_results['skipped'] += len(complaint_ids) - len(complaints)
+
+        phase_started = time.perf_counter()
+        EscalationService._send_chunk_notifications(escalated, unresolved, admin_users)
+        timings['notify'] += time.perf_counter() - phase_started
+
+    @staticmethod
+    def _resolve_next_levels(complaints):
+        """Map complaint pk to the next resolver level above its current one"""
+        return {
+            complaint.pk: routing_table.next_level(complaint.current_level)
+            for complaint in complaints
+            if complaint.category_id and complaint.current_level
+        }
+
+    @staticmethod
+    def _resolve_officers(complaints, next_levels):
+        """
+        Map complaint pk to the least-loaded active officer at its next level.
+        The candidate officers are read in one query, so one deactivated since
+        the routing table was built is skipped. Loads are read once for the
+        chunk and updated in memory as complaints are handed out, so one chunk
+        spreads across the available officers.
+        """
+        candidates = {}
+        for complaint in complaints:
+            level = next_levels.get(complaint.pk)
+            if level is not None:
+                candidates[complaint.pk] = routing_table.resolvers_for(complaint.category_id, level)
+
+        active = routing.officers(route.officer_id for routes in candidates.values() for route in routes)
+        loads = workload.current_loads(active)
+
+        officers = {}
+        for complaint in complaints:
+            routes = [route for route in candidates.get(complaint.pk, ()) if route.officer_id in active]
+            route = workload.pick_least_loaded(routes, loads)
+            if route:
+                officers[complaint.pk] = active[route.officer_id]
+                loads[route.officer_id] = loads.get(route.officer_id, 0) + 1
+        return officers
+
+    @staticmethod
+    def _send_chunk_notifications(escalated, unresolved, admin_users):
+        """Send emails and create notification rows for one escalated chunk"""
+        notifications = []
+
+        for complaint in escalated:
             try:
-                if complaint.escalate_to_next_level():
-                    escalation_results['escalated'] += 1
-                    EscalationService.send_escalation_notifications(complaint)
-                else:
-                    # No more levels to escalate to, notify admin
-                    escalation_results['failed'] += 1
-                    EscalationService.notify_admin_max_escalation(complaint)
+                EmailService.send_escalation_alert(complaint.assigned_officer, complaint)
+                notifications.append(Notification(
+                    user=complaint.assigned_officer,
+                    complaint=complaint,
+                    notification_type='escalation_assigned',
+                    title=f"Complaint Escalated: {complaint.title}",
+                    message=f"Complaint {complaint.complaint_id} has been escalated to your level for resolution."
+                ))
+
+                EmailService.send_complaint_notification(complaint.submitted_by, complaint)
+                notifications.append(Notification(
+                    user=complaint.submitted_by,
+                    complaint=complaint,
+                    notification_type='escalation_update',
+                    title="Your Complaint Has Been Escalated",
+                    message=f"Your complaint {complaint.complaint_id} has been escalated to a higher level for faster resolution."
+                ))
+
+                if complaint.institution:
+                    for admin in admin_users:
+                        EmailService.send_email(
+                            subject=f"Escalation Alert: {complaint.title}",
+                            message=f"Complaint {complaint.complaint_id} in {complaint.institution.name} has been escalated.",
+                            recipient_list=[admin.email],
+                            email_type='escalation_alert',
+                            recipient_user=admin
+                        )
             except Exception as e:
-                escalation_results['failed'] += 1
-                escalation_results['errors'].append({
-                    'complaint_id': str(complaint.complaint_id),
-                    'error': str(e)
-                })
-        
-        return escalation_results
+                print(f"Error sending escalation notifications for complaint {complaint.complaint_id}: {str(e)}")
+
+        for complaint in unresolved:
+            subject = f"URGENT: Complaint Requires Admin Intervention - {complaint.title}"
+            message = f"""
+Complaint ID: {complaint.complaint_id}
+Title: {complaint.title}
+Status: {complaint.get_status_display()}
+
+This complaint has reached the maximum escalation level and requires administrative intervention.
+            """
+            for admin in admin_users:
+                try:
+                    EmailService.send_email(
+                        subject=subject,
+                        message=message,
+                        recipient_list=[admin.email],
+                        email_type='escalation_alert',
+                        recipient_user=admin
+                    )
+                except Exception as e:
+                    print(f"Error notifying admin for max escalation: {str(e)}")
+                notifications.append(Notification(
+                    user=admin,
+                    complaint=complaint,
+                    notification_type='max_escalation',
+                    title="URGENT: Complaint Requires Admin Intervention",
+                    message=f"Complaint {complaint.complaint_id} has reached maximum escalation and needs immediate attention."
+                ))
+
+        try:
+            Notification.objects.bulk_create(notifications)
+            # bulk_create sends no post_save, so bump the unread counters here
+            inbox.created(notifications)
+        except Exception as e:
+            print(f"Error creating notifications: {str(e)}")
     
     @staticmethod
     def send_escalation_notifications(complaint):
@@ -0,0 +1,81 @@
+"""
+Query-string filters shared by the complaint list and export endpoints
+"""
+from datetime import datetime, time, timedelta
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.exceptions import ValidationError
+
+from .catalogue import ensure_paths
+from .models import Category
+
+# query parameter -> lookup; values may be comma-separated
+FILTERS = {
+    'status': 'status__in',
+    'institution': 'institution_id__in',
+    'category': 'category_id__in',
+    'level': 'current_level_id__in',
+    'officer': 'assigned_officer_id__in',
+}
+
+
+def parse_moment(value, end_of_day=False):
+    """An ISO datetime, or a date meaning its start (or, with ``end_of_day``, the next day's start)"""
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(value)
+        moment = datetime.combine(day, time.min)
+        if end_of_day:
+            moment += timedelta(days=1)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def split(value):
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+
+def category_branches(category_ids):
+    """Complaints filed under any of the categories or anywhere below them"""
+    ensure_paths()
+    paths = list(Category.objects.filter(pk__in=category_ids).values_list('path', flat=True))
+    if len(paths) != len(set(category_ids)):
+        raise ValidationError({'filters': "Invalid filter value: unknown category_branch"})
+    if '' in paths:
+        # Left empty only for a parent cycle; as a prefix it would match everything
+        raise ValidationError({'filters': "Invalid filter value: category_branch is in a parent cycle"})
+    branches = Q()
+    for path in paths:
+        branches |= Q(category__path__startswith=path)
+    return branches
+
+
+def filter_complaints(queryset, params):
+    """
+    Narrow ``queryset`` by ``status``, ``institution``, ``category``, ``level``,
+    ``officer``, ``category_branch`` (a category and its subcategories),
+    ``created_after`` and ``created_before`` (dates or datetimes; a bare
+    ``created_before`` date is inclusive).
+    Raises a DRF ValidationError for malformed values.
+    """
+    lookups = {}
+    for param, lookup in FILTERS.items():
+        value = params.get(param)
+        if value:
+            lookups[lookup] = split(value)
+    if params.get('category_branch'):
+        queryset = queryset.filter(category_branches(split(params['category_branch'])))
+    try:
+        if params.get('created_after'):
+            lookups['created_at__gte'] = parse_moment(params['created_after'])
+        if params.get('created_before'):
+            lookups['created_at__lt'] = parse_moment(params['created_before'], end_of_day=True)
+        return queryset.filter(**lookups)
+    except (ValueError, DjangoValidationError) as exc:
+        raise ValidationError({'filters': f"Invalid filter value: {exc}"})
@@ -0,0 +1,111 @@
+"""
+Per-user notification inbox: cached unread counters and set-based read updates
+"""
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from .broker import broker
+from .models import Notification
+
+
+def _key(user_id):
+    return f"complaints:unread:{user_id}"
+
+
+def _timeout():
+    return getattr(settings, 'NOTIFICATION_UNREAD_CACHE_SECONDS', 600)
+
+
+def unread_count(user_id):
+    """Unread notifications of a user; a COUNT only when the counter is cold"""
+    count = cache.get(_key(user_id))
+    if count is None:
+        count = Notification.objects.filter(user_id=user_id, is_read=False).count()
+        # add, not set: a concurrent adjust() may already have seeded the key
+        cache.add(_key(user_id), count, timeout=_timeout())
+        count = cache.get(_key(user_id), count)
+    return max(count, 0)
+
+
+def unread_counts(user_ids):
+    """
+    ``{user_id: unread}`` for many users: warm counters from one cache read,
+    the cold ones from one grouped COUNT. Cold counters are left cold, for
+    callers that run while rows the COUNT already sees may still be added to
+    the counter.
+    """
+    keys = {_key(user_id): user_id for user_id in set(user_ids)}
+    counts = {keys[key]: max(count, 0) for key, count in cache.get_many(list(keys)).items()}
+    cold = set(keys.values()) - set(counts)
+    if cold:
+        counts.update(dict.fromkeys(cold, 0))
+        counts.update(
+            Notification.objects.filter(user_id__in=cold, is_read=False).order_by()
+            .values('user_id').annotate(unread=Count('pk')).values_list('user_id', 'unread')
+        )
+    return counts
+
+
+def adjust(user_id, delta):
+    """Shift a warm counter; a cold one is left for the next read to recount"""
+    if not delta:
+        return
+    try:
+        if cache.incr(_key(user_id), delta) < 0:
+            cache.delete(_key(user_id))
+    except ValueError:
+        pass
+
+
+def invalidate(user_id):
+    cache.delete(_key(user_id))
+
+
+def stream_payload(notification):
+    """The summary pushed to SSE clients; small enough for a pg_notify payload"""
+    return {
+        'id': notification.pk,
+        'notification_type': notification.notification_type,
+        'title': notification.title[:255],
+        'message': notification.message[:1000],
+        'complaint_id': str(notification.complaint_id) if notification.complaint_id else None,
+        'created_at': notification.created_at.isoformat() if notification.created_at else None,
+    }
+
+
+def created(notifications):
+    """
+    Account for newly inserted notifications, including bulk_create ones,
+    once committed: bump the unread counters and push them to open streams.
+    """
+    counts = Counter(n.user_id for n in notifications if not n.is_read)
+    payloads = [(n.user_id, stream_payload(n)) for n in notifications]
+
+    def apply():
+        for user_id, count in counts.items():
+            adjust(user_id, count)
+        # Once per user, not per notification. Not seeded: the callbacks of
+        # later notifications from the same transaction would add rows this
+        # COUNT already includes
+        unread = unread_counts(user_id for user_id, _ in payloads)
+        for user_id, payload in payloads:
+            payload['unread'] = unread[user_id]
+            broker.publish(user_id, payload)
+
+    transaction.on_commit(apply)
+
+
+def mark_read(user_id, ids=None):
+    """Mark the user's unread notifications (all, or only ``ids``) read in one UPDATE"""
+    unread = Notification.objects.filter(user_id=user_id, is_read=False)
+    if ids is not None:
+        unread = unread.filter(pk__in=ids)
+    updated = unread.update(is_read=True, read_at=timezone.now())
+    if updated:
+        transaction.on_commit(lambda: adjust(user_id, -updated))
+    return updated
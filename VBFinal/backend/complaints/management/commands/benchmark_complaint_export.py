@@ -0,0 +1,86 @@
+import time
+import tracemalloc
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from accounts.models import User
+from complaints import export
+from complaints.models import Institution, Category, ResolverLevel, Complaint, Assignment, Comment
+from conf.streaming import csv_lines, jsonl_lines
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Measure complaint export throughput and peak memory, optionally on rolled-back synthetic data"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=0,
+                            help="Insert this many synthetic complaints first; they are rolled back afterwards")
+        parser.add_argument('--output', choices=['csv', 'jsonl'], default='csv')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                if options['seed']:
+                    self.seed(options['seed'])
+                self.measure(options['output'], options['chunk_size'])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def seed(self, count):
+        started = time.perf_counter()
+        institution = Institution.objects.create(name="Benchmark", domain="benchmark.invalid")
+        category = Category.objects.create(institution=institution, name="Benchmark")
+        level = ResolverLevel.objects.create(
+            institution=institution, name="Benchmark", level_order=1, escalation_time=timedelta(hours=1)
+        )
+        officer = User.objects.create(email="officer@benchmark.invalid", first_name="B", last_name="Officer", role=User.ROLE_OFFICER)
+        submitter = User.objects.create(email="user@benchmark.invalid", first_name="B", last_name="User")
+
+        for start in range(0, count, 5000):
+            complaints = Complaint.objects.bulk_create([
+                Complaint(
+                    institution=institution, category=category, current_level=level,
+                    assigned_officer=officer, submitted_by=submitter,
+                    title=f"Benchmark complaint {index}", description="Synthetic", status="resolved",
+                )
+                for index in range(start, min(start + 5000, count))
+            ])
+            Assignment.objects.bulk_create(
+                [Assignment(complaint=c, officer=officer, level=level, reason='initial') for c in complaints]
+                + [Assignment(complaint=c, officer=officer, level=level, reason='escalation') for c in complaints[::3]]
+            )
+            Comment.objects.bulk_create([
+                Comment(complaint=c, author=submitter, comment_type='rating', message="", rating=4)
+                for c in complaints[::2]
+            ])
+        self.stdout.write(f"Seeded {count} complaints in {time.perf_counter() - started:.1f}s")
+
+    def measure(self, output, chunk_size):
+        lines = csv_lines if output == 'csv' else jsonl_lines
+        rows = export.rows(Complaint.objects.all(), chunk_size=chunk_size)
+
+        tracemalloc.start()
+        started = time.perf_counter()
+        count = size = 0
+        for line in lines(export.HEADER, rows):
+            count += 1
+            size += len(line)
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        if output == 'csv':
+            count -= 1  # header line
+        self.stdout.write(self.style.SUCCESS(
+            f"Exported {count} complaints as {output} in {elapsed:.2f}s "
+            f"({count / elapsed if elapsed else 0:,.0f} rows/s, {size / 1e6:.1f} MB, "
+            f"peak traced memory {peak / 1e6:.1f} MB)"
+        ))
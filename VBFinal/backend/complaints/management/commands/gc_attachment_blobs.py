@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+from complaints import blobs
+from complaints.models import ComplaintAttachment
+
+
+class Command(BaseCommand):
+    help = "Delete attachment blobs that no attachment references any more"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Report what would be removed without removing it')
+        parser.add_argument('--recount', action='store_true', help='First recompute reference counts from the attachment rows')
+        parser.add_argument(
+            '--adopt-legacy', action='store_true',
+            help='First move attachments stored before deduplication onto blobs, deleting their own copies'
+        )
+
+    def handle(self, *args, **options):
+        if options['adopt_legacy']:
+            adopted = missing = 0
+            for attachment in ComplaintAttachment.objects.filter(blob__isnull=True).iterator():
+                try:
+                    blobs.adopt(attachment)
+                    adopted += 1
+                except FileNotFoundError:
+                    missing += 1
+                    self.stderr.write(f"Missing file for attachment {attachment.pk}: {attachment.file.name}")
+            self.stdout.write(f"Moved {adopted} legacy attachments onto blobs ({missing} files missing)")
+
+        if options['recount']:
+            self.stdout.write(f"Fixed {blobs.recount()} reference counts")
+
+        removed, freed = blobs.collect_garbage(dry_run=options['dry_run'])
+        verb = 'Would remove' if options['dry_run'] else 'Removed'
+        self.stdout.write(self.style.SUCCESS(f"{verb} {removed} unreferenced blobs ({freed / 1e6:.1f} MB)"))
+        removed, freed = blobs.sweep_orphan_files(dry_run=options['dry_run'])
+        self.stdout.write(self.style.SUCCESS(f"{verb} {removed} blob files without a row ({freed / 1e6:.1f} MB)"))
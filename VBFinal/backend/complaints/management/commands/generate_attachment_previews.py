@@ -0,0 +1,51 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from complaints import previews
+from complaints.models import AttachmentPreview, ComplaintAttachment, Response
+
+
+class Command(BaseCommand):
+    help = "Generate thumbnails and web previews for queued image attachments"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None, help='Images claimed per batch')
+        parser.add_argument('--loop', action='store_true', help='Keep polling the queue instead of exiting when empty')
+        parser.add_argument('--interval', type=float, default=5.0, help='Seconds to sleep between polls with --loop')
+        parser.add_argument('--backfill', action='store_true', help='First queue image attachments uploaded before previews existed')
+        parser.add_argument('--retry-failed', action='store_true', help='First requeue previews that ran out of attempts')
+
+    def handle(self, *args, **options):
+        if options['backfill']:
+            self.stdout.write(f"Queued {self.backfill()} existing attachments")
+        if options['retry_failed']:
+            count = AttachmentPreview.objects.filter(status=AttachmentPreview.STATUS_FAILED).update(
+                status=AttachmentPreview.STATUS_PENDING, attempts=0
+            )
+            self.stdout.write(f"Requeued {count} failed previews")
+
+        worker = previews.PreviewWorker(batch_size=options['batch_size'])
+        while True:
+            totals = worker.drain()
+            if totals['ready'] or totals['failed']:
+                self.stdout.write(f"Previews: {totals['ready']} generated, {totals['failed']} failed")
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
+
+    def backfill(self):
+        queued = 0
+        attachments = ComplaintAttachment.objects.filter(preview__isnull=True).only('pk', 'file', 'content_type')
+        for attachment in attachments.iterator():
+            if previews.is_image(attachment.file.name, attachment.content_type):
+                preview = previews.enqueue(attachment.file.name)
+                ComplaintAttachment.objects.filter(pk=attachment.pk).update(preview=preview)
+                queued += 1
+        responses = Response.objects.filter(attachment_preview__isnull=True).exclude(attachment='').exclude(attachment=None)
+        for response in responses.only('pk', 'attachment').iterator():
+            if previews.is_image(response.attachment.name):
+                preview = previews.enqueue(response.attachment.name)
+                Response.objects.filter(pk=response.pk).update(attachment_preview=preview)
+                queued += 1
+        return queued
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from complaints.catalogue import rebuild_paths
+
+
+class Command(BaseCommand):
+    help = "Recompute every Category.path from the parent links (for rows saved before paths existed)"
+
+    def handle(self, *args, **options):
+        changed, cycles = rebuild_paths()
+        self.stdout.write(self.style.SUCCESS(f"Updated {changed} category paths"))
+        if cycles:
+            self.stdout.write(self.style.WARNING(
+                f"{len(cycles)} categories are in a parent cycle and were left without a path: "
+                + ", ".join(cycles)
+            ))
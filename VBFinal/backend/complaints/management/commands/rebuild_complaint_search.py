@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from complaints import search
+from complaints.models import Complaint
+
+
+class Command(BaseCommand):
+    help = "Recompute the stored full-text search vector of every complaint"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if not search.is_supported():
+            raise CommandError("Stored search vectors require PostgreSQL")
+
+        search.ensure_index()
+        batch_size = options['batch_size']
+        ids = Complaint.objects.order_by('pk').values_list('pk', flat=True)
+        updated = 0
+        batch = []
+        for pk in ids.iterator(chunk_size=batch_size):
+            batch.append(pk)
+            if len(batch) == batch_size:
+                updated += search.refresh(batch)
+                batch = []
+        updated += search.refresh(batch)
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt search vectors for {updated} complaints"))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+
+from complaints.models import Complaint, OfficerWorkload
+from complaints.workload import OPEN_STATUSES
+
+
+class Command(BaseCommand):
+    help = "Recompute the per-officer open complaint counters from the complaints table"
+
+    def handle(self, *args, **options):
+        counts = dict(
+            Complaint.objects.filter(
+                status__in=OPEN_STATUSES,
+                assigned_officer__isnull=False
+            ).values('assigned_officer').annotate(total=Count('pk')).values_list('assigned_officer', 'total')
+        )
+
+        with transaction.atomic():
+            OfficerWorkload.objects.exclude(officer_id__in=counts.keys()).update(open_complaints=0)
+            OfficerWorkload.objects.bulk_create(
+                [
+                    OfficerWorkload(officer_id=officer_id, open_complaints=total)
+                    for officer_id, total in counts.items()
+                ],
+                update_conflicts=True,
+                unique_fields=['officer'],
+                update_fields=['open_complaints', 'updated_at'],
+            )
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt workload counters for {len(counts)} officers"))
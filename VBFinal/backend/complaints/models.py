@@ -1,8 +1,14 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Value
+from django.db.models.functions import Concat, Substr
 from django.conf import settings
+from django.contrib.postgres.search import SearchVectorField
+from django.core.validators import MinValueValidator
 from django.utils import timezone
 import uuid
 
+from conf.dirty_fields import DirtyFieldsMixin
+
 class Institution(models.Model):
     name = models.CharField(max_length=255)
     domain = models.CharField(max_length=255, unique=True)
@@ -11,7 +17,9 @@ class Institution(models.Model):
     def __str__(self):
         return self.name
 
-class Category(models.Model):
+class Category(DirtyFieldsMixin, models.Model):
+    PATH_SEPARATOR = '/'
+
     category_id = models.CharField(
         max_length=30,
         primary_key=True,
@@ -38,6 +46,9 @@ class Category(models.Model):
         related_name="children",
         on_delete=models.CASCADE
     )
+    # Materialized path: ancestor ids then its own, each followed by "/".
+    # A subtree is every row whose path starts with its root's path.
+    path = models.CharField(max_length=255, db_index=True, editable=False, default='')
 
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -49,13 +60,71 @@ class Category(models.Model):
     def save(self, *args, **kwargs):
         if not self.category_id:
             self.category_id = f"CAT-{uuid.uuid4().hex[:10].upper()}"
+
+        update_fields = kwargs.get('update_fields')
+        moved = self._state.adding or not self.path or self.has_changed('parent')
+        if moved and (update_fields is None or 'parent' in update_fields):
+            old_path = None if self._state.adding else self.original_value('path')
+            self.path = self.build_path()
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'path'}
+            with transaction.atomic():
+                super().save(*args, **kwargs)
+                if old_path and old_path != self.path:
+                    self.move_descendants(old_path)
+            return
         super().save(*args, **kwargs)
 
+    def build_path(self):
+        """
+        This category's path under its current parent. Ancestors whose path
+        is not built yet are walked up to the first one that has a path, or
+        to the root; meeting the same category twice means a parent cycle.
+        """
+        if self.parent_id is None:
+            return self.category_id + self.PATH_SEPARATOR
+        cycle = ValueError("A category cannot be moved under itself or one of its descendants")
+        pathless = []
+        seen = {self.category_id}
+        ancestor, prefix = self.parent, ''
+        while True:
+            if ancestor.category_id in seen:
+                raise cycle
+            seen.add(ancestor.category_id)
+            if ancestor.path:
+                prefix = ancestor.path
+                break
+            pathless.append(ancestor.category_id)
+            if ancestor.parent_id is None:
+                break
+            ancestor = ancestor.parent
+        parent_path = prefix + ''.join(category_id + self.PATH_SEPARATOR for category_id in reversed(pathless))
+        if self.category_id in parent_path.split(self.PATH_SEPARATOR):
+            raise cycle
+        path = parent_path + self.category_id + self.PATH_SEPARATOR
+        if len(path) > self._meta.get_field('path').max_length:
+            raise ValueError("Category hierarchy is too deep")
+        return path
+
+    def move_descendants(self, old_path):
+        """Rewrite the path prefix of every category that was below ``old_path``"""
+        Category.objects.filter(path__startswith=old_path).exclude(pk=self.pk).update(
+            path=Concat(Value(self.path), Substr('path', len(old_path) + 1), output_field=models.CharField())
+        )
+
+    def subtree(self, include_self=True):
+        """This category and everything below it, from the path index"""
+        queryset = Category.objects.filter(path__startswith=self.path)
+        return queryset if include_self else queryset.exclude(pk=self.pk)
+
+    @property
+    def depth(self):
+        return self.path.count(self.PATH_SEPARATOR) - 1
+
     def __str__(self):
         return self.name
 
 
-
 class ResolverLevel(models.Model):
     institution = models.ForeignKey(
         Institution,
@@ -96,6 +165,12 @@ class CategoryResolver(models.Model):
     )
 
     active = models.BooleanField(default=True)
+    weight = models.PositiveSmallIntegerField(
+        default=1,
+        validators=[MinValueValidator(1)],
+        help_text="Relative share of new complaints this officer should receive (at least 1; "
+                  "clear active to stop assigning)"
+    )
 
     class Meta:
         unique_together = ("category", "level", "officer")
@@ -105,7 +180,38 @@ class CategoryResolver(models.Model):
 
 
 
-class Complaint(models.Model):
+class OfficerWorkload(models.Model):
+    """Number of open complaints assigned to an officer, maintained by complaints.workload"""
+    officer = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="workload"
+    )
+    open_complaints = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.officer} - {self.open_complaints} open"
+
+
+class ComplaintQuerySet(models.QuerySet):
+    def with_relations(self):
+        """Preload everything ComplaintSerializer renders, in a fixed number of queries"""
+        return self.select_related(
+            "submitted_by",
+            "assigned_officer",
+            "institution",
+            "category__institution",
+            "category__parent",
+            "current_level__institution",
+        ).prefetch_related(
+            models.Prefetch("attachments", queryset=ComplaintAttachment.objects.select_related("preview")),
+            "cc_list",
+        ).defer("search_vector")
+
+
+class Complaint(DirtyFieldsMixin, models.Model):
     STATUS_CHOICES = [
         ("pending", "Pending"),
         ("in_progress", "In Progress"),
@@ -173,11 +279,22 @@ class Complaint(models.Model):
 
     escalation_deadline = models.DateTimeField(null=True, blank=True)
 
+    # Maintained by complaints.search; GIN-indexed on PostgreSQL
+    search_vector = SearchVectorField(null=True, editable=False)
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = ComplaintQuerySet.as_manager()
+
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            # Keyset pagination on (created_at, pk), overall and per role
+            models.Index(fields=['created_at', 'complaint_id']),
+            models.Index(fields=['assigned_officer', 'created_at', 'complaint_id']),
+            models.Index(fields=['submitted_by', 'created_at', 'complaint_id']),
+        ]
 
     def __str__(self):
         return f"{self.complaint_id}  {self.title}  ({self.status})"
@@ -187,46 +304,51 @@ class Complaint(models.Model):
             self.escalation_deadline = timezone.now() + self.current_level.escalation_time
 
     def save(self, *args, **kwargs):
-        if self.current_level and not self.escalation_deadline:
+        if self.current_level_id and not self.escalation_deadline:
             self.set_escalation_deadline()
         super().save(*args, **kwargs)
 
     def escalate_to_next_level(self):
         """Escalate complaint to the next resolver level"""
-        if not self.category or not self.current_level:
+        from django.db import transaction
+        from .routing import pick_officer, routing_table
+        from . import workload
+
+        if not self.category_id or not self.current_level:
             return False
         
         # Find the next level for this category
-        next_level = ResolverLevel.objects.filter(
-            institution=self.current_level.institution,
-            level_order__gt=self.current_level.level_order
-        ).order_by('level_order').first()
+        next_level = routing_table.next_level(self.current_level)
         
         if not next_level:
             return False  # No higher level available
         
         # Find an officer at the next level for this category
-        next_resolver = CategoryResolver.objects.filter(
-            category=self.category,
-            level=next_level,
-            active=True
-        ).first()
+        resolvers = routing_table.resolvers_for(self.category_id, next_level)
+        next_officer = pick_officer(resolvers)
         
-        if next_resolver:
-            # Create assignment record for the escalation
-            Assignment.objects.create(
-                complaint=self,
-                officer=next_resolver.officer,
-                level=next_level,
-                reason='escalation'
-            )
-            
-            # Update complaint
-            self.current_level = next_level
-            self.assigned_officer = next_resolver.officer
-            self.status = 'escalated'
-            self.set_escalation_deadline()
-            self.save()
+        if next_officer:
+            previous_officer_id, previous_status = self.assigned_officer_id, self.status
+            with transaction.atomic():
+                # Create assignment record for the escalation
+                Assignment.objects.create(
+                    complaint=self,
+                    officer=next_officer,
+                    level=next_level,
+                    reason='escalation'
+                )
+                
+                # Update complaint
+                self.current_level = next_level
+                self.assigned_officer = next_officer
+                self.status = 'escalated'
+                self.set_escalation_deadline()
+                self.save()
+
+                workload.record_transition(
+                    previous_officer_id, previous_status,
+                    next_officer.pk, self.status
+                )
             
             return True
         
@@ -248,13 +370,99 @@ class ComplaintCC(models.Model):
         return f"CC {self.email} on {self.complaint.complaint_id}"
 
 
+class AttachmentBlob(models.Model):
+    """
+    One stored copy of some attachment content, shared by every attachment
+    with the same bytes. Maintained by complaints.blobs.
+    """
+    sha256 = models.CharField(max_length=64, unique=True)
+    file = models.FileField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    content_type = models.CharField(max_length=100)
+    ref_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Last time ref_count changed; garbage collection waits out a grace period after it
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['ref_count', 'updated_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.sha256[:12]} ({self.ref_count} refs)"
+
+
+class AttachmentPreview(models.Model):
+    """
+    Downscaled copies of an image attachment, one row per stored source file.
+    Rows are queued on upload and filled in by complaints.previews.PreviewWorker.
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_PROCESSING = 'processing'
+    STATUS_READY = 'ready'
+    STATUS_FAILED = 'failed'
+    STATUS_SKIPPED = 'skipped'
+
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_PROCESSING, 'Processing'),
+        (STATUS_READY, 'Ready'),
+        (STATUS_FAILED, 'Failed'),
+        (STATUS_SKIPPED, 'Not an image'),
+    ]
+
+    source = models.CharField(max_length=255, unique=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, null=True)
+
+    source_width = models.PositiveIntegerField(null=True, blank=True)
+    source_height = models.PositiveIntegerField(null=True, blank=True)
+    thumbnail = models.FileField(max_length=255, blank=True)
+    thumbnail_width = models.PositiveIntegerField(null=True, blank=True)
+    thumbnail_height = models.PositiveIntegerField(null=True, blank=True)
+    thumbnail_size = models.PositiveIntegerField(null=True, blank=True)
+    preview = models.FileField(max_length=255, blank=True)
+    preview_width = models.PositiveIntegerField(null=True, blank=True)
+    preview_height = models.PositiveIntegerField(null=True, blank=True)
+    preview_size = models.PositiveIntegerField(null=True, blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.source} ({self.status})"
+
+
 class ComplaintAttachment(models.Model):
     complaint = models.ForeignKey(
         Complaint,
         on_delete=models.CASCADE,
         related_name="attachments"
     )
-    file = models.FileField(upload_to="complaint_attachments/")
+    # Points at the blob's file; rows from before blobs keep their own file and no blob
+    file = models.FileField(upload_to="complaint_attachments/", max_length=255)
+    blob = models.ForeignKey(
+        AttachmentBlob,
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name="attachments"
+    )
+    preview = models.ForeignKey(
+        AttachmentPreview,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+"
+    )
     filename = models.CharField(max_length=255)
     file_size = models.PositiveIntegerField()
     content_type = models.CharField(max_length=100)
@@ -335,6 +543,7 @@ class Comment(models.Model):
         indexes = [
             models.Index(fields=['complaint', 'comment_type']),
             models.Index(fields=['author', 'created_at']),
+            models.Index(fields=['complaint', 'created_at', 'id']),
         ]
 
     def clean(self):
@@ -349,7 +558,7 @@ class Comment(models.Model):
         return f"Comment by {self.author} on {self.complaint.complaint_id}"
 
 
-class Response(models.Model):
+class Response(DirtyFieldsMixin, models.Model):
     RESPONSE_TYPE_CHOICES = [
         ('initial', 'Initial Response'),
         ('update', 'Status Update'),
@@ -379,6 +588,13 @@ class Response(models.Model):
         null=True,
         blank=True
     )
+    attachment_preview = models.ForeignKey(
+        AttachmentPreview,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+"
+    )
     is_public = models.BooleanField(
         default=True,
         help_text="Whether this response is visible to the complainant"
@@ -391,12 +607,13 @@ class Response(models.Model):
         indexes = [
             models.Index(fields=['complaint', 'response_type']),
             models.Index(fields=['responder', 'created_at']),
+            models.Index(fields=['complaint', 'created_at', 'id']),
         ]
 
     def __str__(self):
         return f"{self.response_type.title()} response by {self.responder} on {self.complaint.complaint_id}"
 
-class Notification(models.Model):
+class Notification(DirtyFieldsMixin, models.Model):
     """Model for storing notifications about complaints and escalations"""
     
     NOTIFICATION_TYPE_CHOICES = [
@@ -437,6 +654,8 @@ class Notification(models.Model):
         indexes = [
             models.Index(fields=['user', 'is_read']),
             models.Index(fields=['notification_type', 'created_at']),
+            models.Index(fields=['user', 'created_at', 'id']),
+            models.Index(fields=['user', 'notification_type']),
         ]
     
     def __str__(self):
@@ -445,9 +664,10 @@ class Notification(models.Model):
     def mark_as_read(self):
         """Mark notification as read"""
         if not self.is_read:
+            from .inbox import mark_read
+            mark_read(self.user_id, ids=[self.pk])
             self.is_read = True
             self.read_at = timezone.now()
-            self.save()
     
     @classmethod
     def get_unread_for_user(cls, user):
@@ -468,6 +688,14 @@ class Notification(models.Model):
         )
 
 
+class PublicAnnouncementQuerySet(models.QuerySet):
+    def active(self, now=None):
+        """Announcements shown publicly: active and not yet expired"""
+        return self.filter(is_active=True).filter(
+            models.Q(expires_at__isnull=True) | models.Q(expires_at__gt=now or timezone.now())
+        )
+
+
 class PublicAnnouncement(models.Model):
     title = models.CharField(max_length=200)
     message = models.TextField()
@@ -482,6 +710,8 @@ class PublicAnnouncement(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = PublicAnnouncementQuerySet.as_manager()
+
     class Meta:
         ordering = ['-is_pinned', '-created_at']
         indexes = [
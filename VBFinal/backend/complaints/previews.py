@@ -0,0 +1,203 @@
+"""
+Background thumbnails and web previews for image attachments.
+
+Uploads only queue an AttachmentPreview row for their stored file;
+PreviewWorker (scheduler job, or ``manage.py generate_attachment_previews``)
+decodes the image later and writes two downscaled JPEGs. Clients show those
+and fetch the full-size file only when it is opened.
+"""
+import hashlib
+import io
+import logging
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from .models import AttachmentPreview, ComplaintAttachment, Response
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.webp', '.bmp', '.tif', '.tiff'}
+PREVIEW_ROOT = 'previews'
+
+
+def is_image(name, content_type=None):
+    if content_type:
+        return content_type.startswith('image/')
+    return os.path.splitext(name or '')[1].lower() in IMAGE_EXTENSIONS
+
+
+def sizes():
+    return {
+        'thumbnail': (getattr(settings, 'ATTACHMENT_THUMBNAIL_SIZE', 320), 75),
+        'preview': (getattr(settings, 'ATTACHMENT_PREVIEW_SIZE', 1280), 82),
+    }
+
+
+def enqueue(source):
+    """The preview row for a stored file, queued if it is new"""
+    AttachmentPreview.objects.bulk_create([AttachmentPreview(source=source)], ignore_conflicts=True)
+    return AttachmentPreview.objects.get(source=source)
+
+
+def discard(sources):
+    """
+    Delete the preview rows of source files no attachment or response uses
+    any more, and their derivatives; returns how many rows were removed
+    """
+    sources = set(sources)
+    sources -= set(ComplaintAttachment.objects.filter(file__in=sources).values_list('file', flat=True))
+    sources -= set(Response.objects.filter(attachment__in=sources).values_list('attachment', flat=True))
+    rows = list(AttachmentPreview.objects.filter(source__in=sources)) if sources else []
+    if not rows:
+        return 0
+    AttachmentPreview.objects.filter(pk__in=[row.pk for row in rows]).delete()
+    for row in rows:
+        for derivative in (row.thumbnail, row.preview):
+            if not derivative.name:
+                continue
+            try:
+                default_storage.delete(derivative.name)
+            except OSError:
+                logger.exception("Could not delete preview file %s", derivative.name)
+    return len(rows)
+
+
+def derivative_path(source, kind):
+    key = hashlib.sha256(source.encode()).hexdigest()
+    return f"{PREVIEW_ROOT}/{key[:2]}/{key[2:4]}/{key}-{kind}.jpg"
+
+
+def render(image, size, quality):
+    """Downscale a decoded RGB image to fit ``size`` and encode it as a progressive JPEG"""
+    copy = image.copy()
+    copy.thumbnail((size, size), Image.Resampling.LANCZOS)
+    buffer = io.BytesIO()
+    copy.save(buffer, 'JPEG', quality=quality, optimize=True, progressive=True)
+    return copy.size, buffer.getvalue()
+
+
+def generate(preview):
+    """Decode the source once and store every derivative; returns the model field values"""
+    targets = sizes()
+    with default_storage.open(preview.source, 'rb') as source:
+        image = Image.open(source)
+        source_size = image.size
+        # Lets the JPEG decoder skip straight to a reduced scale for large photos
+        image.draft('RGB', (max(size for size, _ in targets.values()),) * 2)
+        image.load()
+        image = ImageOps.exif_transpose(image)
+        if image.mode in ('RGBA', 'LA', 'P'):
+            image = image.convert('RGBA')
+            background = Image.new('RGB', image.size, (255, 255, 255))
+            background.paste(image, mask=image.getchannel('A'))
+            image = background
+        elif image.mode != 'RGB':
+            image = image.convert('RGB')
+
+    values = {'source_width': source_size[0], 'source_height': source_size[1]}
+    for kind, (size, quality) in targets.items():
+        (width, height), data = render(image, size, quality)
+        path = derivative_path(preview.source, kind)
+        if default_storage.exists(path):
+            default_storage.delete(path)
+        values[kind] = default_storage.save(path, ContentFile(data))
+        values[f'{kind}_width'], values[f'{kind}_height'], values[f'{kind}_size'] = width, height, len(data)
+    return values
+
+
+class PreviewWorker:
+    """Generates queued previews, leasing rows so several workers can share the queue"""
+
+    def __init__(self, batch_size=None):
+        self.batch_size = batch_size or getattr(settings, 'ATTACHMENT_PREVIEW_BATCH_SIZE', 20)
+        self.max_attempts = getattr(settings, 'ATTACHMENT_PREVIEW_MAX_ATTEMPTS', 3)
+        self.lease = timedelta(seconds=getattr(settings, 'ATTACHMENT_PREVIEW_LEASE_SECONDS', 300))
+
+    def claim_batch(self):
+        """
+        Lease the next due rows. A claim counts as an attempt, so an image
+        that kills its worker outright (leaving only an expired lease) still
+        runs out of attempts; rows already out of them are failed here.
+        """
+        now = timezone.now()
+        with transaction.atomic():
+            batch = list(
+                AttachmentPreview.objects.filter(
+                    status__in=[AttachmentPreview.STATUS_PENDING, AttachmentPreview.STATUS_PROCESSING],
+                    next_attempt_at__lte=now,
+                )
+                .order_by('next_attempt_at')
+                .select_for_update(skip_locked=True)[:self.batch_size]
+            )
+            exhausted = [item.pk for item in batch if item.attempts >= self.max_attempts]
+            if exhausted:
+                logger.warning(f"Giving up on {len(exhausted)} previews whose worker stopped on every attempt")
+                AttachmentPreview.objects.filter(pk__in=exhausted).update(
+                    status=AttachmentPreview.STATUS_FAILED,
+                    last_error='Worker stopped while generating the preview',
+                    updated_at=now,
+                )
+            batch = [item for item in batch if item.pk not in exhausted]
+            AttachmentPreview.objects.filter(pk__in=[item.pk for item in batch]).update(
+                status=AttachmentPreview.STATUS_PROCESSING,
+                attempts=F('attempts') + 1,
+                next_attempt_at=now + self.lease,
+            )
+        return batch
+
+    def process_batch(self):
+        """Process one claimed batch and return (ready, failed) counts"""
+        ready = failed = 0
+        for item in self.claim_batch():
+            try:
+                values = generate(item)
+            except (UnidentifiedImageError, Image.DecompressionBombError) as e:
+                # Retrying will not help: not an image Pillow can decode, or too large to decode safely
+                AttachmentPreview.objects.filter(pk=item.pk).update(
+                    status=AttachmentPreview.STATUS_SKIPPED, last_error=str(e), updated_at=timezone.now()
+                )
+                failed += 1
+                continue
+            except Exception as e:
+                self._mark_failed(item, e)
+                failed += 1
+                continue
+            AttachmentPreview.objects.filter(pk=item.pk).update(
+                status=AttachmentPreview.STATUS_READY,
+                last_error=None,
+                updated_at=timezone.now(),
+                **values,
+            )
+            ready += 1
+        return ready, failed
+
+    def drain(self):
+        totals = {'ready': 0, 'failed': 0}
+        while True:
+            ready, failed = self.process_batch()
+            if not ready and not failed:
+                return totals
+            totals['ready'] += ready
+            totals['failed'] += failed
+
+    def _mark_failed(self, item, error):
+        attempts = item.attempts + 1  # as counted by claim_batch
+        logger.warning(f"Preview generation for {item.source} failed (attempt {attempts}): {error}")
+        if attempts >= self.max_attempts:
+            updates = {'status': AttachmentPreview.STATUS_FAILED}
+        else:
+            updates = {
+                'status': AttachmentPreview.STATUS_PENDING,
+                'next_attempt_at': timezone.now() + timedelta(minutes=5 * attempts),
+            }
+        AttachmentPreview.objects.filter(pk=item.pk).update(
+            attempts=attempts, last_error=str(error), updated_at=timezone.now(), **updates
+        )
@@ -0,0 +1,155 @@
+"""
+Versioned response cache for the public reference lists (categories,
+institutions, resolver levels, announcements).
+
+Each resource has a version token (conf.versions), replaced by the model
+signals whenever a row it is built from changes. Rendered bodies are cached
+under the current version together with a strong ETag of their bytes, in the
+shared cache and in a small copy per process. A revalidation or a repeat
+request is then answered from memory: no query and no cache round trip, with
+the DatabaseCache fallback too, except for the version check every
+VERSION_CHECK_SECONDS.
+"""
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework.renderers import JSONRenderer
+
+from conf import versions
+
+VERSION_KEY = 'complaints:reference:version:{}'
+BODY_KEY = 'complaints:reference:{}:{}:{}'
+
+CATEGORIES = 'categories'
+INSTITUTIONS = 'institutions'
+RESOLVER_LEVELS = 'resolver_levels'
+ANNOUNCEMENTS = 'announcements'
+
+# Bodies kept per process; keys carry the version, so stale ones are only evicted, never served
+LOCAL_BODIES_MAX = 256
+_local_bodies = {}
+_local_lock = threading.Lock()
+
+
+def version(resource):
+    return versions.token(VERSION_KEY.format(resource)).get()
+
+
+def bump(*resources):
+    """Publish new versions; cached bodies of the old ones are never read again"""
+    for resource in resources:
+        versions.token(VERSION_KEY.format(resource)).bump()
+
+
+def create_cache_table(**kwargs):
+    """post_migrate: the table behind settings.CACHES when it is a DatabaseCache (no-op otherwise)"""
+    call_command('createcachetable', verbosity=0)
+
+
+def cache_timeout():
+    return getattr(settings, 'REFERENCE_CACHE_TIMEOUT', 3600)
+
+
+def cached_response(request, resource, build, timeout=None):
+    """
+    Serve ``build()`` rendered as JSON, cached per resource version and full
+    request path, honouring If-None-Match / If-Modified-Since. ``timeout``
+    may be a callable, evaluated before building on a miss.
+    """
+    variant = hashlib.sha1(request.get_full_path().encode()).hexdigest()
+    key = BODY_KEY.format(resource, version(resource), variant)
+    entry = _local_get(key)
+    if entry is None:
+        entry = cache.get(key)
+        if entry is None:
+            if callable(timeout):
+                timeout = timeout()
+            timeout = timeout if timeout is not None else cache_timeout()
+            entry = {**render(build()), 'expires': time.time() + timeout}
+            cache.set(key, entry, timeout)
+        _local_set(key, entry)
+    return conditional_response(request, entry)
+
+
+def _local_get(key):
+    entry = _local_bodies.get(key)
+    if entry is not None and entry.get('expires', 0) > time.time():
+        return entry
+    return None
+
+
+def _local_set(key, entry):
+    with _local_lock:
+        _local_bodies.pop(key, None)
+        while len(_local_bodies) >= LOCAL_BODIES_MAX:
+            del _local_bodies[next(iter(_local_bodies))]
+        _local_bodies[key] = entry
+
+
+def clear_local():
+    """Drop this process's copies of the cached bodies"""
+    with _local_lock:
+        _local_bodies.clear()
+
+
+def render(data):
+    """A cacheable entry: the JSON bytes of ``data`` with their validators"""
+    body = JSONRenderer().render(data)
+    return {
+        'body': body,
+        'etag': '"%s"' % hashlib.sha256(body).hexdigest()[:40],
+        'last_modified': int(time.time()),
+    }
+
+
+def conditional_response(request, entry):
+    """A 304 when the client's copy of ``entry`` is current, otherwise its body"""
+    response = get_conditional_response(request, etag=entry['etag'], last_modified=entry['last_modified'])
+    if response is None:
+        response = HttpResponse(entry['body'], content_type='application/json')
+    response['ETag'] = entry['etag']
+    response['Last-Modified'] = http_date(entry['last_modified'])
+    # Cacheable by the browser, but always revalidated against the ETag
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+
+class CachedListMixin:
+    """
+    Serves ``list`` (and any action in ``cached_actions``) through
+    cached_response. These lists are the same for every caller, so
+    authentication is skipped for them as well; views that still authenticate
+    can opt a request out with ``use_cache``.
+    """
+    cached_resource = None
+    cached_actions = ('list',)
+    cached_timeout = None
+
+    def get_cached_timeout(self):
+        """Seconds a list built now stays valid; called only when it is rebuilt"""
+        return self.cached_timeout
+
+    def get_authenticators(self):
+        # DRF only sets self.action after the authenticators are built
+        action = getattr(self, 'action', None) or self.action_map.get(self.request.method.lower())
+        if action in self.cached_actions:
+            return []
+        return super().get_authenticators()
+
+    def use_cache(self, request):
+        return True
+
+    def list(self, request, *args, **kwargs):
+        if not self.use_cache(request):
+            return super().list(request, *args, **kwargs)
+
+        def build():
+            return super(CachedListMixin, self).list(request, *args, **kwargs).data
+        return cached_response(request, self.cached_resource, build, self.get_cached_timeout)
@@ -0,0 +1,155 @@
+"""
+In-memory routing table for resolving the resolver level and officers of a complaint
+"""
+import threading
+from collections import defaultdict
+from typing import NamedTuple
+
+from django.contrib.auth import get_user_model
+
+from conf import versions
+
+from . import workload
+from .models import ResolverLevel, CategoryResolver
+
+
+VERSION_CACHE_KEY = 'complaints:routing_table:version'
+
+
+class Route(NamedTuple):
+    """An active CategoryResolver as the table keeps it: ids and weight, no officer instance"""
+    resolver_id: int
+    officer_id: int
+    weight: int
+
+
+def officers(officer_ids):
+    """``{id: User}`` of the officers among ``officer_ids`` that are still active, read now in one query"""
+    officer_ids = {officer_id for officer_id in officer_ids if officer_id}
+    if not officer_ids:
+        return {}
+    return get_user_model().objects.filter(is_active=True).in_bulk(officer_ids)
+
+
+def pick_officer(routes, loads=None):
+    """
+    The least-loaded active officer among ``routes`` (workload.pick_least_loaded).
+    Officers deactivated since the snapshot was built are skipped.
+    """
+    active = officers(route.officer_id for route in routes)
+    route = workload.pick_least_loaded([route for route in routes if route.officer_id in active], loads)
+    return active[route.officer_id] if route else None
+
+
+class RoutingTable:
+    """
+    Snapshot of ResolverLevel rows and of the active CategoryResolver rows of
+    active officers, built once per process. Its version token (conf.versions)
+    is checked at most every VERSION_CHECK_SECONDS, so a lookup is a dict read;
+    a change saved in one worker makes every worker rebuild within that time.
+    Officers are kept as ids and loaded by the caller with ``officers``, so a
+    user edit is never served from a snapshot.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._levels = {}
+        self._routes = {}
+        self.hits = 0
+        self.misses = 0
+        self.builds = 0
+
+    def invalidate(self):
+        """Publish a new version; every process rebuilds lazily"""
+        versions.token(VERSION_CACHE_KEY).bump()
+        self._version = None
+
+    def first_level(self, institution_id):
+        """Level 1 of the institution, or of any institution when none is given"""
+        self._ensure_fresh()
+        if institution_id is None:
+            candidates = [
+                levels[0] for levels in self._levels.values()
+                if levels and levels[0].level_order == 1
+            ]
+            return min(candidates, key=lambda level: level.pk) if candidates else None
+        return self._level_at(institution_id, 1)
+
+    def next_level(self, level):
+        """The next level above ``level`` within its institution"""
+        self._ensure_fresh()
+        for candidate in self._levels.get(level.institution_id, []):
+            if candidate.level_order > level.level_order:
+                return candidate
+        return None
+
+    def resolvers_for(self, category_id, level):
+        """Routes of the active resolvers for a category at a level, in creation order"""
+        _, resolvers = self.route(level.institution_id, category_id, level.level_order)
+        return resolvers
+
+    def route(self, institution_id, category_id, level_order):
+        """Return ``(level, resolvers)`` for (institution, category, level_order)"""
+        self._ensure_fresh()
+        level = self._level_at(institution_id, level_order)
+        if level is None:
+            return None, []
+        return level, self._routes.get((institution_id, category_id, level_order), [])
+
+    def stats(self):
+        return {
+            'version': self._version,
+            'hits': self.hits,
+            'misses': self.misses,
+            'builds': self.builds,
+            'levels': sum(len(levels) for levels in self._levels.values()),
+            'routes': len(self._routes),
+        }
+
+    def _level_at(self, institution_id, level_order):
+        for level in self._levels.get(institution_id, []):
+            if level.level_order == level_order:
+                return level
+        return None
+
+    def _ensure_fresh(self):
+        version = versions.token(VERSION_CACHE_KEY).get()
+        if version is not None and version == self._version:
+            self.hits += 1
+            return
+
+        with self._lock:
+            if version is not None and version == self._version:
+                self.hits += 1
+                return
+            self.misses += 1
+            self._build(version)
+
+    def _build(self, version):
+        levels = defaultdict(list)
+        levels_by_id = {}
+        for level in ResolverLevel.objects.order_by('level_order', 'pk'):
+            levels[level.institution_id].append(level)
+            levels_by_id[level.pk] = level
+
+        routes = defaultdict(list)
+        resolvers = (
+            CategoryResolver.objects.filter(active=True, officer__is_active=True).order_by('pk')
+            .values_list('pk', 'level_id', 'category_id', 'officer_id', 'weight')
+        )
+        for resolver_id, level_id, category_id, officer_id, weight in resolvers:
+            level = levels_by_id.get(level_id)
+            if level is None:
+                continue
+            routes[(level.institution_id, category_id, level.level_order)].append(
+                Route(resolver_id, officer_id, weight)
+            )
+
+        self._levels = dict(levels)
+        self._routes = dict(routes)
+        self._version = version
+        self.builds += 1
+
+
+routing_table = RoutingTable()
@@ -26,6 +26,63 @@ def check_escalations_task():
         logger.error(f"Error in escalation check: {str(e)}")
 
 
+def process_email_outbox_task():
+    """Background task to deliver queued emails"""
+    try:
+        from accounts.email_service import EmailOutboxWorker
+        results = EmailOutboxWorker().drain()
+        if results['sent'] or results['failed']:
+            logger.info(f"Email outbox drained: {results}")
+    except Exception as e:
+        logger.error(f"Error draining email outbox: {str(e)}")
+
+
+def purge_logs_task():
+    """Background task to expire old log rows"""
+    try:
+        from accounts.retention import apply_all
+        results = apply_all()
+        logger.info(f"Log retention applied: {results}")
+    except Exception as e:
+        logger.error(f"Error applying log retention: {str(e)}")
+
+
+def clear_logs_task():
+    """Background task to carry out log clears requested from the admin panel"""
+    try:
+        from accounts.retention import apply_purge_requests
+        results = apply_purge_requests()
+        if results:
+            logger.info(f"Requested log clears applied: {results}")
+    except Exception as e:
+        logger.error(f"Error clearing logs: {str(e)}")
+
+
+def generate_attachment_previews_task():
+    """Background task to build thumbnails and previews for new image attachments"""
+    try:
+        from complaints.previews import PreviewWorker
+        results = PreviewWorker().drain()
+        if results['ready'] or results['failed']:
+            logger.info(f"Attachment previews generated: {results}")
+    except Exception as e:
+        logger.error(f"Error generating attachment previews: {str(e)}")
+
+
+def gc_attachment_blobs_task():
+    """Background task to delete attachment blobs nothing references any more"""
+    try:
+        from complaints.blobs import collect_garbage, sweep_orphan_files
+        removed, freed = collect_garbage()
+        if removed:
+            logger.info(f"Attachment blob GC removed {removed} blobs ({freed} bytes)")
+        removed, freed = sweep_orphan_files()
+        if removed:
+            logger.info(f"Attachment blob GC removed {removed} files without a row ({freed} bytes)")
+    except Exception as e:
+        logger.error(f"Error collecting attachment blobs: {str(e)}")
+
+
 def start_escalation_scheduler():
     """
     Start the background scheduler for automatic escalation checks
@@ -43,6 +100,61 @@ def start_escalation_scheduler():
         replace_existing=True,
         max_instances=1,  # Prevent multiple instances running simultaneously
     )
+
+    # Deliver queued emails every minute
+    scheduler.add_job(
+        process_email_outbox_task,
+        'interval',
+        minutes=1,
+        id='process_email_outbox',
+        name='Deliver queued emails',
+        replace_existing=True,
+        max_instances=1,
+    )
+
+    # Expire old logs once a day, off-peak
+    scheduler.add_job(
+        purge_logs_task,
+        'cron',
+        hour=3,
+        id='purge_logs',
+        name='Expire old logs',
+        replace_existing=True,
+        max_instances=1,
+    )
+
+    # Carry out log clears requested from the admin panel
+    scheduler.add_job(
+        clear_logs_task,
+        'interval',
+        minutes=5,
+        id='clear_logs',
+        name='Clear logs on request',
+        replace_existing=True,
+        max_instances=1,
+    )
+
+    # Build image thumbnails and previews shortly after upload
+    scheduler.add_job(
+        generate_attachment_previews_task,
+        'interval',
+        minutes=1,
+        id='generate_attachment_previews',
+        name='Generate attachment previews',
+        replace_existing=True,
+        max_instances=1,
+    )
+
+    # Remove unreferenced attachment blobs once a day
+    scheduler.add_job(
+        gc_attachment_blobs_task,
+        'cron',
+        hour=4,
+        id='gc_attachment_blobs',
+        name='Remove unreferenced attachment blobs',
+        replace_existing=True,
+        max_instances=1,
+    )
     
     if not scheduler.running:
         scheduler.start()
@@ -69,4 +181,16 @@ CELERY_BEAT_SCHEDULE = {
 """
 # Run escalation check every 30 minutes
 */30 * * * * cd /path/to/project && python manage.py check_escalations >> /var/log/cmfs_escalations.log 2>&1
+
+# Expire old logs nightly, and carry out requested log clears every few minutes
+0 3 * * * cd /path/to/project && python manage.py purge_logs
+*/5 * * * * cd /path/to/project && python manage.py purge_logs --requests-only
+
+# Remove unreferenced attachment blobs nightly
+0 4 * * * cd /path/to/project && python manage.py gc_attachment_blobs
+
+# Or run the email outbox worker as its own long-lived process:
+# python manage.py process_email_outbox --loop
+# and likewise the attachment preview worker:
+# python manage.py generate_attachment_previews --loop
 """
@@ -0,0 +1,90 @@
+"""
+Full-text search over complaints, their comments and public responses
+"""
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connection
+from django.db.models import F, Q, Value
+
+from .models import Complaint, Comment, Response
+
+
+SEARCH_CONFIG = getattr(settings, 'COMPLAINT_SEARCH_CONFIG', 'english')
+GIN_INDEX_NAME = 'complaints_search_vector_gin'
+
+
+def is_supported():
+    """Stored tsvectors and GIN indexes only exist on PostgreSQL"""
+    return connection.vendor == 'postgresql'
+
+
+def ensure_index(**kwargs):
+    """
+    post_migrate hook creating the GIN index. It lives outside Meta.indexes
+    because SQLite, used in tests, cannot build it.
+    """
+    if not is_supported():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'CREATE INDEX IF NOT EXISTS {GIN_INDEX_NAME} '
+            f'ON {Complaint._meta.db_table} USING gin (search_vector)'
+        )
+
+
+def refresh(complaint_ids):
+    """Recompute the stored vector of the given complaints from their current text"""
+    if not is_supported():
+        return 0
+    complaint_ids = list(complaint_ids)
+    if not complaint_ids:
+        return 0
+
+    discussion = {pk: [] for pk in complaint_ids}
+    comments = Comment.objects.filter(complaint_id__in=complaint_ids).values_list('complaint_id', 'message')
+    responses = Response.objects.filter(
+        complaint_id__in=complaint_ids, is_public=True
+    ).values_list('complaint_id', 'title', 'message')
+    for complaint_id, message in comments:
+        discussion[complaint_id].append(message)
+    for complaint_id, title, message in responses:
+        discussion[complaint_id].extend((title, message))
+
+    updated = 0
+    for complaint_id, title, description in Complaint.objects.filter(
+        pk__in=complaint_ids
+    ).values_list('pk', 'title', 'description'):
+        vector = (
+            SearchVector(Value(title), weight='A', config=SEARCH_CONFIG)
+            + SearchVector(Value(description), weight='B', config=SEARCH_CONFIG)
+            + SearchVector(Value(' '.join(discussion[complaint_id])), weight='C', config=SEARCH_CONFIG)
+        )
+        updated += Complaint.objects.filter(pk=complaint_id).update(search_vector=vector)
+    return updated
+
+
+def search(queryset, text):
+    """
+    Filter ``queryset`` to complaints matching ``text``, best matches first.
+    On PostgreSQL this is a GIN lookup on the stored vector; elsewhere it
+    degrades to case-insensitive LIKE over the same columns.
+    """
+    if is_supported():
+        query = SearchQuery(text, search_type='websearch', config=SEARCH_CONFIG)
+        return (
+            queryset.filter(search_vector=query)
+            .annotate(rank=SearchRank(F('search_vector'), query))
+            .order_by('-rank', '-created_at')
+        )
+
+    matches = Q()
+    for term in text.split():
+        matches &= (
+            Q(title__icontains=term)
+            | Q(description__icontains=term)
+            | Q(pk__in=Comment.objects.filter(message__icontains=term).values('complaint_id'))
+            | Q(pk__in=Response.objects.filter(
+                Q(title__icontains=term) | Q(message__icontains=term), is_public=True
+            ).values('complaint_id'))
+        )
+    return queryset.filter(matches).order_by('-created_at')
@@ -1,6 +1,8 @@
 from rest_framework import serializers
 from .models import Institution, Category, ResolverLevel, CategoryResolver, Complaint, ComplaintAttachment, ComplaintCC, Comment, Assignment, Response, Notification, Appointment
-from .models import PublicAnnouncement
+from .models import PublicAnnouncement, AttachmentPreview
+from . import blobs
+from .catalogue import ensure_paths
 
 from django.contrib.auth import get_user_model
 
@@ -28,9 +30,21 @@ class CategorySerializer(serializers.ModelSerializer):
         model = Category
         fields = [
             "category_id", "institution", "institution_name", "name", "name_amharic", 
-            "description", "description_amharic", "parent", "parent_name", "is_active", "created_at"
+            "description", "description_amharic", "parent", "parent_name", "path", "is_active", "created_at"
         ]
-        read_only_fields = ["category_id", "created_at"]
+        read_only_fields = ["category_id", "path", "created_at"]
+
+    def validate_parent(self, parent):
+        if parent is None:
+            return parent
+        ensure_paths()
+        if not parent.path:
+            parent.refresh_from_db(fields=['path'])  # backfilled after it was loaded
+        if not parent.path:
+            raise serializers.ValidationError("The parent category is in a parent cycle.")
+        if self.instance is not None and self.instance.category_id in parent.path.split(Category.PATH_SEPARATOR):
+            raise serializers.ValidationError("A category cannot be moved under itself or one of its descendants.")
+        return parent
 
 
 class ResolverLevelSerializer(serializers.ModelSerializer):
@@ -49,7 +63,7 @@ class CategoryResolverSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = CategoryResolver
-        fields = ["id", "category", "category_name", "level", "level_name", "officer", "officer_name", "active"]
+        fields = ["id", "category", "category_name", "level", "level_name", "officer", "officer_name", "active", "weight"]
         read_only_fields = ["id", "officer_name", "level_name", "category_name"]
 
 
@@ -67,16 +81,7 @@ class ComplaintCreateSerializer(serializers.ModelSerializer):
         request = self.context.get('request')
         complaint = Complaint.objects.create(**validated_data)
 
-        if request and hasattr(request, 'FILES'):
-            for key, file in request.FILES.items():
-                if key.startswith('attachment_'):
-                    ComplaintAttachment.objects.create(
-                        complaint=complaint,
-                        file=file,
-                        filename=file.name,
-                        file_size=file.size,
-                        content_type=file.content_type
-                    )
+        blobs.attach_uploads(complaint, request)
 
         for email in cc_emails:
             ComplaintCC.objects.get_or_create(complaint=complaint, email=email)
@@ -84,12 +89,34 @@ class ComplaintCreateSerializer(serializers.ModelSerializer):
         return complaint
 
 
+def derivative(preview, kind, request=None):
+    """URL and dimensions of a generated thumbnail/preview, or None until it is ready"""
+    if preview is None or preview.status != AttachmentPreview.STATUS_READY:
+        return None
+    url = getattr(preview, kind).url
+    return {
+        "url": request.build_absolute_uri(url) if request else url,
+        "width": getattr(preview, f"{kind}_width"),
+        "height": getattr(preview, f"{kind}_height"),
+        "size": getattr(preview, f"{kind}_size"),
+    }
+
+
 class ComplaintAttachmentSerializer(serializers.ModelSerializer):
+    thumbnail = serializers.SerializerMethodField()
+    preview = serializers.SerializerMethodField()
+
     class Meta:
         model = ComplaintAttachment
-        fields = ["id", "file", "filename", "file_size", "content_type", "uploaded_at"]
+        fields = ["id", "file", "filename", "file_size", "content_type", "uploaded_at", "thumbnail", "preview"]
         read_only_fields = ["id", "uploaded_at"]
 
+    def get_thumbnail(self, obj):
+        return derivative(obj.preview, "thumbnail", self.context.get("request"))
+
+    def get_preview(self, obj):
+        return derivative(obj.preview, "preview", self.context.get("request"))
+
 
 class CCSerializer(serializers.ModelSerializer):
     class Meta:
@@ -118,14 +145,7 @@ class ComplaintSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         request = self.context.get('request')
         complaint = Complaint.objects.create(**validated_data)
-        if request and hasattr(request, 'FILES'):
-            for key, file in request.FILES.items():
-                if key.startswith('attachment_'):
-                    ComplaintAttachment.objects.create(
-                        complaint=complaint,
-                        file=file, filename=file.name,
-                        file_size=file.size, content_type=file.content_type
-                    )
+        blobs.attach_uploads(complaint, request)
         return complaint
 
 
@@ -139,10 +159,19 @@ class CommentSerializer(serializers.ModelSerializer):
 
 class ResponseSerializer(serializers.ModelSerializer):
     responder = ComplaintUserSerializer(read_only=True)
+    attachment_thumbnail = serializers.SerializerMethodField()
+    attachment_preview = serializers.SerializerMethodField()
 
     class Meta:
         model = Response
-        fields = ["id", "complaint", "responder", "response_type", "title", "message", "attachment", "is_public", "created_at", "updated_at"]
+        fields = ["id", "complaint", "responder", "response_type", "title", "message", "attachment",
+                  "attachment_thumbnail", "attachment_preview", "is_public", "created_at", "updated_at"]
+
+    def get_attachment_thumbnail(self, obj):
+        return derivative(obj.attachment_preview, "thumbnail", self.context.get("request"))
+
+    def get_attachment_preview(self, obj):
+        return derivative(obj.attachment_preview, "preview", self.context.get("request"))
 
 
 class AssignmentSerializer(serializers.ModelSerializer):
@@ -1,4 +1,8 @@
-from complaints.models import Category, ResolverLevel, CategoryResolver, Assignment
+from django.db import transaction
+
+from complaints.models import Assignment
+from complaints.routing import routing_table
+from complaints import routing, workload
 import logging
 
 logger = logging.getLogger(__name__)
@@ -11,37 +15,34 @@ class ComplaintService:
             if not complaint.category:
                 return None
 
-            if complaint.institution:
-                first_level = ResolverLevel.objects.filter(
-                    institution=complaint.institution,
-                    level_order=1
-                ).first()
-            else:
-                first_level = ResolverLevel.objects.filter(level_order=1).first()
+            first_level = routing_table.first_level(complaint.institution_id)
 
             if not first_level:
                 return None
 
-            category_resolver = CategoryResolver.objects.filter(
-                category=complaint.category,
-                level=first_level,
-                active=True
-            ).first()
+            resolvers = routing_table.resolvers_for(complaint.category_id, first_level)
+            officer = routing.pick_officer(resolvers)
 
-            if category_resolver:
-                complaint.assigned_officer = category_resolver.officer
-                complaint.current_level = first_level
-                complaint.set_escalation_deadline()
-                complaint.save()
+            if officer:
+                previous_officer_id = complaint.assigned_officer_id
+                with transaction.atomic():
+                    complaint.assigned_officer = officer
+                    complaint.current_level = first_level
+                    complaint.set_escalation_deadline()
+                    complaint.save()
 
-                Assignment.objects.create(
-                    complaint=complaint,
-                    officer=category_resolver.officer,
-                    level=first_level,
-                    reason='initial'
-                )
+                    Assignment.objects.create(
+                        complaint=complaint,
+                        officer=officer,
+                        level=first_level,
+                        reason='initial'
+                    )
+                    workload.record_transition(
+                        previous_officer_id, complaint.status,
+                        officer.pk, complaint.status
+                    )
 
-                return category_resolver.officer
+                return officer
 
             return None
         except Exception as e:
@@ -0,0 +1,136 @@
+from functools import partial
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import (
+    Institution, Category, ResolverLevel, CategoryResolver, Complaint, ComplaintAttachment, Comment, Response,
+    Notification, PublicAnnouncement, AttachmentPreview,
+)
+from .routing import routing_table
+from . import blobs, inbox, previews, reference_cache, search
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=ResolverLevel)
+@receiver(post_delete, sender=ResolverLevel)
+@receiver(post_save, sender=CategoryResolver)
+@receiver(post_delete, sender=CategoryResolver)
+def invalidate_routing_table(sender, **kwargs):
+    # Wait for commit so no worker rebuilds from rows that may roll back
+    transaction.on_commit(routing_table.invalidate)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def invalidate_routing_for_officer(sender, instance, created, **kwargs):
+    # The table leaves out resolvers whose officer is inactive
+    if not created and instance.has_changed('is_active'):
+        transaction.on_commit(routing_table.invalidate)
+
+
+# Reference lists embedding each model's rows, whose cached responses a change makes stale
+REFERENCE_RESOURCES = {
+    Institution: (reference_cache.INSTITUTIONS, reference_cache.CATEGORIES, reference_cache.RESOLVER_LEVELS),
+    Category: (reference_cache.CATEGORIES,),
+    ResolverLevel: (reference_cache.RESOLVER_LEVELS,),
+    PublicAnnouncement: (reference_cache.ANNOUNCEMENTS,),
+}
+AUTHOR_NAME_FIELDS = {'first_name', 'last_name', 'email'}
+
+
+@receiver(post_save, sender=Institution)
+@receiver(post_delete, sender=Institution)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=ResolverLevel)
+@receiver(post_delete, sender=ResolverLevel)
+@receiver(post_save, sender=PublicAnnouncement)
+@receiver(post_delete, sender=PublicAnnouncement)
+def bump_reference_version(sender, **kwargs):
+    transaction.on_commit(partial(reference_cache.bump, *REFERENCE_RESOURCES[sender]))
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def bump_announcement_authors(sender, instance, created, update_fields=None, **kwargs):
+    # Announcements show their author's name; only staff can author them
+    if created or instance.role == instance.ROLE_USER:
+        return
+    if update_fields is None or AUTHOR_NAME_FIELDS & set(update_fields):
+        transaction.on_commit(partial(reference_cache.bump, reference_cache.ANNOUNCEMENTS))
+
+
+SEARCHABLE_FIELDS = {'title', 'description'}
+
+
+@receiver(post_save, sender=Complaint)
+def refresh_complaint_search(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields is not None and not SEARCHABLE_FIELDS.intersection(update_fields):
+        return
+    transaction.on_commit(lambda: search.refresh([instance.pk]))
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+@receiver(post_save, sender=Response)
+@receiver(post_delete, sender=Response)
+def refresh_discussion_search(sender, instance, **kwargs):
+    complaint_id = instance.complaint_id
+    transaction.on_commit(lambda: search.refresh([complaint_id]))
+
+
+@receiver(post_save, sender=Notification)
+def count_notification(sender, instance, created, **kwargs):
+    if created:
+        inbox.created([instance])
+    else:
+        # An edit may have flipped is_read; recount on the next read
+        transaction.on_commit(lambda: inbox.invalidate(instance.user_id))
+
+
+@receiver(post_delete, sender=Notification)
+def uncount_notification(sender, instance, **kwargs):
+    if not instance.is_read:
+        transaction.on_commit(lambda: inbox.adjust(instance.user_id, -1))
+
+
+@receiver(post_delete, sender=ComplaintAttachment)
+def release_attachment_blob(sender, instance, **kwargs):
+    if instance.blob_id:
+        blobs.release(instance.blob_id)
+    elif instance.preview_id:
+        # Blob previews go with the blob (blobs.collect_garbage); a pre-blob file has no such owner
+        name = instance.file.name
+        transaction.on_commit(lambda: previews.discard([name]))
+
+
+@receiver(post_save, sender=ComplaintAttachment)
+def queue_attachment_preview(sender, instance, created, **kwargs):
+    if created and instance.preview_id is None and previews.is_image(instance.file.name, instance.content_type):
+        preview = previews.enqueue(instance.file.name)
+        ComplaintAttachment.objects.filter(pk=instance.pk).update(preview=preview)
+        instance.preview = preview
+
+
+@receiver(post_save, sender=Response)
+def queue_response_preview(sender, instance, created, **kwargs):
+    if not created and not instance.has_changed('attachment'):
+        return
+    name = instance.attachment.name if instance.attachment else None
+    preview = previews.enqueue(name) if name and previews.is_image(name) else None
+    if (preview.pk if preview else None) != instance.attachment_preview_id:
+        replaced = instance.attachment_preview_id
+        Response.objects.filter(pk=instance.pk).update(attachment_preview=preview)
+        instance.attachment_preview = preview
+        if replaced:
+            transaction.on_commit(lambda: previews.discard(
+                AttachmentPreview.objects.filter(pk=replaced).values_list('source', flat=True)
+            ))
+
+
+@receiver(post_delete, sender=Response)
+def discard_response_preview(sender, instance, **kwargs):
+    if instance.attachment_preview_id:
+        name = instance.attachment.name
+        transaction.on_commit(lambda: previews.discard([name]))
@@ -0,0 +1,165 @@
+"""
+Server-Sent Events stream of a user's new notifications, served straight
+from conf/asgi.py so an idle connection costs one coroutine and no thread.
+
+    GET /api/notifications/stream/?token=<JWT access token>
+
+EventSource cannot send an Authorization header, hence the query parameter.
+The token gets the checks the REST API makes (an active user, password not
+changed since) and must not have been revoked by a logout. The stream opens
+with an ``unread`` event carrying the badge count, then sends one
+``notification`` event per new notification and a comment line every
+NOTIFICATION_STREAM_HEARTBEAT_SECONDS to keep proxies from closing it. It
+ends when the token expires; the client reconnects with a fresh one.
+
+Django's middleware never sees this path, so the CORS headers
+django-cors-headers would add are added here from the same settings.
+"""
+import asyncio
+import json
+import re
+import time
+from urllib.parse import parse_qs, urlsplit
+
+from asgiref.sync import sync_to_async
+from corsheaders.conf import conf as cors_settings
+from corsheaders.middleware import CorsMiddleware
+from django.conf import settings
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+
+from accounts.authentication import is_revoked
+
+from . import inbox
+from .broker import broker
+
+STREAM_PATH = '/api/notifications/stream/'
+
+_cors = CorsMiddleware(lambda request: None)
+
+
+def format_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n".encode()
+
+
+def authenticate(scope):
+    """``(user, validated token)`` for the ``token`` query parameter, or None"""
+    params = parse_qs(scope.get('query_string', b'').decode())
+    token = (params.get('token') or [None])[0]
+    if not token:
+        return None
+    backend = JWTAuthentication()
+    try:
+        validated = backend.get_validated_token(token)
+        user = backend.get_user(validated)
+    except (InvalidToken, AuthenticationFailed):
+        return None
+    if is_revoked(validated):
+        return None
+    return user, validated
+
+
+def cors_headers(scope):
+    """The headers CorsMiddleware would add to a response to this request"""
+    if not re.match(cors_settings.CORS_URLS_REGEX, scope['path']):
+        return []
+    headers = [(b'vary', b'origin')]
+    origin = next((value.decode('latin-1') for name, value in scope.get('headers', ()) if name == b'origin'), None)
+    if not origin:
+        return headers
+    try:
+        url = urlsplit(origin)
+    except ValueError:
+        return headers
+    if not cors_settings.CORS_ALLOW_ALL_ORIGINS and not _cors.origin_found_in_white_lists(origin, url):
+        return headers
+
+    if cors_settings.CORS_ALLOW_ALL_ORIGINS and not cors_settings.CORS_ALLOW_CREDENTIALS:
+        headers.append((b'access-control-allow-origin', b'*'))
+    else:
+        headers.append((b'access-control-allow-origin', origin.encode('latin-1')))
+    if cors_settings.CORS_ALLOW_CREDENTIALS:
+        headers.append((b'access-control-allow-credentials', b'true'))
+    if scope['method'] == 'OPTIONS':
+        headers += [
+            (b'access-control-allow-methods', b'GET, OPTIONS'),
+            (b'access-control-allow-headers', ', '.join(cors_settings.CORS_ALLOW_HEADERS).encode()),
+            (b'access-control-max-age', str(cors_settings.CORS_PREFLIGHT_MAX_AGE).encode()),
+        ]
+    return headers
+
+
+async def _send_error(send, status, message, headers=()):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json'), *headers],
+    })
+    await send({'type': 'http.response.body', 'body': json.dumps({'error': message}).encode()})
+
+
+async def notification_stream(scope, receive, send):
+    cors = cors_headers(scope)
+    if scope['method'] == 'OPTIONS':
+        await send({'type': 'http.response.start', 'status': 200, 'headers': [(b'content-length', b'0'), *cors]})
+        await send({'type': 'http.response.body', 'body': b''})
+        return
+    if scope['method'] != 'GET':
+        await _send_error(send, 405, 'Method not allowed', cors)
+        return
+    authenticated = await sync_to_async(authenticate)(scope)
+    if authenticated is None:
+        await _send_error(send, 401, 'A valid access token is required', cors)
+        return
+    user, token = authenticated
+
+    heartbeat = getattr(settings, 'NOTIFICATION_STREAM_HEARTBEAT_SECONDS', 25)
+    subscription = broker.subscribe(user.pk)
+    disconnected = asyncio.ensure_future(_wait_for_disconnect(receive))
+    try:
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [
+                (b'content-type', b'text/event-stream'),
+                (b'cache-control', b'no-cache'),
+                (b'x-accel-buffering', b'no'),
+                *cors,
+            ],
+        })
+        unread = await sync_to_async(inbox.unread_count)(user.pk)
+        await send({
+            'type': 'http.response.body',
+            'body': b"retry: 5000\n\n" + format_event('unread', {'count': unread}),
+            'more_body': True,
+        })
+
+        while not disconnected.done():
+            remaining = token['exp'] - time.time()
+            if remaining <= 0:
+                await send({'type': 'http.response.body', 'body': format_event('expired', {}), 'more_body': False})
+                break
+            next_event = asyncio.ensure_future(subscription.queue.get())
+            done, _ = await asyncio.wait({next_event, disconnected}, timeout=min(heartbeat, remaining),
+                                         return_when=asyncio.FIRST_COMPLETED)
+            if next_event in done:
+                body = format_event('notification', next_event.result())
+            else:
+                next_event.cancel()
+                if disconnected in done:
+                    break
+                body = b": keepalive\n\n"
+            await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+    except OSError:
+        pass  # Client went away mid-write
+    finally:
+        broker.unsubscribe(subscription)
+        disconnected.cancel()
+
+
+async def _wait_for_disconnect(receive):
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return
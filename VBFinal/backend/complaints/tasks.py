@@ -24,6 +24,7 @@ def check_escalations():
             f"Escalation check completed - "
             f"Escalated: {results['escalated']}, "
             f"Failed: {results['failed']}, "
+            f"Skipped: {results['skipped']}, "
             f"Total checked: {results['total_checked']}"
         )
         
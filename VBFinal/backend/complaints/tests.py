@@ -1,3 +1,1123 @@
-from django.test import TestCase
+import asyncio
+import csv
+import hashlib
+import io
+import json
+import os
+import tempfile
+import time
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, transaction
+from django.test import TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from accounts.models import User
+from conf import versions
+from PIL import Image
+
+from . import blobs, catalogue, inbox, previews, reference_cache, routing
+from .broker import broker
+from .models import (
+    Institution, Category, ResolverLevel, CategoryResolver, Complaint,
+    ComplaintAttachment, ComplaintCC, Response, Assignment, Comment, AttachmentBlob, Notification,
+    AttachmentPreview, PublicAnnouncement, OfficerWorkload,
+)
+from .escalation_service import EscalationService
+from .routing import RoutingTable
+from .sse import notification_stream
+
+# Stand-in for Redis in tests that count queries: with the DatabaseCache
+# fallback every cache read would be a query of its own
+LOCAL_CACHE = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "tests"}}
+
+
+class ComplaintAPITestCase(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.institution = Institution.objects.create(name="UoG", domain="uog.edu.et")
+        parent = Category.objects.create(institution=cls.institution, name="Academic")
+        cls.category = Category.objects.create(institution=cls.institution, name="Grades", parent=parent)
+        cls.level = ResolverLevel.objects.create(
+            institution=cls.institution, name="Department", level_order=1,
+            escalation_time=timedelta(hours=48)
+        )
+        cls.admin = User.objects.create(email="admin@uog.edu.et", first_name="A", last_name="Admin", role=User.ROLE_ADMIN)
+        cls.officer = User.objects.create(email="officer@uog.edu.et", first_name="O", last_name="Officer", role=User.ROLE_OFFICER)
+        cls.complainant = User.objects.create(email="user@uog.edu.et", first_name="U", last_name="User")
+        CategoryResolver.objects.create(category=cls.category, level=cls.level, officer=cls.officer)
+
+    def setUp(self):
+        # The shared cache is rolled back with each test; this process's copies are not
+        versions.expire_all()
+        reference_cache.clear_local()
+
+    def create_complaints(self, count):
+        for index in range(count):
+            complaint = Complaint.objects.create(
+                institution=self.institution,
+                submitted_by=self.complainant,
+                category=self.category,
+                title=f"Complaint {index}",
+                description="Missing grade",
+                current_level=self.level,
+                assigned_officer=self.officer,
+            )
+            ComplaintAttachment.objects.create(
+                complaint=complaint, file="complaint_attachments/a.pdf", filename="a.pdf",
+                file_size=10, content_type="application/pdf"
+            )
+            ComplaintCC.objects.create(complaint=complaint, email=f"cc{index}@uog.edu.et")
+
+
+class ComplaintQueryBudgetTests(ComplaintAPITestCase):
+    """Complaint endpoints must cost a fixed number of queries regardless of page contents"""
+
+    LIST_BUDGET = 3    # complaints with joins, attachments, cc list (cursor pages run no COUNT)
+    DETAIL_BUDGET = 3  # complaint with joins, attachments, cc list
+
+    def assert_query_budget(self, url, user, budget):
+        self.client.force_authenticate(user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        # The request logging middleware writes its own SystemLog row
+        sql = [q["sql"] for q in queries.captured_queries if "accounts_systemlog" not in q["sql"]]
+        self.assertLessEqual(
+            len(sql), budget,
+            f"{url} as {user.role} used {len(sql)} queries (budget {budget}):\n" + "\n".join(sql)
+        )
+        return len(sql)
+
+    def test_list_budget_is_constant_for_every_role(self):
+        for user in (self.admin, self.officer, self.complainant):
+            with self.subTest(role=user.role):
+                Complaint.objects.all().delete()
+                self.create_complaints(2)
+                small = self.assert_query_budget("/api/complaints/", user, self.LIST_BUDGET)
+                self.create_complaints(8)
+                large = self.assert_query_budget("/api/complaints/", user, self.LIST_BUDGET)
+                self.assertEqual(small, large)
+
+    def test_detail_budget(self):
+        self.create_complaints(1)
+        complaint = Complaint.objects.get()
+        for user in (self.admin, self.officer, self.complainant):
+            with self.subTest(role=user.role):
+                self.assert_query_budget(f"/api/complaints/{complaint.pk}/", user, self.DETAIL_BUDGET)
+
+
+class ComplaintPaginationTests(ComplaintAPITestCase):
+    """Cursor pages by default, page numbers for clients that ask for them"""
+
+    def test_cursor_pages_walk_every_complaint_once(self):
+        self.create_complaints(25)
+        self.client.force_authenticate(self.admin)
+        seen, url = [], "/api/complaints/"
+        while url:
+            response = self.client.get(url)
+            self.assertNotIn("count", response.data)
+            seen.extend(item["complaint_id"] for item in response.data["results"])
+            url = response.data["next"]
+        self.assertEqual(len(seen), 25)
+        self.assertEqual(len(set(seen)), 25)
+
+    def test_page_number_mode_is_kept(self):
+        self.create_complaints(12)
+        self.client.force_authenticate(self.admin)
+        response = self.client.get("/api/complaints/?page=2")
+        self.assertEqual(response.data["count"], 12)
+        self.assertEqual(len(response.data["results"]), 2)
+
+
+class ComplaintSearchTests(ComplaintAPITestCase):
+    """Without PostgreSQL the search action falls back to LIKE matching"""
+
+    def test_search_matches_title_description_and_discussion(self):
+        self.create_complaints(3)
+        first, second, third = Complaint.objects.order_by("title")
+        Complaint.objects.filter(pk=first.pk).update(title="Broken projector in lab")
+        Complaint.objects.filter(pk=second.pk).update(description="The lab projector flickers")
+        Response.objects.create(
+            complaint=third, responder=self.officer, title="Update", message="Lab access restored"
+        )
+
+        self.client.force_authenticate(self.admin)
+        response = self.client.get("/api/complaints/search/", {"q": "lab projector"})
+        self.assertEqual(response.status_code, 200)
+        found = {item["complaint_id"] for item in response.data["results"]}
+        self.assertEqual(found, {str(first.pk), str(second.pk)})
+
+    def test_search_is_scoped_to_the_user(self):
+        self.create_complaints(1)
+        stranger = User.objects.create(email="other@uog.edu.et", first_name="S", last_name="Other")
+        self.client.force_authenticate(stranger)
+        response = self.client.get("/api/complaints/search/", {"q": "grade"})
+        self.assertEqual(response.data["results"], [])
+
+    def test_search_limit_is_bounded(self):
+        self.create_complaints(3)
+        self.client.force_authenticate(self.admin)
+        def found(limit):
+            return self.client.get("/api/complaints/search/", {"q": "grade", "limit": limit})
+        self.assertEqual(len(found(2).data["results"]), 2)
+        self.assertEqual(len(found(-5).data["results"]), 1)
+        self.assertEqual(len(found(0).data["results"]), 1)
+        self.assertEqual(found("ten").status_code, 400)
+
+
+class ComplaintExportTests(ComplaintAPITestCase):
+    """The export streams what the list shows, with the same filters"""
+
+    def export(self, user, **params):
+        self.client.force_authenticate(user)
+        response = self.client.get("/api/complaints/export/", params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b"".join(response.streaming_content).decode()
+
+    def test_csv_export_includes_history_and_rating(self):
+        self.create_complaints(3)
+        complaint = Complaint.objects.order_by("created_at").first()
+        Assignment.objects.create(complaint=complaint, officer=self.officer, level=self.level, reason="escalation")
+        Comment.objects.create(complaint=complaint, author=self.complainant, comment_type="rating", message="", rating=4)
+
+        rows = list(csv.DictReader(io.StringIO(self.export(self.admin))))
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[0]["complaint_id"], str(complaint.pk))
+        self.assertIn("escalation: Department (officer@uog.edu.et)", rows[0]["assignment_history"])
+        self.assertEqual((rows[0]["escalations"], rows[0]["rating"]), ("1", "4"))
+        self.assertEqual((rows[1]["escalations"], rows[1]["rating"]), ("0", ""))
+
+    def test_jsonl_export_applies_list_filters(self):
+        self.create_complaints(4)
+        resolved = Complaint.objects.order_by("title")[:2]
+        Complaint.objects.filter(pk__in=[c.pk for c in resolved]).update(status="resolved")
+
+        rows = [json.loads(line) for line in self.export(self.admin, output="jsonl", status="resolved").splitlines()]
+        self.assertEqual({row["complaint_id"] for row in rows}, {str(c.pk) for c in resolved})
+        self.assertEqual(rows[0]["category"], "Grades")
+
+        listed = self.client.get("/api/complaints/", {"status": "resolved"}).data["results"]
+        self.assertEqual(len(listed), 2)
+
+    def test_export_is_scoped_to_the_user(self):
+        self.create_complaints(2)
+        stranger = User.objects.create(email="other@uog.edu.et", first_name="S", last_name="Other")
+        self.assertEqual(len(self.export(stranger).splitlines()), 1)
+        self.assertEqual(len(self.export(self.complainant).splitlines()), 3)
+
+    def test_bad_filter_is_rejected_before_streaming(self):
+        self.client.force_authenticate(self.admin)
+        response = self.client.get("/api/complaints/export/", {"created_after": "last week"})
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class AttachmentBlobTests(ComplaintAPITestCase):
+    """Identical uploads are stored once and reference-counted"""
+
+    def submit(self, *files):
+        self.client.force_authenticate(self.complainant)
+        data = {"title": "Lab", "description": "Broken", "institution": self.institution.pk,
+                "category": str(self.category.pk)}
+        for index, (name, content) in enumerate(files):
+            data[f"attachment_{index}"] = SimpleUploadedFile(name, content, content_type="image/jpeg")
+        response = self.client.post("/api/complaints/", data, format="multipart")
+        self.assertEqual(response.status_code, 201, response.content)
+        return Complaint.objects.get(pk=response.data["complaint_id"])
+
+    def test_same_content_is_stored_once(self):
+        photo = b"\xff\xd8" + os.urandom(2048)
+        first = self.submit(("a.jpg", photo), ("b.jpg", b"other"))
+        second = self.submit(("copy.jpg", photo))
+
+        blob = AttachmentBlob.objects.get(sha256=hashlib.sha256(photo).hexdigest())
+        self.assertEqual(blob.ref_count, 2)
+        self.assertEqual(AttachmentBlob.objects.count(), 2)
+        self.assertRegex(blob.file.name, rf"^blobs/{blob.sha256[:2]}/{blob.sha256[2:4]}/{blob.sha256}\.jpg$")
+        attachment = second.attachments.get()
+        self.assertEqual((attachment.file.name, attachment.filename), (blob.file.name, "copy.jpg"))
+        self.assertEqual(first.attachments.get(filename="a.jpg").blob, blob)
+
+    def test_unreferenced_blobs_are_collected_after_grace(self):
+        complaint = self.submit(("a.jpg", b"photo"))
+        blob = complaint.attachments.get().blob
+        complaint.delete()
+        blob.refresh_from_db()
+        self.assertEqual(blob.ref_count, 0)
+        self.assertTrue(blob.file.storage.exists(blob.file.name))
+
+        self.assertEqual(blobs.collect_garbage(), (0, 0))
+        self.assertEqual(blobs.collect_garbage(now=timezone.now() + timedelta(days=2)), (1, 5))
+        self.assertFalse(AttachmentBlob.objects.exists())
+        self.assertFalse(blob.file.storage.exists(blob.file.name))
+
+    @override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+    def test_files_of_rolled_back_uploads_are_swept(self):
+        class Rollback(Exception):
+            pass
+
+        upload = SimpleUploadedFile("a.jpg", b"rolled back", content_type="image/jpeg")
+        with self.assertRaises(Rollback), transaction.atomic():
+            name = blobs.store(upload).file.name
+            raise Rollback
+        kept = self.submit(("b.jpg", b"kept")).attachments.get().blob.file.name
+        self.assertFalse(AttachmentBlob.objects.filter(file=name).exists())
+        self.assertTrue(default_storage.exists(name))
+
+        self.assertEqual(blobs.sweep_orphan_files(), (0, 0))  # may still be an open upload
+        later = timezone.now() + timedelta(days=2)
+        self.assertEqual(blobs.sweep_orphan_files(now=later, dry_run=True), (1, 11))
+        self.assertEqual(blobs.sweep_orphan_files(now=later), (1, 11))
+        self.assertFalse(default_storage.exists(name))
+        self.assertTrue(default_storage.exists(kept))
+
+    def test_collection_skips_blobs_still_attached(self):
+        complaint = self.submit(("a.jpg", b"photo"))
+        blob = complaint.attachments.get().blob
+        AttachmentBlob.objects.filter(pk=blob.pk).update(ref_count=0)  # drifted count
+        self.assertEqual(blobs.collect_garbage(now=timezone.now() + timedelta(days=2)), (0, 0))
+        self.assertTrue(blob.file.storage.exists(blob.file.name))
+
+    def test_collection_removes_previews(self):
+        buffer = io.BytesIO()
+        Image.new("RGB", (400, 300), "red").save(buffer, "JPEG")
+        complaint = self.submit(("photo.jpg", buffer.getvalue()))
+        previews.PreviewWorker().drain()
+        blob = complaint.attachments.get().blob
+        preview = AttachmentPreview.objects.get(source=blob.file.name)
+        derivatives = [preview.thumbnail.name, preview.preview.name]
+
+        complaint.delete()
+        blobs.collect_garbage(now=timezone.now() + timedelta(days=2))
+        self.assertFalse(AttachmentPreview.objects.exists())
+        self.assertFalse(any(default_storage.exists(name) for name in derivatives))
+
+    def test_recount_repairs_drift(self):
+        complaint = self.submit(("a.jpg", b"photo"))
+        AttachmentBlob.objects.update(ref_count=7)
+        self.assertEqual(blobs.recount(), 1)
+        self.assertEqual(complaint.attachments.get().blob.ref_count, 1)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class AttachmentPreviewTests(ComplaintAPITestCase):
+    """Image uploads are only queued; the worker builds thumbnails and previews later"""
+
+    submit = AttachmentBlobTests.submit
+
+    def photo(self, width, height, mode="RGB"):
+        buffer = io.BytesIO()
+        Image.new(mode, (width, height), "red").save(buffer, "PNG" if mode == "RGBA" else "JPEG")
+        return buffer.getvalue()
+
+    def test_upload_queues_preview_without_generating_it(self):
+        complaint = self.submit(("photo.jpg", self.photo(2000, 1500)))
+        attachment = complaint.attachments.select_related("preview").get()
+        self.assertEqual(attachment.preview.status, AttachmentPreview.STATUS_PENDING)
+        self.assertFalse(attachment.preview.thumbnail)
+
+        response = self.client.get(f"/api/complaints/{complaint.pk}/")
+        listed = response.data["attachments"][0]
+        self.assertIsNone(listed["thumbnail"])
+        self.assertIsNone(listed["preview"])
+
+    def test_worker_generates_downscaled_derivatives(self):
+        complaint = self.submit(("photo.jpg", self.photo(2000, 1500)), ("logo.png", self.photo(100, 50, "RGBA")))
+        self.assertEqual(previews.PreviewWorker().drain(), {"ready": 2, "failed": 0})
+
+        photo = AttachmentPreview.objects.get(source=complaint.attachments.get(filename="photo.jpg").file.name)
+        self.assertEqual(photo.status, AttachmentPreview.STATUS_READY)
+        self.assertEqual((photo.source_width, photo.source_height), (2000, 1500))
+        self.assertEqual((photo.thumbnail_width, photo.thumbnail_height), (320, 240))
+        self.assertEqual((photo.preview_width, photo.preview_height), (1280, 960))
+        self.assertLess(photo.thumbnail_size, photo.preview_size)
+
+        response = self.client.get(f"/api/complaints/{complaint.pk}/")
+        listed = {item["filename"]: item for item in response.data["attachments"]}
+        self.assertEqual(listed["photo.jpg"]["thumbnail"]["width"], 320)
+        self.assertTrue(listed["photo.jpg"]["thumbnail"]["url"].endswith("-thumbnail.jpg"))
+        # Small images are never upscaled
+        self.assertEqual(listed["logo.png"]["preview"]["width"], 100)
+
+    def test_response_preview_is_queued_only_when_its_attachment_changes(self):
+        self.create_complaints(1)
+        complaint = Complaint.objects.get()
+        response = Response.objects.create(
+            complaint=complaint, responder=self.officer, title="Photo", message="See attached",
+            attachment=SimpleUploadedFile("site.jpg", self.photo(200, 150)),
+        )
+        preview = response.attachment_preview
+        self.assertEqual(preview.source, response.attachment.name)
+
+        response = Response.objects.get(pk=response.pk)
+        response.message = "See the attached photo"
+        with CaptureQueriesContext(connection) as queries:
+            response.save()
+        self.assertFalse(any("attachmentpreview" in q["sql"] for q in queries.captured_queries))
+
+        response.attachment = SimpleUploadedFile("after.jpg", self.photo(200, 150))
+        with self.captureOnCommitCallbacks(execute=True):
+            response.save()
+        self.assertEqual(response.attachment_preview.source, response.attachment.name)
+        self.assertFalse(AttachmentPreview.objects.filter(pk=preview.pk).exists())
+
+    def test_undecodable_image_is_skipped(self):
+        complaint = self.submit(("broken.jpg", b"not really a jpeg"))
+        self.assertEqual(previews.PreviewWorker().drain(), {"ready": 0, "failed": 1})
+        preview = complaint.attachments.get().preview
+        preview.refresh_from_db()
+        self.assertEqual(preview.status, AttachmentPreview.STATUS_SKIPPED)
+        self.assertEqual(previews.PreviewWorker().drain(), {"ready": 0, "failed": 0})
+
+    def test_worker_crashes_count_as_attempts(self):
+        complaint = self.submit(("photo.jpg", self.photo(200, 150)))
+        preview = complaint.attachments.get().preview
+        worker = previews.PreviewWorker()
+        for _ in range(worker.max_attempts):
+            self.assertEqual(len(worker.claim_batch()), 1)
+            # The worker dies mid-image; its lease runs out
+            AttachmentPreview.objects.filter(pk=preview.pk).update(next_attempt_at=timezone.now())
+
+        self.assertEqual(worker.claim_batch(), [])
+        preview.refresh_from_db()
+        self.assertEqual((preview.status, preview.attempts), (AttachmentPreview.STATUS_FAILED, worker.max_attempts))
+
+    def test_deleted_response_drops_its_preview(self):
+        complaint = self.submit()
+        response = Response(complaint=complaint, responder=self.officer, title="Photo", message="")
+        response.attachment.save("site.jpg", SimpleUploadedFile("site.jpg", self.photo(400, 300)), save=False)
+        response.save()
+        previews.PreviewWorker().drain()
+        preview = AttachmentPreview.objects.get(source=response.attachment.name)
+        self.assertEqual(preview.status, AttachmentPreview.STATUS_READY)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response.delete()
+        self.assertFalse(AttachmentPreview.objects.filter(pk=preview.pk).exists())
+        self.assertFalse(default_storage.exists(preview.thumbnail.name))
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+class CategoryTreeTests(ComplaintAPITestCase):
+    """Category paths follow the parent links, including when a branch moves"""
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.academic = self.category.parent
+        self.exams = Category.objects.create(institution=self.institution, name="Exams", parent=self.category)
+
+    def test_paths_follow_moves(self):
+        self.assertEqual(self.exams.path, f"{self.academic.pk}/{self.category.pk}/{self.exams.pk}/")
+        self.assertEqual(self.exams.depth, 2)
+
+        self.category.parent = None
+        self.category.save()
+        self.exams.refresh_from_db()
+        self.assertEqual(self.exams.path, f"{self.category.pk}/{self.exams.pk}/")
+        self.assertEqual(set(self.academic.subtree()), {self.academic})
+
+        self.category.parent = self.academic
+        self.category.save()
+        self.exams.refresh_from_db()
+        self.assertEqual(self.exams.depth, 2)
+        self.assertEqual(set(self.academic.subtree(include_self=False)), {self.category, self.exams})
+        with self.assertRaises(ValueError):
+            self.academic.parent = self.exams
+            self.academic.save()
+
+    def test_tree_is_one_query(self):
+        catalogue.ensure_paths()  # a process checks for legacy paths once
+        with self.assertNumQueries(1):
+            response = self.client.get(f"/api/categories/tree/?institution={self.institution.pk}")
+        [academic] = response.json()
+        self.assertEqual(academic["name"], "Academic")
+        self.assertEqual([child["name"] for child in academic["children"]], ["Grades"])
+        self.assertEqual(academic["children"][0]["children"][0]["name"], "Exams")
+
+    def test_complaints_filter_by_branch(self):
+        self.create_complaints(1)
+        Complaint.objects.create(
+            institution=self.institution, submitted_by=self.complainant, category=self.exams,
+            title="Exam", description="Late", current_level=self.level,
+        )
+        self.client.force_authenticate(self.admin)
+        def titles(branch):
+            response = self.client.get(f"/api/complaints/?category_branch={branch}")
+            return sorted(item["title"] for item in response.data["results"])
+        self.assertEqual(titles(self.academic.pk), ["Complaint 0", "Exam"])
+        self.assertEqual(titles(self.exams.pk), ["Exam"])
+        self.assertEqual(self.client.get("/api/complaints/?category_branch=nope").status_code, 400)
+
+    def test_legacy_paths_are_backfilled_on_first_read(self):
+        self.create_complaints(1)
+        finance = Category.objects.create(institution=self.institution, name="Finance")
+        Complaint.objects.create(
+            institution=self.institution, submitted_by=self.complainant, category=finance,
+            title="Fees", description="Overcharged", current_level=self.level,
+        )
+        Category.objects.update(path="")
+        self.client.force_authenticate(self.admin)
+
+        with mock.patch.object(catalogue, "_paths_checked", False):
+            response = self.client.get(f"/api/complaints/?category_branch={self.academic.pk}")
+        self.assertEqual([item["title"] for item in response.data["results"]], ["Complaint 0"])
+        self.exams.refresh_from_db()
+        self.assertEqual(self.exams.path, f"{self.academic.pk}/{self.category.pk}/{self.exams.pk}/")
+
+    def test_parent_cycles_are_refused(self):
+        Category.objects.filter(pk=self.academic.pk).update(parent=self.exams)
+        Category.objects.update(path="")
+        finance = Category.objects.create(institution=self.institution, name="Finance")
+        self.client.force_authenticate(self.admin)
+
+        with mock.patch.object(catalogue, "_paths_checked", False):
+            response = self.client.get(f"/api/complaints/?category_branch={self.exams.pk}")
+            self.assertEqual(response.status_code, 400)
+            response = self.client.patch(f"/api/categories/{finance.pk}/", {"parent": self.exams.pk}, format="json")
+            self.assertEqual(response.status_code, 400)
+            self.assertIn("parent", response.data)
+            names = [node["name"] for node in self.client.get("/api/categories/tree/").json()]
+        self.assertEqual(names, ["Finance"])
+
+    def test_saving_under_a_pathless_cycle_raises_value_error(self):
+        Category.objects.filter(pk=self.academic.pk).update(parent=self.exams)
+        Category.objects.update(path="")
+        finance = Category(institution=self.institution, name="Finance", parent=Category.objects.get(pk=self.exams.pk))
+        with self.assertRaisesMessage(ValueError, "cannot be moved under itself"):
+            finance.save()
+
+    def test_path_is_built_through_pathless_ancestors(self):
+        Category.objects.filter(pk__in=[self.category.pk, self.exams.pk]).update(path="")
+        finance = Category.objects.create(
+            institution=self.institution, name="Finance", parent=Category.objects.get(pk=self.exams.pk),
+        )
+        self.assertEqual(
+            finance.path, f"{self.academic.pk}/{self.category.pk}/{self.exams.pk}/{finance.pk}/",
+        )
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+class ReferenceCacheTests(ComplaintAPITestCase):
+    """Public reference lists revalidate by ETag and are cached per version"""
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def test_unchanged_list_is_not_modified_without_queries(self):
+        first = self.client.get("/api/categories/")
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first["Cache-Control"], "no-cache")
+        self.assertEqual(first.json()["count"], 2)
+
+        with self.assertNumQueries(0):
+            again = self.client.get("/api/categories/", HTTP_IF_NONE_MATCH=first["ETag"])
+            cached = self.client.get("/api/categories/")
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(cached.content, first.content)
+        self.assertEqual(cached["ETag"], first["ETag"])
+
+    def test_writes_bump_the_version(self):
+        first = self.client.get("/api/resolver-levels/")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.institution.name = "University of Gondar"
+            self.institution.save()
+        response = self.client.get("/api/resolver-levels/", HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["results"][0]["institution_name"], "University of Gondar")
+        self.assertNotEqual(response["ETag"], first["ETag"])
+
+    def test_query_string_is_part_of_the_key(self):
+        Category.objects.filter(pk=self.category.pk).update(name_amharic="ውጤት")
+        english = self.client.get("/api/categories/by-language/?lang=en")
+        amharic = self.client.get("/api/categories/by-language/?lang=am")
+        self.assertNotEqual(english["ETag"], amharic["ETag"])
+        self.assertIn("ውጤት", {item["name"] for item in amharic.json()})
+
+    def test_catalogue_lists_active_categories_per_institution(self):
+        other = Institution.objects.create(name="AAU", domain="aau.edu.et")
+        Category.objects.create(institution=other, name="Housing", name_amharic="መኖሪያ")
+        Category.objects.create(institution=self.institution, name="Retired", is_active=False)
+
+        response = self.client.get(f"/api/categories/by-language/?lang=am&institution={other.pk}")
+        self.assertEqual([item["name"] for item in response.json()], ["መኖሪያ"])
+        everything = self.client.get("/api/categories/by-language/")
+        self.assertEqual([item["name"] for item in everything.json()], ["Academic", "Grades", "Housing"])
+
+        with self.assertNumQueries(0):
+            again = self.client.get(f"/api/categories/by-language/?lang=en&institution={self.institution.pk}")
+            self.client.get("/api/categories/by-language/?institution=999")
+        self.assertEqual(again.json()[1]["parent"], self.category.parent_id)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.objects.filter(name="Retired").get().delete()
+            self.category.is_active = False
+            self.category.save()
+        response = self.client.get(f"/api/categories/by-language/?institution={self.institution.pk}")
+        self.assertEqual([item["name"] for item in response.json()], ["Academic"])
+
+    def test_announcement_cache_expires_with_the_first_announcement(self):
+        PublicAnnouncement.objects.create(title="Forever", message="", created_by=self.admin)
+        PublicAnnouncement.objects.create(
+            title="Soon", message="", created_by=self.admin, expires_at=timezone.now() + timedelta(seconds=90)
+        )
+        with mock.patch.object(cache, "set", wraps=cache.set) as cache_set:
+            self.client.get("/api/announcements/")
+        timeouts = [
+            call.args[2] for call in cache_set.call_args_list
+            if call.args[0].startswith("complaints:reference:announcements")
+        ]
+        self.assertEqual(len(timeouts), 1)
+        self.assertTrue(85 <= timeouts[0] <= 90)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get("/api/announcements/").json()["count"], 2)
+
+        # Once the entry has lapsed the rebuilt set leaves the expired one out
+        cache.clear()
+        later = timezone.now() + timedelta(seconds=120)
+        with mock.patch("django.utils.timezone.now", return_value=later), \
+                mock.patch("complaints.reference_cache.time.time", return_value=later.timestamp()):
+            response = self.client.get("/api/announcements/")
+        self.assertEqual([item["title"] for item in response.json()["results"]], ["Forever"])
+
+    def test_public_lists_ignore_stale_credentials(self):
+        response = self.client.get("/api/institutions/", HTTP_AUTHORIZATION="Bearer stale")
+        self.assertEqual(response.status_code, 200)
+
+    def test_announcements_are_cached_for_the_public_only(self):
+        PublicAnnouncement.objects.create(title="Closed", message="Holiday", created_by=self.admin)
+        PublicAnnouncement.objects.create(title="Draft", message="", created_by=self.admin, is_active=False)
+        public = self.client.get("/api/announcements/")
+        self.assertEqual([item["title"] for item in public.json()["results"]], ["Closed"])
+
+        bearer = f"Bearer {RefreshToken.for_user(self.admin).access_token}"
+        staff = self.client.get("/api/announcements/", HTTP_AUTHORIZATION=bearer)
+        self.assertEqual(len(staff.json()["results"]), 2)
+        self.assertNotIn("ETag", staff)
+        stale = self.client.get("/api/announcements/", HTTP_AUTHORIZATION="Bearer stale")
+        self.assertEqual(stale.status_code, 200)
+        self.assertEqual(stale["ETag"], public["ETag"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.admin.first_name = "Head"
+            self.admin.save()
+        renamed = self.client.get("/api/announcements/", HTTP_IF_NONE_MATCH=public["ETag"])
+        self.assertEqual(renamed.json()["results"][0]["created_by_name"], "Head Admin")
+
+
+class SharedCacheTests(ComplaintAPITestCase):
+    """Version tokens live in the cache every process shares and are read back every VERSION_CHECK_SECONDS"""
+
+    def bump_elsewhere(self, resource):
+        # Another worker: its own token, read through its own client of the configured backend
+        with mock.patch.object(versions, "cache", caches.create_connection("default")):
+            versions.VersionToken(reference_cache.VERSION_KEY.format(resource)).bump()
+
+    @staticmethod
+    def after_check_interval():
+        later = time.monotonic() + settings.VERSION_CHECK_SECONDS + 1
+        return mock.patch("conf.versions.time.monotonic", return_value=later)
+
+    def test_configured_cache_is_shared(self):
+        self.assertNotIn("locmem", settings.CACHES["default"]["BACKEND"])
+
+    def test_revalidation_costs_no_query_with_the_default_cache(self):
+        first = self.client.get("/api/categories/")
+        self.client.get("/api/categories/by-language/")
+        with self.assertNumQueries(0):
+            again = self.client.get("/api/categories/", HTTP_IF_NONE_MATCH=first["ETag"])
+            cached = self.client.get("/api/categories/")
+            self.client.get("/api/categories/by-language/")
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(cached.content, first.content)
+
+    def test_bump_from_another_process_invalidates_this_one(self):
+        first = self.client.get("/api/institutions/")
+        Institution.objects.filter(pk=self.institution.pk).update(name="University of Gondar")
+        self.bump_elsewhere(reference_cache.INSTITUTIONS)
+        stale = self.client.get("/api/institutions/", HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(stale.status_code, 304)  # until this process checks the token again
+
+        with self.after_check_interval():
+            response = self.client.get("/api/institutions/", HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["results"][0]["name"], "University of Gondar")
+
+    def test_landing_page_announcements_cost_no_query(self):
+        PublicAnnouncement.objects.create(title="Closed", message="Holiday", created_by=self.admin)
+        first = self.client.get("/api/announcements/")
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get("/api/announcements/").content, first.content)
+            self.client.get("/api/announcements/", HTTP_AUTHORIZATION="Bearer stale")
+
+    def test_catalogue_follows_changes_made_elsewhere(self):
+        self.client.get("/api/categories/by-language/")
+        Category.objects.filter(pk=self.category.pk).update(is_active=False)
+        self.bump_elsewhere(reference_cache.CATEGORIES)
+        with self.after_check_interval():
+            names = [item["name"] for item in self.client.get("/api/categories/by-language/").json()]
+        self.assertEqual(names, ["Academic"])
+
+    @override_settings(CATEGORY_CATALOGUE_MAX_AGE=60)
+    def test_catalogue_snapshot_has_a_max_age(self):
+        self.client.get("/api/categories/by-language/")
+        Category.objects.filter(pk=self.category.pk).update(is_active=False)  # no signal, no bump
+        self.assertEqual(len(self.client.get("/api/categories/by-language/").json()), 2)
+
+        later = time.monotonic() + 61
+        with mock.patch("complaints.catalogue.time.monotonic", return_value=later):
+            names = [item["name"] for item in self.client.get("/api/categories/by-language/").json()]
+        self.assertEqual(names, ["Academic"])
+
+
+class RoutingTableTests(ComplaintAPITestCase):
+    """Routing lookups come from one snapshot, rebuilt when any process publishes a new version"""
+
+    def setUp(self):
+        super().setUp()
+        self.table = RoutingTable()
+
+    def officer_ids(self, level):
+        return [route.officer_id for route in self.table.resolvers_for(self.category.pk, level)]
+
+    def test_lookups_reuse_the_snapshot(self):
+        self.assertEqual(self.table.first_level(self.institution.pk), self.level)
+        self.assertEqual(self.table.first_level(None), self.level)
+        with self.assertNumQueries(0):  # the version is checked every VERSION_CHECK_SECONDS
+            self.assertEqual(self.officer_ids(self.level), [self.officer.pk])
+            self.assertIsNone(self.table.next_level(self.level))
+        self.assertEqual(self.table.stats()["builds"], 1)
+
+    def test_committed_changes_rebuild_the_table(self):
+        self.table.first_level(self.institution.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            upper = ResolverLevel.objects.create(
+                institution=self.institution, name="Dean", level_order=2, escalation_time=timedelta(hours=72)
+            )
+            CategoryResolver.objects.create(category=self.category, level=upper, officer=self.admin)
+
+        self.assertEqual(self.table.next_level(self.level), upper)
+        self.assertEqual(self.officer_ids(upper), [self.admin.pk])
+        self.assertEqual(self.table.stats()["builds"], 2)
+
+    def test_invalidation_from_another_process_reaches_this_one(self):
+        self.table.first_level(self.institution.pk)
+        CategoryResolver.objects.filter(officer=self.officer).update(active=False)
+        with mock.patch.object(versions, "cache", caches.create_connection("default")):
+            versions.VersionToken(routing.VERSION_CACHE_KEY).bump()
+        self.assertEqual(self.officer_ids(self.level), [self.officer.pk])  # until the next version check
+
+        later = time.monotonic() + settings.VERSION_CHECK_SECONDS + 1
+        with mock.patch("conf.versions.time.monotonic", return_value=later):
+            self.assertEqual(self.officer_ids(self.level), [])
+        self.assertEqual(self.table.stats()["builds"], 2)
+
+    def test_deactivated_officers_are_not_routed(self):
+        self.assertEqual(routing.pick_officer(self.table.resolvers_for(self.category.pk, self.level)), self.officer)
+
+        # Without a signal the snapshot still lists the officer, but it is not picked
+        User.objects.filter(pk=self.officer.pk).update(is_active=False)
+        self.assertIsNone(routing.pick_officer(self.table.resolvers_for(self.category.pk, self.level)))
+
+        officer = User.objects.get(pk=self.officer.pk)
+        officer.is_active = True
+        with self.captureOnCommitCallbacks(execute=True):
+            officer.save()
+        officer.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            officer.save()
+        self.assertEqual(self.officer_ids(self.level), [])
+
+    def test_officer_edits_are_never_served_from_the_snapshot(self):
+        self.table.first_level(self.institution.pk)
+        User.objects.filter(pk=self.officer.pk).update(email="renamed@uog.edu.et")
+        officer = routing.pick_officer(self.table.resolvers_for(self.category.pk, self.level))
+        self.assertEqual(officer.email, "renamed@uog.edu.et")
+        self.assertEqual(self.table.stats()["builds"], 1)
+
+
+class EscalationSweepTests(ComplaintAPITestCase):
+    """The sweep escalates overdue complaints chunk by chunk, each chunk in one transaction"""
+
+    def setUp(self):
+        super().setUp()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.dean = ResolverLevel.objects.create(
+                institution=self.institution, name="Dean", level_order=2, escalation_time=timedelta(hours=72)
+            )
+            self.deans = [
+                User.objects.create(email=f"dean{index}@uog.edu.et", first_name="D", last_name=str(index),
+                                    role=User.ROLE_OFFICER)
+                for index in range(2)
+            ]
+            for dean in self.deans:
+                CategoryResolver.objects.create(category=self.category, level=self.dean, officer=dean)
+
+    def test_overdue_complaints_escalate_across_chunks(self):
+        self.create_complaints(5)
+        stuck = Complaint.objects.create(  # nobody above this level
+            institution=self.institution, submitted_by=self.complainant, category=self.category,
+            title="Stuck", description="Already at the top", current_level=self.dean,
+        )
+        Complaint.objects.update(escalation_deadline=timezone.now() - timedelta(hours=1))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            results = EscalationService.check_and_escalate_complaints(batch_size=2)
+        self.assertEqual((results["total_checked"], results["escalated"], results["failed"]), (6, 5, 1))
+        self.assertEqual(results["errors"], [])
+
+        escalated = Complaint.objects.exclude(pk=stuck.pk)
+        self.assertEqual(set(escalated.values_list("status", "current_level")), {("escalated", self.dean.pk)})
+        self.assertTrue(all(deadline > timezone.now() for deadline in escalated.values_list("escalation_deadline", flat=True)))
+        # Least-loaded assignment spreads the chunks over both deans
+        loads = sorted(escalated.values_list("assigned_officer", flat=True))
+        self.assertEqual(sorted(loads.count(dean.pk) for dean in self.deans), [2, 3])
+
+        assignments = Assignment.objects.filter(reason="escalation")
+        self.assertEqual(assignments.count(), 5)
+        self.assertEqual(set(assignments.values_list("level", flat=True)), {self.dean.pk})
+        self.assertEqual(
+            set(assignments.values_list("complaint", "officer")),
+            set(escalated.values_list("complaint_id", "assigned_officer")),
+        )
+
+        notifications = Notification.objects.values_list("notification_type", "user")
+        self.assertEqual(sum(kind == "escalation_assigned" for kind, _ in notifications), 5)
+        self.assertEqual(
+            [user for kind, user in notifications if kind == "escalation_update"], [self.complainant.pk] * 5
+        )
+        self.assertEqual(
+            [(kind, user) for kind, user in notifications if kind == "max_escalation"], [("max_escalation", self.admin.pk)]
+        )
+        self.assertEqual(Complaint.objects.get(pk=stuck.pk).status, "pending")
+
+        # Only the complaint nobody can take is still overdue
+        self.assertEqual(EscalationService.check_and_escalate_complaints(batch_size=2)["total_checked"], 1)
+
+    def test_complaints_gone_from_the_sweep_are_counted_as_skipped(self):
+        self.create_complaints(3)
+        Complaint.objects.update(escalation_deadline=timezone.now() - timedelta(hours=1))
+        resolved = Complaint.objects.order_by("escalation_deadline", "pk").first()
+        escalate_chunk = EscalationService._escalate_chunk
+
+        def resolve_first(*args):
+            # Handled elsewhere between the id snapshot and the locked reload
+            Complaint.objects.filter(pk=resolved.pk).update(status="resolved")
+            return escalate_chunk(*args)
+
+        with mock.patch.object(EscalationService, "_escalate_chunk", side_effect=resolve_first), \
+                self.captureOnCommitCallbacks(execute=True):
+            results = EscalationService.check_and_escalate_complaints()
+        self.assertEqual(
+            (results["total_checked"], results["escalated"], results["failed"], results["skipped"]), (3, 2, 0, 1),
+        )
+        self.assertEqual(Complaint.objects.get(pk=resolved.pk).status, "resolved")
+
+
+class OfficerWorkloadTests(ComplaintAPITestCase):
+    """Open complaint counters drive weighted least-loaded assignment and match a rebuild"""
+
+    submit = AttachmentBlobTests.submit
+
+    def setUp(self):
+        super().setUp()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.colleague = User.objects.create(
+                email="colleague@uog.edu.et", first_name="C", last_name="Colleague", role=User.ROLE_OFFICER
+            )
+            self.resolver = CategoryResolver.objects.create(
+                category=self.category, level=self.level, officer=self.colleague, weight=2
+            )
+
+    def counters(self):
+        return dict(OfficerWorkload.objects.filter(open_complaints__gt=0).values_list("officer", "open_complaints"))
+
+    def rebuild(self):
+        call_command("rebuild_officer_workload", stdout=io.StringIO())
+        return self.counters()
+
+    def test_new_complaints_follow_weights(self):
+        for _ in range(6):
+            self.submit()
+        self.assertEqual(self.counters(), {self.officer.pk: 2, self.colleague.pk: 4})
+
+    def test_zero_weight_is_refused_and_never_picked(self):
+        self.client.force_authenticate(self.admin)
+        response = self.client.patch(f"/api/resolver-assignments/{self.resolver.pk}/", {"weight": 0}, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("weight", response.data)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            CategoryResolver.objects.filter(pk=self.resolver.pk).update(weight=0)
+            routing.routing_table.invalidate()
+        for _ in range(3):
+            self.submit()
+        self.assertEqual(self.counters(), {self.officer.pk: 3})
+
+    def test_counters_match_a_rebuild(self):
+        complaints = [self.submit() for _ in range(5)]
+        self.client.force_authenticate(self.admin)
+        self.client.post(f"/api/complaints/{complaints[0].pk}/change-status/", {"status": "resolved"})
+        self.client.post(f"/api/complaints/{complaints[1].pk}/reassign/", {"officer_id": self.admin.pk})
+        self.client.post(f"/api/complaints/{complaints[2].pk}/change-status/", {"status": "closed"})
+        self.client.post(f"/api/complaints/{complaints[2].pk}/change-status/", {"status": "in_progress"})
+        self.client.delete(f"/api/complaints/{complaints[3].pk}/")
+
+        counters = self.counters()
+        self.assertEqual(sum(counters.values()), 3)
+        self.assertEqual(self.rebuild(), counters)
+
+        OfficerWorkload.objects.update(open_complaints=42)  # drift
+        self.assertEqual(self.rebuild(), counters)
+
+
+class NotificationInboxTests(ComplaintAPITestCase):
+    """Unread counters live in the shared cache and follow every write, wherever it happens"""
+
+    def notify(self, count=1):
+        with self.captureOnCommitCallbacks(execute=True):
+            return [
+                Notification.objects.create(user=self.officer, title=f"N{index}", message="")
+                for index in range(count)
+            ]
+
+    def unread(self):
+        return self.client.get("/api/notifications/unread-count/").data["count"]
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.officer)
+
+    def test_counter_follows_creates_and_reads(self):
+        first, *_ = self.notify(3)
+        self.assertEqual(self.unread(), 3)
+        self.notify(1)
+        with self.assertNumQueries(1):  # the cache read, no COUNT
+            self.assertEqual(self.unread(), 4)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post("/api/notifications/mark-all-as-read/", {"ids": [first.pk]}, format="json")
+        self.assertEqual(response.data["count"], 1)
+        self.assertEqual(self.unread(), 3)
+
+    def test_reads_in_another_process_reach_this_one(self):
+        self.notify(2)
+        self.assertEqual(self.unread(), 2)
+        with mock.patch.object(inbox, "cache", caches.create_connection("default")):
+            with self.captureOnCommitCallbacks(execute=True):
+                inbox.mark_read(self.officer.pk)
+        self.assertEqual(self.unread(), 0)
+
+    def test_bulk_created_notifications_count_each_user_once(self):
+        users = [self.officer, self.admin, self.complainant]
+        Notification.objects.create(user=self.admin, title="Earlier", message="")
+        published = []
+        with mock.patch.object(inbox.broker, "publish", side_effect=lambda user_id, payload: published.append(payload)):
+            with CaptureQueriesContext(connection) as queries:
+                with self.captureOnCommitCallbacks(execute=True):
+                    inbox.created(Notification.objects.bulk_create(
+                        Notification(user=user, title=f"N{index}", message="")
+                        for index in range(20) for user in users
+                    ))
+        counts = [q["sql"] for q in queries.captured_queries if "COUNT(" in q["sql"]]
+        self.assertEqual(len(counts), 1)  # one grouped COUNT for the three cold counters
+        self.assertEqual(len(published), 60)
+        self.assertEqual({payload["unread"] for payload in published}, {20, 21})
+        self.assertEqual(self.unread(), 20)
+
+    def test_ids_must_be_notification_ids(self):
+        self.notify(1)
+        for ids in (["x"], "1", [{"id": 1}], [-1]):
+            response = self.client.post("/api/notifications/mark-all-as-read/", {"ids": ids}, format="json")
+            self.assertEqual(response.status_code, 400, ids)
+        self.assertEqual(self.unread(), 1)
+
+
+class StreamTestMixin:
+    @staticmethod
+    def scope(token=None, method="GET", origin=None):
+        return {
+            "type": "http", "method": method, "path": "/api/notifications/stream/",
+            "query_string": f"token={token}".encode() if token else b"",
+            "headers": [(b"origin", origin.encode())] if origin else [],
+        }
+
+    @staticmethod
+    def collector(sent):
+        async def send(message):
+            sent.append(message)
+        return send
+
+    def run_stream(self, scope):
+        """Send of a stream that ends by itself (errors, expiry)"""
+        sent = []
+        asyncio.run(asyncio.wait_for(notification_stream(scope, asyncio.Queue().get, self.collector(sent)), 10))
+        return sent
+
+    @staticmethod
+    def bodies(sent):
+        return [message.get("body", b"") for message in sent[1:]]
+
+    def events(self, sent, name):
+        return [body for body in self.bodies(sent) if f"event: {name}\n".encode() in body]
+
+
+@override_settings(
+    NOTIFICATION_STREAM_HEARTBEAT_SECONDS=0.5,
+    CACHES={"default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "OPTIONS": {"MAX_ENTRIES": 100000},
+    }},
+)
+class NotificationStreamSoakTests(StreamTestMixin, TransactionTestCase):
+    """Thousands of idle SSE connections on one event loop, as a single worker would hold them"""
+
+    STREAMS = int(os.environ.get("SSE_SOAK_STREAMS", 2000))
+    TARGETS = 10
+
+    def test_idle_streams_receive_only_their_notifications(self):
+        # Committed, so the stream's own connection sees them
+        users = User.objects.bulk_create([
+            User(email=f"soak{index}@uog.edu.et", first_name="S", last_name=str(index))
+            for index in range(self.STREAMS)
+        ])
+        cache.set_many({f"complaints:unread:{user.pk}": 0 for user in users})
+        asyncio.run(self.soak([user.pk for user in users]))
+
+    async def soak(self, user_ids):
+        inboxes, outboxes, tasks = [], [], []
+        for user_id in user_ids:
+            token = AccessToken()
+            token[jwt_settings.USER_ID_CLAIM] = str(user_id)
+            inbox, sent = asyncio.Queue(), []
+            inboxes.append(inbox)
+            outboxes.append(sent)
+            tasks.append(asyncio.create_task(notification_stream(self.scope(token), inbox.get, self.collector(sent))))
+
+        await self.wait_for(lambda: broker.stats()["streams"] == self.STREAMS)
+        await self.wait_for(lambda: all(len(sent) >= 2 for sent in outboxes))
+
+        # Published from a worker thread, the way sync views and the scheduler do it
+        loop = asyncio.get_running_loop()
+        for user_id in user_ids[:self.TARGETS]:
+            await loop.run_in_executor(None, broker.publish, user_id, {"id": user_id, "title": "Escalated"})
+        await self.wait_for(lambda: all(self.events(outboxes[i], "notification") for i in range(self.TARGETS)))
+        await asyncio.sleep(0.6)
+
+        for index, sent in enumerate(outboxes):
+            self.assertEqual(sent[0]["status"], 200)
+            self.assertEqual(len(self.events(sent, "unread")), 1)
+            self.assertEqual(len(self.events(sent, "notification")), 1 if index < self.TARGETS else 0)
+            self.assertTrue(any(b": keepalive" in body for body in self.bodies(sent)))
+
+        for inbox in inboxes:
+            inbox.put_nowait({"type": "http.disconnect"})
+        await asyncio.wait_for(asyncio.gather(*tasks), timeout=30)
+        self.assertEqual(broker.stats()["streams"], 0)
+
+    @staticmethod
+    async def wait_for(condition, timeout=60):
+        deadline = asyncio.get_running_loop().time() + timeout
+        while not condition():
+            if asyncio.get_running_loop().time() > deadline:
+                raise AssertionError("Timed out waiting for the streams")
+            await asyncio.sleep(0.05)
+
+
+@override_settings(CACHES=LOCAL_CACHE, CORS_ALLOW_ALL_ORIGINS=False, CORS_ALLOWED_ORIGINS=["https://cmfs.vercel.app"])
+class NotificationStreamAuthTests(StreamTestMixin, TransactionTestCase):
+    """The stream admits only tokens the REST API would, and answers cross-origin like it"""
+
+    def setUp(self):
+        self.user = User.objects.create(email="stream@uog.edu.et", first_name="S", last_name="Stream")
+
+    def test_rejects_missing_token(self):
+        self.assertEqual(self.run_stream(self.scope())[0]["status"], 401)
+
+    def test_rejects_inactive_and_unknown_users(self):
+        token = AccessToken.for_user(self.user)
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertEqual(self.run_stream(self.scope(token))[0]["status"], 401)
+
+        token[jwt_settings.USER_ID_CLAIM] = "999999"
+        self.assertEqual(self.run_stream(self.scope(token))[0]["status"], 401)
+
+    def test_rejects_tokens_revoked_by_logout(self):
+        refresh = RefreshToken.for_user(self.user)
+        access = refresh.access_token
+        response = self.client.post(
+            "/api/accounts/logout/", {"refresh": str(refresh)}, content_type="application/json",
+            HTTP_AUTHORIZATION=f"Bearer {access}",
+        )
+        self.assertEqual(response.status_code, 205)
+        self.assertEqual(self.run_stream(self.scope(access))[0]["status"], 401)
+
+    def test_stream_ends_when_the_token_expires(self):
+        token = AccessToken.for_user(self.user)
+        token.set_exp(lifetime=timedelta(seconds=1))
+        sent = self.run_stream(self.scope(token))
+        self.assertEqual(sent[0]["status"], 200)
+        self.assertEqual(len(self.events(sent, "expired")), 1)
+        self.assertFalse(sent[-1]["more_body"])
+
+    def test_cors_headers_for_allowed_origins_only(self):
+        token = AccessToken.for_user(self.user)
+        token.set_exp(lifetime=timedelta(seconds=1))
+        headers = dict(self.run_stream(self.scope(token, origin="https://cmfs.vercel.app"))[0]["headers"])
+        self.assertEqual(headers[b"access-control-allow-origin"], b"https://cmfs.vercel.app")
+        self.assertEqual(headers[b"access-control-allow-credentials"], b"true")
+
+        headers = dict(self.run_stream(self.scope(origin="https://cmfs.vercel.app"))[0]["headers"])
+        self.assertIn(b"access-control-allow-origin", headers)  # the 401 is readable too
+        headers = dict(self.run_stream(self.scope(origin="https://evil.example"))[0]["headers"])
+        self.assertNotIn(b"access-control-allow-origin", headers)
+
+        preflight = self.run_stream(self.scope(method="OPTIONS", origin="https://cmfs.vercel.app"))
+        self.assertEqual(preflight[0]["status"], 200)
+        self.assertIn(b"GET", dict(preflight[0]["headers"])[b"access-control-allow-methods"])
+
+
+class ComplaintDirtyFieldTests(ComplaintAPITestCase):
+    """Saves write only changed columns and the status email only follows a status change"""
+
+    def setUp(self):
+        super().setUp()
+        self.create_complaints(1)
+        self.complaint = Complaint.objects.get()
+
+    def test_save_updates_only_changed_columns(self):
+        self.complaint.assigned_officer = self.admin
+        with CaptureQueriesContext(connection) as queries:
+            self.complaint.save()
+        self.assertEqual(len(queries), 1)
+        sql = queries.captured_queries[0]["sql"]
+        self.assertIn('"assigned_officer_id"', sql)
+        self.assertNotIn('"description"', sql)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.complaint.save()
+        self.assertEqual(len(queries), 0)
+
+    @mock.patch("accounts.signals.EmailService.send_complaint_notification")
+    def test_status_email_only_on_status_change(self, send):
+        self.complaint.escalation_deadline = self.complaint.escalation_deadline + timedelta(hours=1)
+        self.complaint.save()
+        send.assert_not_called()
+
+        self.complaint.status = "in_progress"
+        self.complaint.save()
+        send.assert_called_once()
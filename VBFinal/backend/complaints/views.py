@@ -1,10 +1,16 @@
-from rest_framework import viewsets, permissions, status
+import math
+
+from rest_framework import viewsets, permissions, serializers, status
 from rest_framework.decorators import action
 from rest_framework.response import Response as DRFResponse
 from rest_framework.exceptions import ValidationError
 from django.utils import timezone
 from django.shortcuts import get_object_or_404
-from django.db import models
+from django.db import models, transaction
+
+from accounts.authentication import OptionalJWTAuthentication
+from conf.pagination import CreatedAtCursorPagination
+from conf.streaming import csv_response, jsonl_response
 
 from .models import Institution, Category, ResolverLevel, CategoryResolver, Complaint, ComplaintAttachment, ComplaintCC, Comment, Assignment, Response, Notification, Appointment, PublicAnnouncement
 from .serializers import (
@@ -23,36 +29,49 @@ from .serializers import (
     AppointmentSerializer,
 )
 from .service import service
+from .routing import routing_table
+from . import export as complaint_export, inbox, reference_cache, routing, search, workload
+from .catalogue import catalogue, tree as catalogue_tree
+from .filters import filter_complaints
+from .reference_cache import CachedListMixin
 
 
-class InstitutionViewSet(viewsets.ModelViewSet):
+class InstitutionViewSet(CachedListMixin, viewsets.ModelViewSet):
+    cached_resource = reference_cache.INSTITUTIONS
     queryset = Institution.objects.all()
     serializer_class = InstitutionSerializer
     permission_classes = [permissions.AllowAny]  # For development
 
 
-class CategoryViewSet(viewsets.ModelViewSet):
-    queryset = Category.objects.all()
+class CategoryViewSet(CachedListMixin, viewsets.ModelViewSet):
+    cached_resource = reference_cache.CATEGORIES
+    cached_actions = ('list', 'by_language', 'tree')
+    queryset = Category.objects.select_related('institution', 'parent')
     serializer_class = CategorySerializer
     permission_classes = [permissions.AllowAny]  # For development
 
     @action(detail=False, methods=["get"], url_path="by-language")
     def by_language(self, request):
-        """Get categories with language-specific names"""
-        language = request.query_params.get('lang', 'en')
-        categories = self.get_queryset()
-        
-        data = []
-        for cat in categories:
-            category_data = {
-                'category_id': cat.category_id,
-                'name': cat.name_amharic if language == 'am' and cat.name_amharic else cat.name,
-                'description': cat.description_amharic if language == 'am' and cat.description_amharic else cat.description,
-                'is_active': cat.is_active
-            }
-            data.append(category_data)
-        
-        return DRFResponse(data)
+        """Active categories with language-specific names, optionally for one institution"""
+        institution = request.query_params.get('institution') or None
+        if institution is not None:
+            try:
+                institution = int(institution)
+            except ValueError:
+                raise ValidationError({'institution': 'Must be an institution id.'})
+        entry = catalogue.entry(institution, request.query_params.get('lang', 'en'))
+        return reference_cache.conditional_response(request, entry)
+
+    @action(detail=False, methods=["get"], url_path="tree")
+    def tree(self, request):
+        """The category hierarchy, nested, for one institution (?institution=) or all"""
+        queryset = Category.objects.all()
+        institution = request.query_params.get('institution')
+        if institution:
+            if not institution.isdigit():
+                raise ValidationError({'institution': 'Must be an institution id.'})
+            queryset = queryset.filter(institution_id=institution)
+        return reference_cache.cached_response(request, self.cached_resource, lambda: catalogue_tree(queryset))
 
     @action(detail=True, methods=["post"], url_path="add-officer")
     def add_officer(self, request, pk=None):
@@ -63,8 +82,9 @@ class CategoryViewSet(viewsets.ModelViewSet):
         return DRFResponse({"detail": "Officer added successfully"}, status=status.HTTP_200_OK)
 
 
-class ResolverLevelViewSet(viewsets.ModelViewSet):
-    queryset = ResolverLevel.objects.all()
+class ResolverLevelViewSet(CachedListMixin, viewsets.ModelViewSet):
+    cached_resource = reference_cache.RESOLVER_LEVELS
+    queryset = ResolverLevel.objects.select_related('institution')
     serializer_class = ResolverLevelSerializer
     permission_classes = [permissions.AllowAny]  # For development
 
@@ -77,6 +97,8 @@ class CategoryResolverViewSet(viewsets.ModelViewSet):
 
 class ComplaintViewSet(viewsets.ModelViewSet):
     queryset = Complaint.objects.all()
+    pagination_class = CreatedAtCursorPagination
+
     def get_serializer_class(self):
         if self.action == 'create':
             return ComplaintCreateSerializer
@@ -86,12 +108,15 @@ class ComplaintViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         user = self.request.user
         if user.is_authenticated and hasattr(user, 'can_view_all_complaints') and user.can_view_all_complaints():
-            return Complaint.objects.all()
+            queryset = Complaint.objects.with_relations()
         elif user.is_authenticated and hasattr(user, 'get_accessible_complaints'):
-            return user.get_accessible_complaints()
+            queryset = user.get_accessible_complaints()
         else:
             # For development/testing, return all complaints
-            return Complaint.objects.all()
+            queryset = Complaint.objects.with_relations()
+        if self.action in ('list', 'export'):
+            queryset = filter_complaints(queryset, self.request.query_params)
+        return queryset
 
     def create(self, request, *args, **kwargs):
         import json
@@ -124,30 +149,47 @@ class ComplaintViewSet(viewsets.ModelViewSet):
         
         try:
             service.process_complaint(complaint)
-            complaint.refresh_from_db()
         except Exception:
             pass
+        complaint = Complaint.objects.with_relations().get(pk=complaint.pk)
             
         output_serializer = ComplaintSerializer(complaint)
         return DRFResponse(output_serializer.data, status=status.HTTP_201_CREATED)
 
+    def perform_update(self, serializer):
+        previous_status = serializer.instance.status
+        with transaction.atomic():
+            complaint = serializer.save()
+            workload.record_transition(
+                complaint.assigned_officer_id, previous_status,
+                complaint.assigned_officer_id, complaint.status
+            )
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            workload.record_transition(instance.assigned_officer_id, instance.status, None, None)
+            instance.delete()
+
     @action(detail=True, methods=["post"], url_path="assign")
     def assign(self, request, pk=None):
         """Assign complaint to an officer"""
         complaint = self.get_object()
         officer_id = request.data.get("officer_id")
         level_id = request.data.get("level_id")
+        previous_officer_id = complaint.assigned_officer_id
         
-        Assignment.objects.create(
-            complaint=complaint,
-            officer_id=officer_id,
-            level_id=level_id,
-            reason='manual'
-        )
-        complaint.assigned_officer_id = officer_id
-        complaint.current_level_id = level_id
-        complaint.set_escalation_deadline()
-        complaint.save()
+        with transaction.atomic():
+            Assignment.objects.create(
+                complaint=complaint,
+                officer_id=officer_id,
+                level_id=level_id,
+                reason='manual'
+            )
+            complaint.assigned_officer_id = officer_id
+            complaint.current_level_id = level_id
+            complaint.set_escalation_deadline()
+            complaint.save()
+            workload.record_transition(previous_officer_id, complaint.status, officer_id, complaint.status)
         
         return DRFResponse({"detail": "Complaint assigned successfully"}, status=status.HTTP_200_OK)
 
@@ -177,18 +219,21 @@ class ComplaintViewSet(viewsets.ModelViewSet):
                     level_order=1
                 )
         
-        # Create assignment record
-        Assignment.objects.create(
-            complaint=complaint,
-            officer_id=new_officer_id,
-            level=level,
-            reason=reason
-        )
-        
-        # Update complaint assignment
-        complaint.assigned_officer_id = new_officer_id
-        complaint.current_level = level
-        complaint.save()
+        previous_officer_id = complaint.assigned_officer_id
+        with transaction.atomic():
+            # Create assignment record
+            Assignment.objects.create(
+                complaint=complaint,
+                officer_id=new_officer_id,
+                level=level,
+                reason=reason
+            )
+            
+            # Update complaint assignment
+            complaint.assigned_officer_id = new_officer_id
+            complaint.current_level = level
+            complaint.save()
+            workload.record_transition(previous_officer_id, complaint.status, new_officer_id, complaint.status)
         
         return DRFResponse({
             "detail": "Complaint reassigned successfully",
@@ -202,8 +247,14 @@ class ComplaintViewSet(viewsets.ModelViewSet):
         new_status = request.data.get("status")
         if new_status not in dict(Complaint.STATUS_CHOICES):
             return DRFResponse({"error": "Invalid status"}, status=status.HTTP_400_BAD_REQUEST)
-        complaint.status = new_status
-        complaint.save()
+        previous_status = complaint.status
+        with transaction.atomic():
+            complaint.status = new_status
+            complaint.save()
+            workload.record_transition(
+                complaint.assigned_officer_id, previous_status,
+                complaint.assigned_officer_id, new_status
+            )
         return DRFResponse({"detail": f"Status updated to {new_status}"}, status=status.HTTP_200_OK)
 
     @action(detail=True, methods=["post"], url_path="escalate")
@@ -213,48 +264,82 @@ class ComplaintViewSet(viewsets.ModelViewSet):
         if not complaint.current_level:
             return DRFResponse({"error": "No current level set"}, status=status.HTTP_400_BAD_REQUEST)
         
-        next_level = ResolverLevel.objects.filter(
-            institution=complaint.institution,
-            level_order=complaint.current_level.level_order + 1
-        ).first()
+        next_level = routing_table.next_level(complaint.current_level)
         
         if not next_level:
             return DRFResponse({"error": "No higher level available"}, status=status.HTTP_400_BAD_REQUEST)
         
         # Find officer at next level for this category
-        category_resolver = CategoryResolver.objects.filter(
-            category=complaint.category,
-            level=next_level,
-            active=True
-        ).first()
+        resolvers = routing_table.resolvers_for(complaint.category_id, next_level)
+        officer = routing.pick_officer(resolvers)
         
-        if category_resolver:
-            # Create escalation assignment
-            Assignment.objects.create(
-                complaint=complaint,
-                officer=category_resolver.officer,
-                level=next_level,
-                reason='escalation'
-            )
-            
-            complaint.current_level = next_level
-            complaint.assigned_officer = category_resolver.officer
-            complaint.set_escalation_deadline()
-            complaint.status = "escalated"
-            complaint.save()
+        if officer:
+            previous_officer_id, previous_status = complaint.assigned_officer_id, complaint.status
+            with transaction.atomic():
+                # Create escalation assignment
+                Assignment.objects.create(
+                    complaint=complaint,
+                    officer=officer,
+                    level=next_level,
+                    reason='escalation'
+                )
+                
+                complaint.current_level = next_level
+                complaint.assigned_officer = officer
+                complaint.set_escalation_deadline()
+                complaint.status = "escalated"
+                complaint.save()
+                workload.record_transition(
+                    previous_officer_id, previous_status,
+                    officer.pk, complaint.status
+                )
             
             return DRFResponse({
                 "detail": f"Escalated to {next_level.name}",
-                "assigned_to": category_resolver.officer.email
+                "assigned_to": officer.email
             }, status=status.HTTP_200_OK)
         
         return DRFResponse({"error": "No resolver found at next level"}, status=status.HTTP_400_BAD_REQUEST)
     
+    @action(detail=False, methods=["get"], url_path="search")
+    def search(self, request):
+        """Ranked full-text search over complaints visible to the user"""
+        text = request.query_params.get("q", "").strip()
+        if not text:
+            return DRFResponse({"error": "q is required"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = max(1, min(int(request.query_params.get("limit", 20)), 100))
+        except ValueError:
+            return DRFResponse({"error": "limit must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+
+        complaints = search.search(self.get_queryset(), text)[:limit]
+        serializer = ComplaintSerializer(complaints, many=True)
+        return DRFResponse({"query": text, "results": serializer.data}, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=["get"], url_path="export", permission_classes=[permissions.IsAuthenticated])
+    def export(self, request):
+        """
+        Stream the complaints the list would show, with the same filters, as
+        CSV (default) or JSON Lines (?output=jsonl). History is the
+        assignment trail; status changes are not recorded (complaints.export).
+        """
+        output = request.query_params.get("output", "csv")
+        if output not in ("csv", "jsonl"):
+            return DRFResponse({"error": "output must be csv or jsonl"}, status=status.HTTP_400_BAD_REQUEST)
+
+        rows = complaint_export.rows(self.get_queryset())
+        filename = f"complaints-{timezone.now():%Y%m%d-%H%M}.{output}"
+        if output == "jsonl":
+            return jsonl_response(complaint_export.HEADER, rows, filename)
+        return csv_response(complaint_export.HEADER, rows, filename)
+
     @action(detail=True, methods=["get"], url_path="responses")
     def get_responses(self, request, pk=None):
         """Get all responses for a complaint"""
         complaint = self.get_object()
-        responses = Response.objects.filter(complaint=complaint).order_by('-created_at')
+        responses = Response.objects.filter(complaint=complaint).select_related(
+            'responder', 'attachment_preview'
+        ).order_by('-created_at')
         serializer = ResponseSerializer(responses, many=True)
         return DRFResponse(serializer.data, status=status.HTTP_200_OK)
     
@@ -270,6 +355,7 @@ class ComplaintViewSet(viewsets.ModelViewSet):
 class CommentViewSet(viewsets.ModelViewSet):
     queryset = Comment.objects.all()
     serializer_class = CommentSerializer
+    pagination_class = CreatedAtCursorPagination
     permission_classes = [permissions.AllowAny]  # For development
 
     def perform_create(self, serializer):
@@ -330,6 +416,7 @@ class CommentViewSet(viewsets.ModelViewSet):
 class ResponseViewSet(viewsets.ModelViewSet):
     queryset = Response.objects.all()
     serializer_class = ResponseSerializer
+    pagination_class = CreatedAtCursorPagination
     permission_classes = [permissions.AllowAny]  # For development
 
     def perform_create(self, serializer):
@@ -338,7 +425,7 @@ class ResponseViewSet(viewsets.ModelViewSet):
         serializer.save(responder=user)
 
     def get_queryset(self):
-        queryset = Response.objects.all()
+        queryset = Response.objects.select_related('responder', 'attachment_preview')
         complaint_id = self.request.query_params.get('complaint', None)
         if complaint_id:
             queryset = queryset.filter(complaint=complaint_id)
@@ -361,27 +448,43 @@ class ResponseViewSet(viewsets.ModelViewSet):
 
 class NotificationViewSet(viewsets.ModelViewSet):
     serializer_class = NotificationSerializer
+    pagination_class = CreatedAtCursorPagination
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
         """Users can only see their own notifications"""
-        return Notification.objects.filter(user=self.request.user)
+        return Notification.objects.filter(user=self.request.user).select_related('complaint')
+
+    def _limit(self, request, default=50):
+        try:
+            return max(1, min(int(request.query_params.get('limit', default)), 200))
+        except ValueError:
+            return default
+
+    @action(detail=False, methods=['get'], url_path='unread-count')
+    def unread_count(self, request):
+        """Unread badge count, served from the cached counter"""
+        return DRFResponse({'count': inbox.unread_count(request.user.pk)})
 
     @action(detail=False, methods=['get'], url_path='unread')
     def unread(self, request):
-        """Get unread notifications for current user"""
-        notifications = Notification.get_unread_for_user(request.user)
+        """Get unread notifications for current user (newest ``limit``; ``?count_only=true`` for the count alone)"""
+        count = inbox.unread_count(request.user.pk)
+        if request.query_params.get('count_only') in ('1', 'true', 'True'):
+            return DRFResponse({'count': count})
+
+        notifications = self.get_queryset().filter(is_read=False)[:self._limit(request)] if count else []
         serializer = self.get_serializer(notifications, many=True)
         return DRFResponse({
-            'count': notifications.count(),
+            'count': count,
             'notifications': serializer.data
         })
 
     @action(detail=False, methods=['get'], url_path='escalations')
     def escalations(self, request):
-        """Get escalation-related notifications"""
-        notifications = Notification.get_escalation_notifications(request.user)
-        serializer = self.get_serializer(notifications, many=True)
+        """Get escalation-related notifications (newest ``limit``)"""
+        notifications = Notification.get_escalation_notifications(request.user).select_related('complaint')
+        serializer = self.get_serializer(notifications[:self._limit(request)], many=True)
         return DRFResponse({
             'count': notifications.count(),
             'notifications': serializer.data
@@ -399,25 +502,46 @@ class NotificationViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['post'], url_path='mark-all-as-read')
     def mark_all_as_read(self, request):
-        """Mark all unread notifications as read"""
-        notifications = Notification.get_unread_for_user(request.user)
-        count = notifications.count()
-        
-        for notification in notifications:
-            notification.mark_as_read()
-        
+        """Mark all unread notifications, or only those listed in ``ids``, as read in one UPDATE"""
+        ids = request.data.get('ids') if hasattr(request.data, 'get') else None
+        if ids is not None:
+            field = serializers.ListField(child=serializers.IntegerField(min_value=1))
+            try:
+                ids = field.run_validation(ids)
+            except ValidationError:
+                return DRFResponse({'error': 'ids must be a list of notification ids'}, status=status.HTTP_400_BAD_REQUEST)
+
+        count = inbox.mark_read(request.user.pk, ids=ids)
         return DRFResponse({
-            'message': f'{count} notifications marked as read'
+            'message': f'{count} notifications marked as read',
+            'count': count
         }, status=status.HTTP_200_OK)
 
 
-class PublicAnnouncementViewSet(viewsets.ModelViewSet):
+class PublicAnnouncementViewSet(CachedListMixin, viewsets.ModelViewSet):
     serializer_class = PublicAnnouncementSerializer
+    cached_resource = reference_cache.ANNOUNCEMENTS
+
+    def get_cached_timeout(self):
+        # Expiry changes the public set without a write, so the cached copy
+        # must not outlive the first announcement in it to expire
+        now = timezone.now()
+        soonest = PublicAnnouncement.objects.active(now).aggregate(soonest=models.Min('expires_at'))['soonest']
+        timeout = reference_cache.cache_timeout()
+        if soonest is None:
+            return timeout
+        return max(1, min(timeout, math.ceil((soonest - now).total_seconds())))
+
+    def use_cache(self, request):
+        # Staff list their own or every announcement, not the public set
+        return getattr(request.user, 'role', None) not in ('officer', 'admin', 'super_admin')
 
     def get_authenticators(self):
-        # Avoid 401 on public endpoints when stale/invalid Authorization headers are present.
-        if getattr(self, 'action', None) in ['list', 'retrieve']:
-            return []
+        # Public, but staff list their own announcements: a valid token is
+        # honoured, a stale or invalid one is ignored instead of a 401
+        action = getattr(self, 'action', None) or self.action_map.get(self.request.method.lower())
+        if action in ['list', 'retrieve']:
+            return [OptionalJWTAuthentication()]
         return super().get_authenticators()
 
     def get_permissions(self):
@@ -435,10 +559,7 @@ class PublicAnnouncementViewSet(viewsets.ModelViewSet):
                     return queryset
                 return queryset.filter(created_by=user)
 
-            now = timezone.now()
-            return queryset.filter(is_active=True).filter(
-                models.Q(expires_at__isnull=True) | models.Q(expires_at__gt=now)
-            )
+            return queryset.active()
 
         if not user.is_authenticated:
             return PublicAnnouncement.objects.none()
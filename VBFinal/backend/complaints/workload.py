@@ -0,0 +1,80 @@
+"""
+Per-officer open complaint counters used for least-loaded assignment
+"""
+from collections import defaultdict
+
+from django.db.models import F
+from django.db.models.functions import Greatest
+
+from .models import OfficerWorkload
+
+
+OPEN_STATUSES = ('pending', 'in_progress', 'escalated')
+
+
+def is_open(status):
+    return status in OPEN_STATUSES
+
+
+def current_loads(officer_ids):
+    """Map officer id to open complaint count with a single indexed lookup"""
+    officer_ids = {officer_id for officer_id in officer_ids if officer_id}
+    if not officer_ids:
+        return {}
+    return dict(
+        OfficerWorkload.objects.filter(officer_id__in=officer_ids)
+        .values_list('officer_id', 'open_complaints')
+    )
+
+
+def pick_least_loaded(resolvers, loads=None):
+    """
+    Pick the resolver with the lowest open count per unit of weight. Ties go
+    to the earliest resolver, which keeps the previous behaviour when loads
+    are equal. A resolver with weight 0 (validation refuses it, but bulk
+    writes can store it) is never picked.
+    """
+    resolvers = [resolver for resolver in resolvers or () if resolver.weight > 0]
+    if not resolvers:
+        return None
+    if len(resolvers) == 1:
+        return resolvers[0]
+    if loads is None:
+        loads = current_loads(resolver.officer_id for resolver in resolvers)
+    return min(
+        resolvers,
+        key=lambda resolver: loads.get(resolver.officer_id, 0) / resolver.weight
+    )
+
+
+def transition_deltas(old_officer_id, old_status, new_officer_id, new_status, deltas=None):
+    """Accumulate the counter changes for one complaint moving between officers/statuses"""
+    if deltas is None:
+        deltas = defaultdict(int)
+    if old_officer_id and is_open(old_status):
+        deltas[old_officer_id] -= 1
+    if new_officer_id and is_open(new_status):
+        deltas[new_officer_id] += 1
+    return deltas
+
+
+def record_transition(old_officer_id, old_status, new_officer_id, new_status):
+    apply_deltas(transition_deltas(old_officer_id, old_status, new_officer_id, new_status))
+
+
+def apply_deltas(deltas):
+    """Apply counter changes with atomic F() updates, creating missing rows"""
+    for officer_id, delta in deltas.items():
+        if not officer_id or not delta:
+            continue
+        if delta > 0:
+            value = F('open_complaints') + delta
+        else:
+            value = Greatest(F('open_complaints') + delta, 0)
+
+        if not OfficerWorkload.objects.filter(officer_id=officer_id).update(open_complaints=value):
+            OfficerWorkload.objects.bulk_create(
+                [OfficerWorkload(officer_id=officer_id)],
+                ignore_conflicts=True
+            )
+            OfficerWorkload.objects.filter(officer_id=officer_id).update(open_complaints=value)
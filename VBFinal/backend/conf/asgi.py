@@ -2,6 +2,8 @@
 ASGI config for conf project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Serve it with an ASGI server for the notification stream, e.g.
+``gunicorn conf.asgi:application -k uvicorn.workers.UvicornWorker``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/6.0/howto/deployment/asgi/
@@ -13,4 +15,16 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'conf.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported after setup so the app registry is ready
+from complaints.sse import STREAM_PATH, notification_stream  # noqa: E402
+
+
+async def application(scope, receive, send):
+    # The notification stream bypasses Django's request cycle; an idle
+    # connection then holds no worker thread
+    if scope['type'] == 'http' and scope['path'] == STREAM_PATH:
+        await notification_stream(scope, receive, send)
+        return
+    await django_application(scope, receive, send)
@@ -0,0 +1,78 @@
+import copy
+
+
+class DirtyFieldsMixin:
+    """
+    Remembers the values a model instance was loaded (or last saved) with.
+
+    ``save()`` on a loaded instance then writes only the changed columns, plus
+    ``auto_now`` ones, as ``update_fields``. A save with nothing changed does
+    nothing. Signal receivers can ask ``has_changed(field)``, because
+    post_save runs before the snapshot is refreshed.
+    """
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._snapshot()
+        return instance
+
+    def _snapshot(self, fields=None):
+        loaded = self.__dict__
+        original = getattr(self, '_original_values', {}) if fields is not None else {}
+        for field in self._meta.concrete_fields:
+            if field.primary_key or field.attname not in loaded:
+                continue
+            if fields is None or field.attname in fields or field.name in fields:
+                value = loaded[field.attname]
+                original[field.attname] = copy.deepcopy(value) if isinstance(value, (dict, list)) else value
+        self._original_values = original
+
+    def get_dirty_fields(self):
+        """Names of loaded fields whose value differs from the snapshot"""
+        original = getattr(self, '_original_values', None)
+        if original is None:
+            return None
+        return [
+            field.name for field in self._meta.concrete_fields
+            if field.attname in original and self.__dict__.get(field.attname) != original[field.attname]
+        ]
+
+    def has_changed(self, field_name):
+        """Whether ``field_name`` differs from the snapshot; True when there is nothing to compare with"""
+        field = self._meta.get_field(field_name)
+        original = getattr(self, '_original_values', None)
+        if original is None or field.attname not in original:
+            return True
+        return self.__dict__.get(field.attname) != original[field.attname]
+
+    def original_value(self, field_name):
+        field = self._meta.get_field(field_name)
+        return getattr(self, '_original_values', {}).get(field.attname)
+
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        super().refresh_from_db(using=using, fields=fields, **kwargs)
+        self._snapshot(fields=fields)
+
+    def save(self, *args, **kwargs):
+        narrowable = (
+            not self._state.adding
+            and not args
+            and kwargs.get('update_fields') is None
+            and not kwargs.get('force_insert')
+            and getattr(self, '_original_values', None) is not None
+        )
+        if narrowable:
+            dirty = self.get_dirty_fields()
+            if not dirty:
+                return
+            auto_now = [
+                field.name for field in self._meta.concrete_fields
+                if getattr(field, 'auto_now', False) and field.name not in dirty
+            ]
+            kwargs['update_fields'] = dirty + auto_now
+        super().save(*args, **kwargs)
+        if kwargs.get('update_fields') is not None:
+            self._snapshot(fields=kwargs['update_fields'])
+        else:
+            self._snapshot()
@@ -0,0 +1,56 @@
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+class PageSizePagination(PageNumberPagination):
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class CreatedAtCursorPagination(CursorPagination):
+    """
+    Keyset pagination on (created_at, pk): every page is an index range scan,
+    so fetching page 1000 costs the same as page 1 and no COUNT(*) is run.
+
+    Clients that still send ``?page=N`` (or ``?pagination=page``) get the old
+    page-number response, including ``count``.
+    """
+    ordering = ('-created_at', '-pk')
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    mode_query_param = 'pagination'
+    page_number_class = PageSizePagination
+
+    def __init__(self):
+        self.page_number = None
+
+    def use_page_numbers(self, request):
+        params = request.query_params
+        return (
+            params.get(self.mode_query_param) == 'page'
+            or self.page_number_class.page_query_param in params
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.use_page_numbers(request):
+            self.page_number = self.page_number_class()
+            self.page_number.page_size_query_param = self.page_size_query_param
+            return self.page_number.paginate_queryset(
+                queryset.order_by(*self.ordering), request, view
+            )
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.page_number is not None:
+            return self.page_number.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def get_html_context(self):
+        if self.page_number is not None:
+            return self.page_number.get_html_context()
+        return super().get_html_context()
+
+
+class SystemLogCursorPagination(CreatedAtCursorPagination):
+    # The admin console asks for ``?limit=100``
+    page_size_query_param = 'limit'
+    max_page_size = 500
@@ -100,6 +100,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'conf.wsgi.application'
+TEST_RUNNER = 'conf.test_runner.TestRunner'
 DATABASE_URL = os.getenv('DATABASE_URL')
 if not DATABASE_URL:
     raise ValueError(
@@ -140,7 +141,7 @@ AUTHENTICATION_BACKENDS = [
 ]
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "accounts.authentication.SessionTrackingJWTAuthentication",
     ],
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAuthenticated",
@@ -160,6 +161,89 @@ DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', EMAIL_HOST_USER)
 if DEBUG and not EMAIL_HOST_USER:
     EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 
+# Attachments are hashed as they upload and stored once per content (complaints.blobs)
+FILE_UPLOAD_HANDLERS = [
+    'conf.uploads.HashingUploadHandler',
+    'django.core.files.uploadhandler.MemoryFileUploadHandler',
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+# Unreferenced blobs are kept this long before `manage.py gc_attachment_blobs` removes them
+ATTACHMENT_BLOB_GC_GRACE_HOURS = int(os.environ.get('ATTACHMENT_BLOB_GC_GRACE_HOURS', 24))
+
+# Image attachments get a thumbnail and a web preview (longest side in px), generated in the
+# background by complaints.previews.PreviewWorker, never in the upload request
+ATTACHMENT_THUMBNAIL_SIZE = 320
+ATTACHMENT_PREVIEW_SIZE = 1280
+ATTACHMENT_PREVIEW_BATCH_SIZE = 20
+ATTACHMENT_PREVIEW_MAX_ATTEMPTS = 3
+ATTACHMENT_PREVIEW_LEASE_SECONDS = 300
+
+# Email outbox (drained by `manage.py process_email_outbox`)
+EMAIL_OUTBOX_BATCH_SIZE = int(os.environ.get('EMAIL_OUTBOX_BATCH_SIZE', 50))
+EMAIL_OUTBOX_MAX_ATTEMPTS = int(os.environ.get('EMAIL_OUTBOX_MAX_ATTEMPTS', 5))
+EMAIL_OUTBOX_RETRY_BASE_SECONDS = 60
+EMAIL_OUTBOX_RETRY_MAX_SECONDS = 3600
+EMAIL_OUTBOX_LEASE_SECONDS = 300
+
+# Largest number of responses accepted by POST feedback/responses/batch/
+FEEDBACK_BATCH_MAX_RESPONSES = int(os.environ.get('FEEDBACK_BATCH_MAX_RESPONSES', 500))
+
+# One cache shared by every process (web workers, scheduler, management commands). It holds
+# the version tokens of the reference lists, routing table and role registry, the unread
+# notification counters and the session touch throttle, so it must not be per-process.
+# Redis when REDIS_URL is set; otherwise a database table (created by `migrate`), where
+# every cache read is a query. The version tokens are therefore read back at most every
+# VERSION_CHECK_SECONDS per process (conf.versions), and cached reference bodies are
+# also kept per process, so the hot paths cost no cache read with either backend.
+REDIS_URL = os.environ.get('REDIS_URL')
+if REDIS_URL:
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': REDIS_URL}}
+else:
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'django_cache'}}
+
+# How stale another process's view of a version token may get (conf.versions)
+VERSION_CHECK_SECONDS = int(os.environ.get('VERSION_CHECK_SECONDS', 5))
+
+# Rendered bodies of the public reference lists are cached this long per version (complaints.reference_cache)
+REFERENCE_CACHE_TIMEOUT = int(os.environ.get('REFERENCE_CACHE_TIMEOUT', 3600))
+# Each process rebuilds its copy of the category catalogue (complaints.catalogue) at least this often
+CATEGORY_CATALOGUE_MAX_AGE = int(os.environ.get('CATEGORY_CATALOGUE_MAX_AGE', 300))
+
+# Per-user unread notification counters live in the cache for this long (complaints.inbox)
+NOTIFICATION_UNREAD_CACHE_SECONDS = 600
+
+# Server-sent notification stream (complaints.sse, served by conf/asgi.py).
+# On PostgreSQL every worker process LISTENs for the others' notifications;
+# LocalBackend only reaches streams in the publishing process.
+NOTIFICATION_STREAM_BACKEND = os.environ.get('NOTIFICATION_STREAM_BACKEND') or (
+    'complaints.broker.PostgresNotifyBackend'
+    if DATABASES['default']['ENGINE'] == 'django.db.backends.postgresql'
+    else 'complaints.broker.LocalBackend'
+)
+NOTIFICATION_STREAM_HEARTBEAT_SECONDS = 25
+NOTIFICATION_STREAM_MAX_PENDING = 100
+
+# A user's (user, IP) session row is refreshed at most this often
+USER_SESSION_TOUCH_SECONDS = int(os.environ.get('USER_SESSION_TOUCH_SECONDS', 60))
+
+# Request logs are queued in-process and written in batches (accounts.log_buffer)
+REQUEST_LOG_QUEUE_SIZE = int(os.environ.get('REQUEST_LOG_QUEUE_SIZE', 10000))
+REQUEST_LOG_BATCH_SIZE = int(os.environ.get('REQUEST_LOG_BATCH_SIZE', 200))
+REQUEST_LOG_FLUSH_INTERVAL = float(os.environ.get('REQUEST_LOG_FLUSH_INTERVAL', 2.0))
+# Write the queue from a background thread and once more at exit; conf.test_runner turns it off
+REQUEST_LOG_BACKGROUND_FLUSH = os.environ.get('REQUEST_LOG_BACKGROUND_FLUSH', 'True') == 'True'
+# 'rows': one SystemLog per request; 'aggregate': per-minute RequestMetric counters,
+# with rows kept only for errors, warnings and auth events
+REQUEST_LOG_MODE = os.environ.get('REQUEST_LOG_MODE', 'aggregate')
+
+# Log retention (`manage.py purge_logs`, also run daily by the scheduler)
+SYSTEM_LOG_RETENTION_DAYS = int(os.environ.get('SYSTEM_LOG_RETENTION_DAYS', 90))
+EMAIL_LOG_RETENTION_DAYS = int(os.environ.get('EMAIL_LOG_RETENTION_DAYS', 365))
+REQUEST_METRIC_RETENTION_DAYS = int(os.environ.get('REQUEST_METRIC_RETENTION_DAYS', 30))
+USER_SESSION_RETENTION_DAYS = int(os.environ.get('USER_SESSION_RETENTION_DAYS', 30))
+LOG_PURGE_CHUNK_SIZE = 5000
+LOG_PURGE_PAUSE_SECONDS = 0.05
+
 from datetime import timedelta
 JWT_SESSION_TIMEOUT_MINUTES = 60  
 SIMPLE_JWT = {
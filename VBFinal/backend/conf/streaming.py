@@ -0,0 +1,53 @@
+"""
+Helpers for exports streamed row by row, so a large dump never sits in memory
+"""
+import csv
+import json
+
+from django.http import StreamingHttpResponse
+
+# Spreadsheet apps treat cells starting with these as formulas
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+class Echo:
+    """File-like object whose write() hands the line back to the csv writer's caller"""
+
+    def write(self, value):
+        return value
+
+
+def csv_cell(value):
+    if value is None:
+        return ''
+    if isinstance(value, (list, tuple)):
+        value = '; '.join(str(item) for item in value)
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def csv_lines(header, rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(header)
+    for row in rows:
+        yield writer.writerow([csv_cell(value) for value in row])
+
+
+def csv_response(header, rows, filename):
+    response = StreamingHttpResponse(csv_lines(header, rows), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response['Cache-Control'] = 'no-store'
+    return response
+
+
+def jsonl_lines(header, rows):
+    for row in rows:
+        yield json.dumps(dict(zip(header, row)), default=str) + '\n'
+
+
+def jsonl_response(header, rows, filename):
+    response = StreamingHttpResponse(jsonl_lines(header, rows), content_type='application/x-ndjson')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response['Cache-Control'] = 'no-store'
+    return response
@@ -52,7 +52,9 @@ class SystemMonitor:
         """Get Django-specific statistics"""
         try:
             from complaints.models import Complaint
+            from complaints.routing import routing_table
             from accounts.models import User
+            from accounts.log_buffer import log_buffer
             
             # Get model counts
             total_complaints = Complaint.objects.count()
@@ -71,6 +73,8 @@ class SystemMonitor:
                 'total_users': total_users,
                 'active_users': active_users,
                 'recent_complaints': recent_complaints,
+                'routing_table': routing_table.stats(),
+                'request_log': log_buffer.stats(),
                 'cache_stats': {
                     'backend': settings.CACHES['default']['BACKEND'].split('.')[-1],
                     'location': settings.CACHES['default'].get('LOCATION', 'default')
@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+
+
+class TestRunner(DiscoverRunner):
+    """
+    Runs the suite without the request log's background writer: its thread
+    and exit hook outlive the test database, so tests flush explicitly.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._background_flush = getattr(settings, 'REQUEST_LOG_BACKGROUND_FLUSH', True)
+        settings.REQUEST_LOG_BACKGROUND_FLUSH = False
+
+    def teardown_test_environment(self, **kwargs):
+        settings.REQUEST_LOG_BACKGROUND_FLUSH = self._background_flush
+        super().teardown_test_environment(**kwargs)
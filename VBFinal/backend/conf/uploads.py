@@ -0,0 +1,34 @@
+"""
+Upload handler that hashes each file while its chunks arrive, so nothing has
+to read an upload a second time just to learn its digest.
+"""
+import hashlib
+
+from django.core.files.uploadhandler import FileUploadHandler
+
+
+class HashingUploadHandler(FileUploadHandler):
+    """
+    Must come first in FILE_UPLOAD_HANDLERS: it passes every chunk on to the
+    handler that stores the file, and leaves the SHA-256 hex digests in
+    ``request.upload_digests`` keyed by form field name.
+    """
+
+    def new_file(self, field_name, *args, **kwargs):
+        super().new_file(field_name, *args, **kwargs)
+        self.digest = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.digest.update(raw_data)
+        return raw_data
+
+    def file_complete(self, file_size):
+        if not hasattr(self.request, 'upload_digests'):
+            self.request.upload_digests = {}
+        self.request.upload_digests[self.field_name] = self.digest.hexdigest()
+        return None
+
+
+def upload_digest(request, field_name):
+    """Digest recorded by HashingUploadHandler, or None (e.g. when it is not installed)"""
+    return getattr(request, 'upload_digests', {}).get(field_name)
@@ -0,0 +1,64 @@
+"""
+Version tokens of the process-local snapshots: reference list bodies, the
+routing table, the role registry.
+
+A token lives in the shared cache, so a write in one process reaches every
+other one, but each process reads it back at most once every
+VERSION_CHECK_SECONDS. In between, checking a version is an attribute read,
+which keeps the hot paths off the cache (and so off the database with the
+DatabaseCache fallback). A bump is seen at once by the process that made it
+and by the others within VERSION_CHECK_SECONDS.
+"""
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+def check_interval():
+    return getattr(settings, 'VERSION_CHECK_SECONDS', 5)
+
+
+class VersionToken:
+    def __init__(self, key):
+        self.key = key
+        self._state = (None, 0.0)  # (token, monotonic time it is trusted until)
+
+    def get(self):
+        token, trusted_until = self._state
+        now = time.monotonic()
+        if token is not None and now < trusted_until:
+            return token
+        token = cache.get(self.key)
+        if token is None:
+            cache.add(self.key, uuid.uuid4().hex, timeout=None)
+            token = cache.get(self.key)
+        self._state = (token, now + check_interval())
+        return token
+
+    def bump(self):
+        """Publish a new token; returns it"""
+        token = uuid.uuid4().hex
+        cache.set(self.key, token, timeout=None)
+        self._state = (token, time.monotonic() + check_interval())
+        return token
+
+    def expire(self):
+        """Forget the local copy, so the next ``get`` reads the shared cache"""
+        self._state = (None, 0.0)
+
+
+_tokens = {}
+
+
+def token(key):
+    """The process-wide VersionToken for ``key``"""
+    if key not in _tokens:
+        _tokens.setdefault(key, VersionToken(key))
+    return _tokens[key]
+
+
+def expire_all():
+    for version in list(_tokens.values()):
+        version.expire()
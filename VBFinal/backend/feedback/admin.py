@@ -1,7 +1,10 @@
 from django.contrib import admin
 
 from django.contrib import admin
-from .models import FeedbackTemplate, TemplateField, FeedbackResponse, FeedbackAnswer
+from .models import (
+    FeedbackTemplate, TemplateField, FeedbackResponse, FeedbackAnswer,
+    FieldRollup, FieldOptionCount, DailyResponseCount,
+)
 
 
 class TemplateFieldInline(admin.TabularInline):
@@ -46,3 +49,24 @@ class FeedbackAnswerAdmin(admin.ModelAdmin):
     list_display = ['response', 'field', 'value']
     list_filter = ['field__field_type']
     readonly_fields = ['response', 'field']
+
+
+@admin.register(FieldRollup)
+class FieldRollupAdmin(admin.ModelAdmin):
+    list_display = ['field', 'count', 'value_count', 'value_min', 'value_max', 'updated_at']
+    search_fields = ['field__label', 'field__template__title']
+    readonly_fields = ['field', 'updated_at']
+
+
+@admin.register(FieldOptionCount)
+class FieldOptionCountAdmin(admin.ModelAdmin):
+    list_display = ['field', 'option', 'count']
+    search_fields = ['field__label', 'option']
+    readonly_fields = ['field']
+
+
+@admin.register(DailyResponseCount)
+class DailyResponseCountAdmin(admin.ModelAdmin):
+    list_display = ['template', 'day', 'count']
+    list_filter = ['day']
+    readonly_fields = ['template']
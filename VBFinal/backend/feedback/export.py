@@ -0,0 +1,53 @@
+"""
+CSV export of a template's responses: one row per response, one column per field
+"""
+from .models import TemplateField, FeedbackResponse, FeedbackAnswer
+
+VALUE_COLUMNS = {
+    TemplateField.FIELD_TEXT: 'text_value',
+    TemplateField.FIELD_NUMBER: 'number_value',
+    TemplateField.FIELD_RATING: 'rating_value',
+    TemplateField.FIELD_CHOICE: 'choice_value',
+    TemplateField.FIELD_CHECKBOX: 'checkbox_values',
+}
+
+
+def csv_header(fields):
+    return ['response_id', 'submitted_at'] + [field.label for field in fields]
+
+
+def csv_rows(template, fields, chunk_size=1000):
+    """
+    Yield pivoted rows. Responses are read through a server-side cursor, and
+    each chunk of ``chunk_size`` costs one more query for its answers.
+    """
+    responses = (
+        FeedbackResponse.objects.filter(template=template)
+        .order_by('submitted_at', 'pk')
+        .values_list('pk', 'submitted_at')
+    )
+    chunk = []
+    for response in responses.iterator(chunk_size=chunk_size):
+        chunk.append(response)
+        if len(chunk) == chunk_size:
+            yield from _pivot(chunk, fields)
+            chunk = []
+    yield from _pivot(chunk, fields)
+
+
+def _pivot(responses, fields):
+    if not responses:
+        return
+    positions = {field.pk: index for index, field in enumerate(fields)}
+    columns = {field.pk: VALUE_COLUMNS.get(field.field_type) for field in fields}
+    values = {pk: [None] * len(fields) for pk, _ in responses}
+    answers = FeedbackAnswer.objects.filter(response_id__in=values.keys()).values_list(
+        'response_id', 'field_id', *VALUE_COLUMNS.values()
+    )
+    offsets = {column: index for index, column in enumerate(VALUE_COLUMNS.values(), start=2)}
+    for answer in answers:
+        column = columns.get(answer[1])
+        if column:
+            values[answer[0]][positions[answer[1]]] = answer[offsets[column]]
+    for pk, submitted_at in responses:
+        yield [pk, submitted_at.isoformat()] + values[pk]
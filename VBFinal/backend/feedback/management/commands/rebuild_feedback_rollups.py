@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from feedback import rollups
+from feedback.models import FeedbackTemplate
+
+
+class Command(BaseCommand):
+    help = "Recompute the feedback analytics rollups from the stored responses"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--template', action='append', dest='templates', metavar='ID',
+                            help="Only rebuild this template (repeatable)")
+
+    def handle(self, *args, **options):
+        templates = None
+        if options['templates']:
+            templates = list(FeedbackTemplate.objects.filter(pk__in=options['templates']))
+            if len(templates) != len(set(options['templates'])):
+                raise CommandError("Unknown feedback template id")
+
+        counted = rollups.rebuild(templates)
+        scope = f"{len(templates)} templates" if templates is not None else "all templates"
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt feedback rollups for {scope} ({counted} responses)"))
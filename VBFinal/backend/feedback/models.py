@@ -172,3 +172,73 @@ class FeedbackAnswer(models.Model):
         elif self.field.field_type == TemplateField.FIELD_CHECKBOX:
             return self.checkbox_values
         return None
+
+
+class FieldRollup(models.Model):
+    """Running totals of a field's answers, maintained by feedback.rollups"""
+    field = models.OneToOneField(
+        TemplateField,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='rollup'
+    )
+    count = models.PositiveIntegerField(default=0)
+    # Rating and number fields only
+    value_count = models.PositiveIntegerField(default=0)
+    value_sum = models.FloatField(default=0)
+    value_sum_squares = models.FloatField(default=0)
+    value_min = models.FloatField(null=True, blank=True)
+    value_max = models.FloatField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.field.label}: {self.count} answers"
+
+    @property
+    def average(self):
+        return self.value_sum / self.value_count if self.value_count else None
+
+    @property
+    def stddev(self):
+        if not self.value_count:
+            return None
+        mean = self.average
+        return max(self.value_sum_squares / self.value_count - mean * mean, 0) ** 0.5
+
+
+class FieldOptionCount(models.Model):
+    """How often a choice was picked, or a checkbox option ticked"""
+    field = models.ForeignKey(
+        TemplateField,
+        on_delete=models.CASCADE,
+        related_name='option_counts'
+    )
+    option = models.CharField(max_length=200)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['field', 'option'], name='unique_field_option_count'),
+        ]
+
+    def __str__(self):
+        return f"{self.field.label} / {self.option}: {self.count}"
+
+
+class DailyResponseCount(models.Model):
+    template = models.ForeignKey(
+        FeedbackTemplate,
+        on_delete=models.CASCADE,
+        related_name='daily_response_counts'
+    )
+    day = models.DateField()
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['day']
+        constraints = [
+            models.UniqueConstraint(fields=['template', 'day'], name='unique_template_daily_count'),
+        ]
+
+    def __str__(self):
+        return f"{self.template.title} {self.day}: {self.count}"
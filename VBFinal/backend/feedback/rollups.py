@@ -0,0 +1,265 @@
+"""
+Pre-aggregated feedback analytics.
+
+Each submitted response adds to per-field totals (answer count, sum, sum of
+squares, min/max), per-option counts for choice and checkbox fields, and a
+per-day response count, so the analytics endpoint reads a handful of small
+rows instead of scanning every answer. Deleting responses does not subtract
+from the rollups; run ``rebuild_feedback_rollups`` afterwards.
+"""
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.db.models import Count, F, FloatField, Max, Min, Sum, Value
+from django.db.models.functions import Coalesce, Greatest, Least, TruncDate
+from django.utils import timezone
+
+from .models import (
+    TemplateField, FeedbackResponse, FeedbackAnswer,
+    FieldRollup, FieldOptionCount, DailyResponseCount,
+)
+
+NUMERIC_COLUMNS = {
+    TemplateField.FIELD_RATING: 'rating_value',
+    TemplateField.FIELD_NUMBER: 'number_value',
+}
+
+
+def numeric_value(answer, field_type):
+    column = NUMERIC_COLUMNS.get(field_type)
+    value = getattr(answer, column) if column else None
+    return float(value) if value is not None else None
+
+
+def selected_options(answer, field_type):
+    if field_type == TemplateField.FIELD_CHOICE:
+        values = [answer.choice_value]
+    elif field_type == TemplateField.FIELD_CHECKBOX:
+        values = answer.checkbox_values if isinstance(answer.checkbox_values, list) else []
+    else:
+        return []
+    return [str(value)[:200] for value in values if value not in (None, '')]
+
+
+def _bump(model, lookup, updates):
+    """Apply F() increments to one rollup row, creating it first if missing"""
+    if not model.objects.filter(**lookup).update(**updates):
+        model.objects.bulk_create([model(**lookup)], ignore_conflicts=True)
+        model.objects.filter(**lookup).update(**updates)
+
+
+def _add(model, keys, rows, lowest=(), highest=(), replace=()):
+    """
+    Add the counters of ``rows`` (dicts of column attnames) onto the stored rows
+    with the same ``keys``, inserting missing ones. PostgreSQL and SQLite do it
+    in one INSERT ... ON CONFLICT statement per chunk; other backends row by row.
+    """
+    if not rows:
+        return
+    if connection.vendor not in ('postgresql', 'sqlite'):
+        for row in rows:
+            updates = {}
+            for column, value in row.items():
+                if column in keys:
+                    continue
+                if column in replace:
+                    updates[column] = value
+                elif column in lowest or column in highest:
+                    if value is not None:
+                        current = Value(value, output_field=FloatField())
+                        pick = Least if column in lowest else Greatest
+                        updates[column] = pick(Coalesce(column, current), current)
+                else:
+                    updates[column] = F(column) + value
+            _bump(model, {key: row[key] for key in keys}, updates)
+        return
+
+    # A fixed row order keeps concurrent batches from deadlocking on each other
+    rows = sorted(rows, key=lambda row: [str(row[key]) for key in keys])
+    qn = connection.ops.quote_name
+    table = qn(model._meta.db_table)
+    columns = list(rows[0])
+    fields = [model._meta.get_field(column) for column in columns]
+    least, greatest = ('LEAST', 'GREATEST') if connection.vendor == 'postgresql' else ('MIN', 'MAX')
+
+    assignments = []
+    for column in columns:
+        if column in keys:
+            continue
+        current, new = f"{table}.{qn(column)}", f"excluded.{qn(column)}"
+        if column in replace:
+            assignments.append(f"{qn(column)} = {new}")
+        elif column in lowest or column in highest:
+            # SQLite's MIN/MAX return NULL when either side is NULL; PostgreSQL's LEAST/GREATEST skip it
+            pick = least if column in lowest else greatest
+            assignments.append(f"{qn(column)} = COALESCE({pick}({current}, {new}), {current}, {new})")
+        else:
+            assignments.append(f"{qn(column)} = {current} + {new}")
+
+    placeholder = "(" + ", ".join(["%s"] * len(columns)) + ")"
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), 500):
+            chunk = rows[start:start + 500]
+            params = [
+                field.get_db_prep_value(row[column], connection)
+                for row in chunk for column, field in zip(columns, fields)
+            ]
+            cursor.execute(
+                f"INSERT INTO {table} ({', '.join(qn(field.column) for field in fields)}) "
+                f"VALUES {', '.join([placeholder] * len(chunk))} "
+                f"ON CONFLICT ({', '.join(qn(model._meta.get_field(key).column) for key in keys)}) "
+                f"DO UPDATE SET {', '.join(assignments)}",
+                params,
+            )
+
+
+def record(submissions):
+    """
+    Add submitted responses to the rollups. ``submissions`` is a list of
+    (response, answers) pairs; each answer needs its ``field`` loaded. The
+    whole batch costs one statement per rollup table.
+    """
+    days = Counter()
+    fields = {}
+    options = Counter()
+    for response, answers in submissions:
+        days[response.template_id, timezone.localdate(response.submitted_at)] += 1
+        for answer in answers:
+            field_type = answer.field.field_type
+            totals = fields.setdefault(answer.field_id, {
+                'field_id': answer.field_id, 'count': 0, 'value_count': 0, 'value_sum': 0.0,
+                'value_sum_squares': 0.0, 'value_min': None, 'value_max': None, 'updated_at': None,
+            })
+            totals['count'] += 1
+            value = numeric_value(answer, field_type)
+            if value is not None:
+                totals['value_count'] += 1
+                totals['value_sum'] += value
+                totals['value_sum_squares'] += value * value
+                totals['value_min'] = value if totals['value_min'] is None else min(totals['value_min'], value)
+                totals['value_max'] = value if totals['value_max'] is None else max(totals['value_max'], value)
+            for option in selected_options(answer, field_type):
+                options[answer.field_id, option] += 1
+
+    now = timezone.now()
+    for totals in fields.values():
+        totals['updated_at'] = now
+    with transaction.atomic():
+        _add(DailyResponseCount, ['template_id', 'day'], [
+            {'template_id': template_id, 'day': day, 'count': count}
+            for (template_id, day), count in days.items()
+        ])
+        _add(FieldRollup, ['field_id'], list(fields.values()),
+             lowest=['value_min'], highest=['value_max'], replace=['updated_at'])
+        _add(FieldOptionCount, ['field_id', 'option'], [
+            {'field_id': field_id, 'option': option, 'count': count}
+            for (field_id, option), count in options.items()
+        ])
+
+
+def analytics(template, days=30):
+    """Analytics payload of a template, read from the rollups alone"""
+    fields = list(template.fields.all())
+    rollups = {rollup.field_id: rollup for rollup in FieldRollup.objects.filter(field__template=template)}
+    options = defaultdict(list)
+    for field_id, option, count in (
+        FieldOptionCount.objects.filter(field__template=template)
+        .order_by('-count', 'option').values_list('field_id', 'option', 'count')
+    ):
+        options[field_id].append({'choice_value': option, 'count': count})
+
+    field_analytics = {}
+    for field in fields:
+        rollup = rollups.get(field.pk) or FieldRollup(field=field)
+        data = {'type': field.field_type, 'count': rollup.count}
+        if field.field_type in NUMERIC_COLUMNS:
+            average, stddev = rollup.average, rollup.stddev
+            data.update(
+                average=round(average, 2) if average else 0,
+                stddev=round(stddev, 2) if stddev is not None else None,
+                min=rollup.value_min,
+                max=rollup.value_max,
+            )
+        elif field.field_type in (TemplateField.FIELD_CHOICE, TemplateField.FIELD_CHECKBOX):
+            data['choices'] = options.get(field.pk, [])
+        field_analytics[field.label] = data
+
+    daily = DailyResponseCount.objects.filter(template=template)
+    since = timezone.localdate() - timedelta(days=days)
+    return {
+        'total_responses': daily.aggregate(total=Sum('count'))['total'] or 0,
+        'field_analytics': field_analytics,
+        'response_trend': list(daily.filter(day__gte=since).values('day', 'count')),
+    }
+
+
+def rebuild(templates=None):
+    """
+    Recompute the rollups from the stored responses, for ``templates`` or
+    for every template. Returns the number of responses counted.
+    """
+    responses = FeedbackResponse.objects.all()
+    answers = FeedbackAnswer.objects.all()
+    stale = [FieldRollup.objects.all(), FieldOptionCount.objects.all(), DailyResponseCount.objects.all()]
+    if templates is not None:
+        responses = responses.filter(template__in=templates)
+        answers = answers.filter(field__template__in=templates)
+        stale = [
+            stale[0].filter(field__template__in=templates),
+            stale[1].filter(field__template__in=templates),
+            stale[2].filter(template__in=templates),
+        ]
+
+    rollups = {
+        field_id: FieldRollup(field_id=field_id, count=count)
+        for field_id, count in answers.values('field').annotate(n=Count('pk')).values_list('field', 'n')
+    }
+    for field_type, column in NUMERIC_COLUMNS.items():
+        totals = (
+            answers.filter(field__field_type=field_type, **{f'{column}__isnull': False})
+            .values('field')
+            .annotate(
+                n=Count(column),
+                total=Sum(column, output_field=FloatField()),
+                squares=Sum(F(column) * F(column), output_field=FloatField()),
+                low=Min(column), high=Max(column),
+            )
+        )
+        for row in totals:
+            rollup = rollups[row['field']]
+            rollup.value_count, rollup.value_sum, rollup.value_sum_squares = row['n'], row['total'], row['squares']
+            rollup.value_min, rollup.value_max = float(row['low']), float(row['high'])
+
+    option_counts = Counter()
+    for field_id, option, count in (
+        answers.filter(field__field_type=TemplateField.FIELD_CHOICE)
+        .values('field', 'choice_value').annotate(n=Count('pk')).values_list('field', 'choice_value', 'n')
+    ):
+        for option in selected_options(FeedbackAnswer(choice_value=option), TemplateField.FIELD_CHOICE):
+            option_counts[field_id, option] += count
+    checkbox_values = (
+        answers.filter(field__field_type=TemplateField.FIELD_CHECKBOX)
+        .values_list('field', 'checkbox_values')
+    )
+    for field_id, values in checkbox_values.iterator(chunk_size=2000):
+        for option in selected_options(FeedbackAnswer(checkbox_values=values), TemplateField.FIELD_CHECKBOX):
+            option_counts[field_id, option] += 1
+
+    daily = (
+        responses.annotate(day=TruncDate('submitted_at'))
+        .values('template', 'day').annotate(n=Count('pk')).values_list('template', 'day', 'n')
+    )
+    daily_counts = [DailyResponseCount(template_id=t, day=day, count=n) for t, day, n in daily]
+
+    with transaction.atomic():
+        for queryset in stale:
+            queryset.delete()
+        FieldRollup.objects.bulk_create(rollups.values(), batch_size=1000)
+        FieldOptionCount.objects.bulk_create(
+            [FieldOptionCount(field_id=f, option=o, count=n) for (f, o), n in option_counts.items()],
+            batch_size=1000,
+        )
+        DailyResponseCount.objects.bulk_create(daily_counts, batch_size=1000)
+
+    return sum(row.count for row in daily_counts)
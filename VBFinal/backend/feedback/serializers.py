@@ -1,4 +1,7 @@
+from django.db import transaction
 from rest_framework import serializers
+from accounts.utils import get_client_ip
+from . import rollups
 from .models import FeedbackTemplate, TemplateField, FeedbackResponse, FeedbackAnswer
 import uuid
 import hashlib
@@ -55,8 +58,9 @@ class FeedbackTemplateCreateSerializer(serializers.ModelSerializer):
             status=status
         )
         
-        for field_data in fields_data:
-            TemplateField.objects.create(template=template, **field_data)
+        TemplateField.objects.bulk_create(
+            [TemplateField(template=template, **field_data) for field_data in fields_data]
+        )
         
         return template
 
@@ -70,48 +74,87 @@ class FeedbackAnswerSerializer(serializers.ModelSerializer):
                  'choice_value', 'checkbox_values']
 
 
+def save_responses(items, request):
+    """
+    Insert validated responses and all their answers with two bulk INSERTs,
+    then add them to the analytics rollups, all in one transaction.
+    """
+    user_agent = request.META.get('HTTP_USER_AGENT', '')
+    ip_address = get_client_ip(request)
+
+    submissions = []
+    for item in items:
+        session_token = hashlib.sha256(f"{user_agent}{ip_address}{uuid.uuid4()}".encode()).hexdigest()
+        response = FeedbackResponse(
+            template=item['template'],
+            session_token=session_token,
+            ip_address=ip_address,
+            user=request.user,
+        )
+        answers = [
+            FeedbackAnswer(response=response, **{k: v for k, v in answer.items() if k != 'field_id'})
+            for answer in item['answers']
+        ]
+        submissions.append((response, answers))
+
+    with transaction.atomic():
+        FeedbackResponse.objects.bulk_create([response for response, _ in submissions])
+        FeedbackAnswer.objects.bulk_create(
+            [answer for _, answers in submissions for answer in answers], batch_size=1000
+        )
+        rollups.record(submissions)
+    return [response for response, _ in submissions]
+
+
+class FeedbackResponseListSerializer(serializers.ListSerializer):
+    def create(self, validated_data):
+        return save_responses(validated_data, self.context['request'])
+
+
+class TemplateRelatedField(serializers.PrimaryKeyRelatedField):
+    """Looks each template up once per request, so a batch of responses to one form costs one query"""
+
+    def to_internal_value(self, data):
+        cache = self.context.setdefault('templates', {})
+        key = str(data)
+        if key not in cache:
+            cache[key] = super().to_internal_value(data)
+        return cache[key]
+
+
 class FeedbackResponseSerializer(serializers.ModelSerializer):
+    template = TemplateRelatedField(queryset=FeedbackTemplate.objects.all())
     answers = FeedbackAnswerSerializer(many=True)
     
     class Meta:
         model = FeedbackResponse
         fields = ['template', 'answers']
+        list_serializer_class = FeedbackResponseListSerializer
     
-    def create(self, validated_data):
-        answers_data = validated_data.pop('answers')
-        request = self.context['request']
-        
-        # Generate session token
-        user_agent = request.META.get('HTTP_USER_AGENT', '')
-        ip_address = self.get_client_ip(request)
-        timestamp = str(uuid.uuid4())
-        session_token = hashlib.sha256(f"{user_agent}{ip_address}{timestamp}".encode()).hexdigest()
-        
-        response = FeedbackResponse.objects.create(
-            **validated_data,
-            session_token=session_token,
-            ip_address=ip_address,
-            user=request.user
-        )
-        
-        for answer_data in answers_data:
-            field_id = answer_data.pop('field_id')
-            field = TemplateField.objects.get(id=field_id, template=response.template)
-            FeedbackAnswer.objects.create(
-                response=response,
-                field=field,
-                **answer_data
-            )
-        
-        return response
+    def template_fields(self, template):
+        """The template's fields by id, loaded once per template even across a batch"""
+        cache = self.context.setdefault('template_fields', {})
+        if template.pk not in cache:
+            cache[template.pk] = {field.pk: field for field in template.fields.all()}
+        return cache[template.pk]
     
-    def get_client_ip(self, request):
-        x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-        if x_forwarded_for:
-            ip = x_forwarded_for.split(',')[0]
-        else:
-            ip = request.META.get('REMOTE_ADDR')
-        return ip
+    def validate(self, attrs):
+        fields = self.template_fields(attrs['template'])
+        seen = set()
+        for answer in attrs['answers']:
+            field = fields.get(answer['field_id'])
+            if field is None:
+                raise serializers.ValidationError(
+                    {'answers': f"Field {answer['field_id']} does not belong to this template"}
+                )
+            if field.pk in seen:
+                raise serializers.ValidationError({'answers': f"Field {field.pk} is answered more than once"})
+            seen.add(field.pk)
+            answer['field'] = field
+        return attrs
+    
+    def create(self, validated_data):
+        return save_responses([validated_data], self.context['request'])[0]
 
 
 class FeedbackAnalyticsSerializer(serializers.Serializer):
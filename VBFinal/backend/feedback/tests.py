@@ -1,3 +1,196 @@
-from django.test import TestCase
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
 
-# Create your tests here.
+from accounts.models import User
+from . import rollups
+from .models import FeedbackTemplate, TemplateField, FieldRollup, FieldOptionCount
+
+
+class FeedbackAPITestCase(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create(email="admin@uog.edu.et", first_name="A", last_name="Admin", role=User.ROLE_ADMIN)
+        cls.template = FeedbackTemplate.objects.create(
+            title="Library survey", created_by=cls.admin, office="General",
+            status=FeedbackTemplate.STATUS_ACTIVE
+        )
+        cls.rating = TemplateField.objects.create(
+            template=cls.template, label="Rating", field_type=TemplateField.FIELD_RATING, order=0
+        )
+        cls.choice = TemplateField.objects.create(
+            template=cls.template, label="Visit", field_type=TemplateField.FIELD_CHOICE,
+            options=["Daily", "Weekly"], order=1
+        )
+        cls.checkbox = TemplateField.objects.create(
+            template=cls.template, label="Services", field_type=TemplateField.FIELD_CHECKBOX,
+            options=["Wifi", "Printing", "Study rooms"], order=2
+        )
+        cls.comment = TemplateField.objects.create(
+            template=cls.template, label="Comment", field_type=TemplateField.FIELD_TEXT, order=3
+        )
+
+    def submit(self, rating, choice, services, comment=""):
+        user = User.objects.create(email=f"user{User.objects.count()}@uog.edu.et", first_name="U", last_name="User")
+        self.client.force_authenticate(user)
+        response = self.client.post("/api/feedback/responses/", {
+            "template": str(self.template.pk),
+            "answers": [
+                {"field_id": str(self.rating.pk), "rating_value": rating},
+                {"field_id": str(self.choice.pk), "choice_value": choice},
+                {"field_id": str(self.checkbox.pk), "checkbox_values": services},
+                {"field_id": str(self.comment.pk), "text_value": comment},
+            ],
+        }, format="json")
+        self.assertEqual(response.status_code, 201, response.content)
+
+    def submit_sample(self):
+        self.submit(5, "Daily", ["Wifi", "Printing"], "Great")
+        self.submit(3, "Weekly", ["Wifi"])
+        self.submit(4, "Daily", [])
+
+    def analytics(self):
+        self.client.force_authenticate(self.admin)
+        response = self.client.get(f"/api/feedback/templates/{self.template.pk}/analytics/")
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+
+class FeedbackRollupTests(FeedbackAPITestCase):
+    def setUp(self):
+        self.submit_sample()
+
+    def test_submissions_update_rollups(self):
+        data = self.analytics()
+        self.assertEqual(data["total_responses"], 3)
+        rating = data["field_analytics"]["Rating"]
+        self.assertEqual((rating["count"], rating["average"], rating["min"], rating["max"]), (3, 4.0, 3.0, 5.0))
+        self.assertEqual(rating["stddev"], 0.82)
+        self.assertEqual(
+            data["field_analytics"]["Visit"]["choices"],
+            [{"choice_value": "Daily", "count": 2}, {"choice_value": "Weekly", "count": 1}],
+        )
+        self.assertEqual(
+            data["field_analytics"]["Services"]["choices"],
+            [{"choice_value": "Wifi", "count": 2}, {"choice_value": "Printing", "count": 1}],
+        )
+        self.assertEqual(data["field_analytics"]["Comment"]["count"], 3)
+        self.assertEqual([day["count"] for day in data["response_trend"]], [3])
+
+    def test_rebuild_matches_incremental_rollups(self):
+        before = self.analytics()
+        FieldRollup.objects.all().delete()
+        FieldOptionCount.objects.all().delete()
+        self.assertEqual(rollups.rebuild([self.template]), 3)
+        self.assertEqual(self.analytics(), before)
+
+    def test_analytics_query_count_is_independent_of_fields(self):
+        self.client.force_authenticate(self.admin)
+        url = f"/api/feedback/templates/{self.template.pk}/analytics/"
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as baseline:
+            self.client.get(url)
+        for index in range(10):
+            TemplateField.objects.create(
+                template=self.template, label=f"Extra {index}", field_type=TemplateField.FIELD_NUMBER, order=10 + index
+            )
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        self.assertEqual(len(queries), len(baseline))
+
+
+class FeedbackSubmissionTests(FeedbackAPITestCase):
+    def answers(self, rating=4):
+        return [
+            {"field_id": str(self.rating.pk), "rating_value": rating},
+            {"field_id": str(self.choice.pk), "choice_value": "Daily"},
+            {"field_id": str(self.checkbox.pk), "checkbox_values": ["Wifi"]},
+        ]
+
+    def test_submission_cost_does_not_grow_with_answers(self):
+        extra = TemplateField.objects.bulk_create([
+            TemplateField(template=self.template, label=f"Q{index}", field_type=TemplateField.FIELD_NUMBER, order=10 + index)
+            for index in range(40)
+        ])
+        user = User.objects.create(email="student@uog.edu.et", first_name="S", last_name="Student")
+        self.client.force_authenticate(user)
+        answers = self.answers() + [{"field_id": str(field.pk), "number_value": 1} for field in extra]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post("/api/feedback/responses/", {
+                "template": str(self.template.pk), "answers": answers,
+            }, format="json")
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertLessEqual(len(queries), 15)
+        self.assertEqual(FieldRollup.objects.get(field=extra[0]).value_sum, 1)
+
+    def test_answer_for_another_template_is_rejected(self):
+        other = FeedbackTemplate.objects.create(title="Other", created_by=self.admin, office="General")
+        stray = TemplateField.objects.create(template=other, label="Stray", field_type=TemplateField.FIELD_TEXT)
+        self.client.force_authenticate(self.admin)
+        response = self.client.post("/api/feedback/responses/", {
+            "template": str(self.template.pk),
+            "answers": [{"field_id": str(stray.pk), "text_value": "x"}],
+        }, format="json")
+        self.assertEqual(response.status_code, 400)
+
+    def test_batch_submission(self):
+        other = FeedbackTemplate.objects.create(
+            title="Cafeteria survey", created_by=self.admin, office="General", status=FeedbackTemplate.STATUS_ACTIVE
+        )
+        taste = TemplateField.objects.create(template=other, label="Taste", field_type=TemplateField.FIELD_RATING)
+        user = User.objects.create(email="student@uog.edu.et", first_name="S", last_name="Student")
+        self.client.force_authenticate(user)
+        batch = [
+            {"template": str(self.template.pk), "answers": self.answers(1)},
+            {"template": str(other.pk), "answers": [{"field_id": str(taste.pk), "rating_value": 5}]},
+        ]
+        response = self.client.post("/api/feedback/responses/batch/", batch, format="json")
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(response.json()["created"], 2)
+        rating = self.analytics()["field_analytics"]["Rating"]
+        self.assertEqual((rating["count"], rating["average"]), (1, 1.0))
+        self.assertEqual(self.analytics()["field_analytics"]["Visit"]["choices"], [{"choice_value": "Daily", "count": 1}])
+
+    def test_batch_daily_limit_applies_to_staff(self):
+        self.client.force_authenticate(self.admin)
+        batch = [{"template": str(self.template.pk), "answers": self.answers(rating)} for rating in (1, 2)]
+        response = self.client.post("/api/feedback/responses/batch/", batch, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("template", response.json()[1])
+        self.assertEqual(self.analytics()["total_responses"], 0)
+
+    def test_batch_is_all_or_nothing(self):
+        user = User.objects.create(email="student@uog.edu.et", first_name="S", last_name="Student")
+        self.client.force_authenticate(user)
+        batch = [{"template": str(self.template.pk), "answers": self.answers()} for _ in range(2)]
+        response = self.client.post("/api/feedback/responses/batch/", {"responses": batch}, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()[0], {})
+        self.assertIn("template", response.json()[1])
+        self.assertEqual(self.analytics()["total_responses"], 0)
+
+
+class FeedbackExportTests(FeedbackAPITestCase):
+    def test_export_streams_one_row_per_response(self):
+        self.submit_sample()
+        self.client.force_authenticate(self.admin)
+        response = self.client.get(f"/api/feedback/templates/{self.template.pk}/export/")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0].split(",")[2:], ["Rating", "Visit", "Services", "Comment"])
+        self.assertEqual(len(lines), 4)
+        self.assertTrue(lines[1].endswith(",5,Daily,Wifi; Printing,Great"))
+        self.assertTrue(lines[3].endswith(",4,Daily,,"))
+
+    def test_export_neutralises_formulas(self):
+        self.submit(5, "Daily", [], "=HYPERLINK(\"http://x\")")
+        self.client.force_authenticate(self.admin)
+        response = self.client.get(f"/api/feedback/templates/{self.template.pk}/export/")
+        self.assertIn("'=HYPERLINK", b"".join(response.streaming_content).decode())
+
+    def test_export_requires_results_access(self):
+        user = User.objects.create(email="student@uog.edu.et", first_name="S", last_name="Student")
+        self.client.force_authenticate(user)
+        response = self.client.get(f"/api/feedback/templates/{self.template.pk}/export/")
+        self.assertEqual(response.status_code, 403)
@@ -3,10 +3,12 @@ from django.shortcuts import render
 from rest_framework import viewsets, status, permissions
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from django.db.models import Count, Avg, Q
+from django.conf import settings
 from django.utils import timezone
 from datetime import timedelta
-from collections import defaultdict
+from conf.streaming import csv_response
+from . import rollups
+from .export import csv_header, csv_rows
 from .models import FeedbackTemplate, TemplateField, FeedbackResponse, FeedbackAnswer
 from .serializers import (
     FeedbackTemplateSerializer, 
@@ -115,65 +117,37 @@ class FeedbackTemplateViewSet(viewsets.ModelViewSet):
     def analytics(self, request, pk=None):
         template = self.get_object()
         
-        # Check permissions
-        if not (request.user.is_admin() or 
-                (request.user.is_officer() and template.created_by == request.user)):
+        if not self.can_view_results(request.user, template):
             return Response(
                 {"error": "Permission denied"}, 
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        # Get analytics data
-        responses = FeedbackResponse.objects.filter(template=template)
-        total_responses = responses.count()
-        
-        # Field analytics
-        field_analytics = {}
-        for field in template.fields.all():
-            answers = FeedbackAnswer.objects.filter(field=field)
-            
-            if field.field_type == TemplateField.FIELD_RATING:
-                avg_rating = answers.aggregate(avg=Avg('rating_value'))['avg']
-                field_analytics[field.label] = {
-                    'type': 'rating',
-                    'average': round(avg_rating, 2) if avg_rating else 0,
-                    'count': answers.count()
-                }
-            elif field.field_type == TemplateField.FIELD_CHOICE:
-                choices = answers.values('choice_value').annotate(count=Count('choice_value'))
-                field_analytics[field.label] = {
-                    'type': 'choice',
-                    'choices': list(choices)
-                }
-            elif field.field_type == TemplateField.FIELD_NUMBER:
-                avg_number = answers.aggregate(avg=Avg('number_value'))['avg']
-                field_analytics[field.label] = {
-                    'type': 'number',
-                    'average': round(avg_number, 2) if avg_number else 0,
-                    'count': answers.count()
-                }
-            else:
-                field_analytics[field.label] = {
-                    'type': field.field_type,
-                    'count': answers.count()
-                }
-        
-        # Response trend (last 30 days)
-        thirty_days_ago = timezone.now() - timedelta(days=30)
-        daily_responses = responses.filter(
-            submitted_at__gte=thirty_days_ago
-        ).extra(
-            select={'day': 'date(submitted_at)'}
-        ).values('day').annotate(count=Count('id')).order_by('day')
-        
-        analytics_data = {
-            'total_responses': total_responses,
-            'field_analytics': field_analytics,
-            'response_trend': list(daily_responses)
-        }
+        analytics_data = rollups.analytics(template)
         
         serializer = FeedbackAnalyticsSerializer(analytics_data)
         return Response(serializer.data)
+    
+    @action(detail=True, methods=['get'])
+    def export(self, request, pk=None):
+        """Stream every response as CSV, one column per template field"""
+        template = self.get_object()
+        if not self.can_view_results(request.user, template):
+            return Response(
+                {"error": "Permission denied"}, 
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        fields = list(template.fields.all())
+        return csv_response(
+            csv_header(fields),
+            csv_rows(template, fields),
+            f"feedback-{template.pk}.csv"
+        )
+    
+    @staticmethod
+    def can_view_results(user, template):
+        return user.is_admin() or (user.is_officer() and template.created_by_id == user.pk)
 
 
 class FeedbackResponseViewSet(viewsets.ModelViewSet):
@@ -210,3 +184,54 @@ class FeedbackResponseViewSet(viewsets.ModelViewSet):
             )
         
         return super().create(request, *args, **kwargs)
+    
+    @action(detail=False, methods=['post'])
+    def batch(self, request):
+        """
+        Submit many responses at once, for clients that collected answers
+        offline. Accepts a list, or {"responses": [...]}. The batch is saved
+        whole or not at all; errors are reported per item. The
+        one-response-per-form-per-day rule applies to every caller, staff
+        included, within the batch as across requests.
+        """
+        items = request.data.get('responses') if isinstance(request.data, dict) else request.data
+        if not isinstance(items, list) or not items:
+            return Response(
+                {"error": "Expected a non-empty list of responses"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        limit = getattr(settings, 'FEEDBACK_BATCH_MAX_RESPONSES', 500)
+        if len(items) > limit:
+            return Response(
+                {"error": f"A batch may contain at most {limit} responses"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        serializer = self.get_serializer(data=items, many=True)
+        serializer.is_valid(raise_exception=True)
+        
+        errors = [{} for _ in items]
+        templates = {item['template'].pk: item['template'] for item in serializer.validated_data}
+        for index, item in enumerate(serializer.validated_data):
+            if item['template'].status != FeedbackTemplate.STATUS_ACTIVE:
+                errors[index] = {"template": ["This feedback form is not currently active"]}
+        
+        answered = set(FeedbackResponse.objects.filter(
+            template__in=templates.keys(),
+            user=request.user,
+            submitted_at__gte=timezone.now() - timedelta(hours=24)
+        ).values_list('template_id', flat=True))
+        for index, item in enumerate(serializer.validated_data):
+            template_id = item['template'].pk
+            if template_id in answered and not errors[index]:
+                errors[index] = {"template": ["You have already submitted feedback for this form today"]}
+            answered.add(template_id)
+        
+        if any(errors):
+            return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        responses = serializer.save()
+        return Response(
+            {"created": len(responses), "ids": [response.pk for response in responses]},
+            status=status.HTTP_201_CREATED
+        )
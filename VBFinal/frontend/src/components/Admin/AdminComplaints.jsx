@@ -605,7 +605,20 @@ const AdminComplaints = () => {
                     <div className="space-y-2">
                       {selectedComplaint.attachments.map((attachment, index) => (
                         <div key={index} className={`flex items-center p-2 rounded ${isDark ? 'bg-gray-700' : 'bg-gray-100'}`}>
-                          <span className="text-lg mr-2">📎</span>
+                          {attachment.thumbnail ? (
+                            <a href={attachment.file} target="_blank" rel="noopener noreferrer" className="mr-2">
+                              <img
+                                src={attachment.thumbnail.url}
+                                width={attachment.thumbnail.width}
+                                height={attachment.thumbnail.height}
+                                alt={attachment.filename}
+                                loading="lazy"
+                                className="h-12 w-auto rounded object-cover"
+                              />
+                            </a>
+                          ) : (
+                            <span className="text-lg mr-2">📎</span>
+                          )}
                           <span className={`text-sm ${isDark ? 'text-gray-300' : 'text-gray-700'}`}>
                             {attachment.filename}
                           </span>
@@ -30,12 +30,8 @@ const MyComplaints = ({ getStatusBadge }) => {
     loadComplaints();
     loadCategories();
     
-    // Set up periodic refresh to catch admin updates
-    const interval = setInterval(() => {
-      loadComplaints();
-    }, 30000); // Refresh every 30 seconds
-    
-    return () => clearInterval(interval);
+    // Reload when the server pushes a notification (status change, response, assignment)
+    return apiService.openNotificationStream({ onNotification: () => loadComplaints() });
   }, []);
 
   useEffect(() => {
@@ -417,7 +413,20 @@ const MyComplaints = ({ getStatusBadge }) => {
                     <div className="space-y-2">
                       {selectedComplaint.attachments.map((attachment, index) => (
                         <div key={index} className={`flex items-center p-2 rounded ${isDark ? 'bg-gray-700' : 'bg-gray-100'}`}>
-                          <span className="text-lg mr-2">📎</span>
+                          {attachment.thumbnail ? (
+                            <a href={attachment.file} target="_blank" rel="noopener noreferrer" className="mr-2">
+                              <img
+                                src={attachment.thumbnail.url}
+                                width={attachment.thumbnail.width}
+                                height={attachment.thumbnail.height}
+                                alt={attachment.filename}
+                                loading="lazy"
+                                className="h-12 w-auto rounded object-cover"
+                              />
+                            </a>
+                          ) : (
+                            <span className="text-lg mr-2">📎</span>
+                          )}
                           <span className={`text-sm ${isDark ? 'text-gray-300' : 'text-gray-700'}`}>
                             {attachment.filename}
                           </span>
@@ -23,11 +23,11 @@ const SubmitComplaint = ({ institutions, setSubmitSuccess }) => {
 
   useEffect(() => {
     loadCategories();
-  }, [language]);
+  }, [language, complaintForm.institution]);
 
   const loadCategories = async () => {
     try {
-      const response = await apiService.getCategoriesByLanguage(language);
+      const response = await apiService.getCategoriesByLanguage(language, complaintForm.institution);
       setCategories(response || []);
     } catch (error) {
       console.error('Failed to load categories:', error);
@@ -203,7 +203,7 @@ const SubmitComplaint = ({ institutions, setSubmitSuccess }) => {
               </label>
               <select
                 value={complaintForm.institution}
-                onChange={(e) => setComplaintForm({ ...complaintForm, institution: e.target.value })}
+                onChange={(e) => setComplaintForm({ ...complaintForm, institution: e.target.value, category: '' })}
                 className={`w-full border rounded-lg px-4 py-3 text-sm focus:outline-none focus:ring-2 focus:ring-blue-500 focus:border-blue-500 transition-colors ${isDark ? 'bg-gray-700 border-gray-600 text-white' : 'bg-white border-gray-300'} ${formErrors.institution ? 'border-red-500' : ''}`}
               >
                 <option value="">{t('select_institution')}</option>
@@ -384,8 +384,9 @@ class ApiService {
     return this.request(url);
   }
 
-  async getCategoriesByLanguage(language = 'en') {
-    return this.request(`/categories/by-language/?lang=${language}`);
+  async getCategoriesByLanguage(language = 'en', institution = null) {
+    const scope = institution ? `&institution=${institution}` : '';
+    return this.request(`/categories/by-language/?lang=${language}${scope}`);
   }
 
   async createCategory(data) {
@@ -640,6 +641,47 @@ class ApiService {
       method: 'DELETE',
     });
   }
+
+  // Server-sent stream of the current user's new notifications (complaints/sse.py).
+  // EventSource cannot send headers, so the access token goes in the query string;
+  // the stream is reopened with a refreshed token when the server ends it or rejects it.
+  // Returns a function that closes the stream.
+  openNotificationStream({ onNotification, onUnread } = {}) {
+    let source = null;
+    let closed = false;
+    let retryTimer = null;
+
+    const reopen = async (delay) => {
+      if (source) source.close();
+      if (closed) return;
+      try {
+        await this.refreshToken();
+      } catch (error) {
+        console.error('Notification stream stopped:', error);
+        return;
+      }
+      retryTimer = setTimeout(open, delay);
+    };
+
+    const open = () => {
+      if (closed || !this.token) return;
+      source = new EventSource(`${API_BASE_URL}/notifications/stream/?token=${encodeURIComponent(this.token)}`);
+      source.addEventListener('unread', (event) => onUnread?.(JSON.parse(event.data).count));
+      source.addEventListener('notification', (event) => onNotification?.(JSON.parse(event.data)));
+      source.addEventListener('expired', () => reopen(0));
+      source.onerror = () => {
+        // The browser retries dropped connections itself; a closed source was refused (401)
+        if (source.readyState === EventSource.CLOSED) reopen(5000);
+      };
+    };
+
+    open();
+    return () => {
+      closed = true;
+      clearTimeout(retryTimer);
+      if (source) source.close();
+    };
+  }
 }
 
 export default new ApiService();